@@ -0,0 +1,102 @@
+"""
+Benchmark suite entry point.
+
+    python -m benchmarks [suite] [options]
+
+Seeds a throwaway database with synthetic data, runs the suite and writes
+machine-readable results. Exits non-zero when a query budget is exceeded or
+p95 latency regresses beyond --tolerance of a stored --baseline.
+"""
+import argparse
+import os
+import sys
+
+import django
+
+SUITES = ['endpoints', 'email_lookup', 'async_catalog', 'serializers', 'connections', 'boot',
+          'hot_sku']
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('suite', nargs='?', default='endpoints', choices=SUITES)
+    parser.add_argument('--products', type=int, default=2000, help='Synthetic products to seed')
+    parser.add_argument('--orders', type=int, default=20000, help='Synthetic orders to seed')
+    parser.add_argument('--seed', type=int, default=42, help='Dataset seed')
+    parser.add_argument('--iterations', type=int, default=50, help='Timed runs per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed runs per scenario')
+    parser.add_argument('--scales', type=int, nargs='+',
+                        help='Order counts to grow the dataset through (email_lookup suite)')
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='Simultaneous clients (async_catalog and hot_sku suites)')
+    parser.add_argument('--db-latency', type=float, default=0.0,
+                        help='Milliseconds added to every query (async_catalog and hot_sku suites)')
+    parser.add_argument('--connect-latency', type=float, default=0.0,
+                        help='Milliseconds added to every new connection (connections suite)')
+    parser.add_argument('--rows', type=int, default=1000,
+                        help='Rows serialized per run (serializers suite)')
+    parser.add_argument('--stripes', type=int, default=8,
+                        help='Stock stripes of the striped run (hot_sku suite)')
+    parser.add_argument('--only', help='Run only scenarios whose name contains this text')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--baseline', help='Compare p95 latencies against this results file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p95 regression over the baseline, as a fraction (default: 0.25)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Write the results to --baseline instead of comparing')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
+
+    from importlib import import_module
+
+    from django.db import connection
+
+    from products.synthetic import SyntheticDataGenerator
+
+    from . import runner
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        SyntheticDataGenerator(seed=args.seed, stdout=None).run(args.products, args.orders)
+        suite = import_module(f'benchmarks.{args.suite}')
+        results = suite.run(args, sys.stdout)
+        payload = {
+            'suite': args.suite,
+            'environment': runner.environment(),
+            'dataset': {
+                'products': args.products, 'orders': args.orders,
+                'scales': args.scales, 'seed': args.seed,
+            },
+            'results': results,
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    runner.print_table(results, sys.stdout)
+    if args.output:
+        runner.write_json(args.output, payload)
+
+    failures = runner.check_budgets(results)
+    if args.baseline:
+        if args.save_baseline:
+            runner.write_json(args.baseline, payload)
+        elif os.path.exists(args.baseline):
+            failures += runner.compare_to_baseline(
+                results, runner.read_json(args.baseline), args.tolerance
+            )
+        else:
+            sys.stderr.write(f'Baseline {args.baseline} not found; skipping comparison\n')
+
+    for failure in failures:
+        sys.stderr.write(f'FAIL {failure}\n')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Sync vs async catalog reads under concurrent connections.
+
+Each catalog read endpoint is requested through Django's AsyncClient (the
+ASGI handler) by --concurrency simultaneous clients, once on the DRF route
+(/api/products/...) and once on its native async twin
+(/api/async/products/...). Throughput is completed requests per wall-clock
+second across all clients. --db-latency adds a fixed sleep to every query
+to stand in for the network round trip to a remote PostgreSQL server.
+"""
+import asyncio
+import time
+
+from asgiref.sync import ThreadSensitiveContext
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient
+
+from .endpoints import prepare_fixtures
+from .runner import summarize
+
+ENDPOINTS = [
+    ('product-list', '/', {}),
+    ('product-detail', '/{product_id}/', {}),
+    ('product-search', '/search/', {'q': '{search_term}'}),
+    ('products-in-stock', '/in-stock/', {}),
+]
+
+
+def add_query_latency(seconds):
+    """Make every query on every connection (any thread) take ``seconds`` longer"""
+    def delayed(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(connection, **kwargs):
+        if delayed not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, delayed)
+
+    connection_created.connect(install, weak=False, dispatch_uid='bench-db-latency')
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+
+async def drive(client, path, params, requests, concurrency):
+    """Send ``requests`` GETs from ``concurrency`` clients; returns latencies and wall time"""
+    latencies = []
+    pending = iter(range(requests))
+
+    async def worker():
+        for _ in pending:
+            started = time.perf_counter()
+            # ASGIHandler gives each request its own thread-sensitive
+            # context; AsyncClient skips that, so set it up here
+            async with ThreadSensitiveContext():
+                response = await client.get(path, params)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path}: HTTP {response.status_code}')
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def compare(fixtures, args):
+    client = AsyncClient()
+    results = {}
+    for name, suffix, params in ENDPOINTS:
+        if args.only and args.only not in name:
+            continue
+        suffix = suffix.format(**fixtures)
+        params = {key: value.format(**fixtures) for key, value in params.items()}
+        for mode, prefix in (('sync', '/api/products'), ('async', '/api/async/products')):
+            path = prefix + suffix
+            await drive(client, path, params, args.warmup * args.concurrency, args.concurrency)
+            latencies, wall = await drive(client, path, params, args.iterations, args.concurrency)
+            row = summarize(latencies, [], [])
+            row['throughput_rps'] = round(len(latencies) / wall, 1) if wall else 0.0
+            row['concurrency'] = args.concurrency
+            results[f'GET {name} {mode} x{args.concurrency}'] = row
+    return results
+
+
+def run(args, stdout):
+    fixtures = prepare_fixtures()
+    if args.db_latency:
+        add_query_latency(args.db_latency / 1000.0)
+    return asyncio.run(compare(fixtures, args))
@@ -0,0 +1,62 @@
+"""
+Worker boot time, and the imports it is spent on.
+
+Each iteration starts a fresh interpreter that loads the WSGI application
+and the URLConf - what a gunicorn worker does before it can serve, after
+every start and --max-requests recycle - and times that inside the child.
+One more boot runs under ``python -X importtime``; its self times are
+summed per top-level package so a slow boot can be traced to the
+dependency that caused it.
+"""
+import os
+import subprocess
+import sys
+
+from .runner import summarize
+
+BOOT = """
+import time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - started)
+"""
+TOP_PACKAGES = 15
+
+
+def boot(*flags):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='ecommerce_backend.settings')
+    completed = subprocess.run(
+        [sys.executable, *flags, '-c', BOOT],
+        capture_output=True, text=True, check=True, env=env,
+    )
+    return float(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def import_times(report):
+    """{top-level package: self import time in ms} from -X importtime output"""
+    totals = {}
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0.0) + int(self_us) / 1000.0
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def run(args, stdout):
+    for _ in range(args.warmup):
+        boot()
+    latencies = [boot()[0] for _ in range(args.iterations)]
+    row = summarize(latencies, [], [])
+
+    _, report = boot('-X', 'importtime')
+    packages = import_times(report)
+    row['imports_ms'] = {name: round(ms, 1) for name, ms in list(packages.items())[:TOP_PACKAGES]}
+    stdout.write(f"Imported packages by self time ({sum(packages.values()):.0f} ms in total):\n")
+    for name, ms in row['imports_ms'].items():
+        stdout.write(f'  {name:<32} {ms:>8.1f} ms\n')
+    return {'boot wsgi worker': row}
@@ -0,0 +1,96 @@
+"""
+Per-request database connection overhead.
+
+Requests go straight through Django's WSGIHandler, the way a gunicorn sync
+worker calls it, so connections are closed or kept at the end of each
+request exactly as in production (the test Client never closes them). The
+same light read is timed with a fresh connection per request
+(CONN_MAX_AGE=0, the old behaviour), a persistent connection with and
+without health checks, and, on PostgreSQL, the in-process pool.
+
+SQLite connections are nearly free, so use BENCH_DATABASE=postgres for
+real numbers or --connect-latency to stand in for the TCP/TLS handshake
+with a remote server. An in-memory SQLite database is never closed, so
+set BENCH_SQLITE_PATH when running on SQLite.
+"""
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+from products.models import Product
+
+from .runner import measure, summarize
+
+MODES = [
+    ('per-request', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}),
+    ('persistent', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': False}),
+    ('persistent+checks', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True}),
+]
+POOL_MODE = ('pool', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True, 'POOL': {'SIZE': 1}})
+
+
+class ConnectCounter:
+    """Counts new connections, optionally adding a handshake delay to each"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.count = 0
+
+    def __call__(self, sender, connection, **kwargs):
+        self.count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def use_mode(settings):
+    """Replace the default connection with one opened with these settings"""
+    current = connections[DEFAULT_DB_ALIAS]
+    current.close()
+    wrapper_class = type(current)
+    if 'POOL' in settings:
+        from ecommerce_backend.pooled_postgresql.base import DatabaseWrapper as wrapper_class
+    connections[DEFAULT_DB_ALIAS] = wrapper_class(
+        dict(current.settings_dict, **settings), DEFAULT_DB_ALIAS
+    )
+
+
+def run(args, stdout):
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        raise RuntimeError('connections suite needs BENCH_SQLITE_PATH or BENCH_DATABASE=postgres')
+
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    path = f'/api/products/{Product.objects.order_by("pk").values_list("pk", flat=True).first()}/'
+    counter = ConnectCounter(args.connect_latency / 1000.0)
+    connection_created.connect(counter, dispatch_uid='bench-connect-counter')
+
+    def call():
+        response = handler(factory.get(path).environ, lambda status, headers: None)
+        # A WSGI server closes the response, which ends the request
+        response.close()
+        if response.status_code != 200:
+            raise RuntimeError(f'{path}: HTTP {response.status_code}')
+        return response
+
+    modes = MODES + ([POOL_MODE] if connection.vendor == 'postgresql' else [])
+    original = connections[DEFAULT_DB_ALIAS]
+    results = {}
+    try:
+        for name, settings in modes:
+            if args.only and args.only not in name:
+                continue
+            use_mode(settings)
+            counter.count = 0
+            latencies, queries, db_seconds, _ = measure(call, args.iterations, args.warmup)
+            row = summarize(latencies, queries, db_seconds)
+            row['connects_per_request'] = round(counter.count / (args.iterations + args.warmup), 3)
+            results[f'GET products:product-detail {name}'] = row
+            stdout.write(f"{name}: {row['connects_per_request']} connections per request\n")
+    finally:
+        connection_created.disconnect(dispatch_uid='bench-connect-counter')
+        connections[DEFAULT_DB_ALIAS].close()
+        connections[DEFAULT_DB_ALIAS] = original
+    return results
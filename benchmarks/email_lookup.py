@@ -0,0 +1,63 @@
+"""
+Customer order lookup at growing table sizes.
+
+Grows the orders table through --scales and times
+/api/orders/by-email/ at each size with mixed-case emails. The lookup is
+expected to stay flat because it is an index range scan; the suite fails if
+the query plan stops using order_email_lower_idx.
+"""
+import random
+
+from django.core.management.base import OutputWrapper
+from django.test import Client
+
+from orders.models import Order
+from products.synthetic import SyntheticDataGenerator
+
+from .runner import measure, summarize
+
+INDEX_NAME = 'order_email_lower_idx'
+QUERY_BUDGET = 2
+
+
+def sample_emails(rng, count):
+    top = Order.objects.order_by('-pk').values_list('pk', flat=True).first()
+    emails = []
+    while len(emails) < count:
+        email = Order.objects.filter(pk__gte=rng.randint(1, top)).order_by('pk') \
+            .values_list('email', flat=True).first()
+        if email:
+            # Mixed case: the lookup must not depend on how the email was typed
+            emails.append(email.upper() if len(emails) % 2 else email.title())
+    return emails
+
+
+def run(args, stdout):
+    rng = random.Random(args.seed)
+    generator = SyntheticDataGenerator(seed=args.seed + 1, stdout=OutputWrapper(stdout))
+    client = Client()
+    results = {}
+
+    plan = str(Order.for_email('someone@example.com').order_by('-created_at').explain())
+    if INDEX_NAME not in plan:
+        raise RuntimeError(f'by-email lookup does not use {INDEX_NAME}:\n{plan}')
+
+    for target in sorted(args.scales or [args.orders]):
+        current = Order.objects.count()
+        if target > current:
+            generator.create_orders(target - current)
+
+        emails = sample_emails(rng, 20)
+        position = iter(range(10 ** 9))
+
+        def call():
+            email = emails[next(position) % len(emails)]
+            return client.get('/api/orders/by-email/', {'email': email})
+
+        latencies, queries, db_seconds, response = measure(call, args.iterations, args.warmup)
+        if response.status_code != 200:
+            raise RuntimeError(f'by-email returned HTTP {response.status_code}')
+        results[f'GET orders:order-by-email @{target} orders'] = summarize(
+            latencies, queries, db_seconds, QUERY_BUDGET
+        )
+    return results
@@ -0,0 +1,207 @@
+"""
+Drive every route in products/urls.py and orders/urls.py through the test
+client and record latency and SQL query counts against a declared budget.
+"""
+import json
+
+from django.test import Client
+from rest_framework.settings import api_settings
+from django.urls import URLPattern, URLResolver
+
+from orders.models import Order
+from products.models import Product
+
+from .runner import measure, summarize
+
+
+class Scenario:
+    """One request against one route, with its SQL query budget"""
+
+    def __init__(self, route, method, path, budget, data=None, status=200, label=None,
+                 setup=None):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.budget = budget
+        self.data = data
+        self.status = status
+        self.setup = setup
+        self.name = f'{method} {label or route}'
+
+    def build(self, fixtures):
+        path = self.path.format(**fixtures)
+        data = self.data(fixtures) if callable(self.data) else self.data
+        return path, data
+
+
+def order_payload(fixtures):
+    return {
+        'customer_name': 'Bench Customer',
+        'email': 'bench@example.com',
+        'address': '1 Benchmark Way',
+        'items': [
+            {'product_id': fixtures['product_id'], 'quantity': 1},
+            {'product_id': fixtures['other_product_id'], 'quantity': 2},
+        ],
+    }
+
+
+def batch_payload(fixtures):
+    return {'policy': 'all_or_nothing', 'orders': [order_payload(fixtures)] * 10}
+
+
+BENCH_CART = 'bench-cart'
+
+
+def cart_payload(fixtures):
+    return {'product_id': fixtures['product_id'], 'quantity': 1, 'cart_token': BENCH_CART}
+
+
+def fill_cart(client, fixtures):
+    """Put an item in the benchmark cart so remove/checkout have work to do"""
+    client.post('/api/orders/cart/add/', json.dumps(cart_payload(fixtures)),
+                content_type='application/json')
+
+
+def checkout_payload(fixtures):
+    return {
+        'customer_name': 'Bench Customer',
+        'email': 'bench@example.com',
+        'address': '1 Benchmark Way',
+        'cart_token': BENCH_CART,
+    }
+
+
+def product_payload(fixtures):
+    return {
+        'name': 'Bench Product',
+        'description': 'Created by the benchmark suite',
+        'price': '19.99',
+        'stock': 5,
+    }
+
+
+# Reads first: writes bump the catalog version and would skew cache hits.
+SCENARIOS = [
+    Scenario('products:product-list-create', 'GET', '/api/products/', 2),
+    Scenario('products:product-list-create', 'GET', '/api/products/?page={deep_page}', 2,
+             label='products:product-list-create deep page'),
+    Scenario('products:product-list-create', 'GET', '/api/products/?pagination=cursor', 1,
+             label='products:product-list-create cursor'),
+    Scenario('products:product-detail', 'GET', '/api/products/{product_id}/', 2),
+    Scenario('products:product-search', 'GET', '/api/products/search/?q={search_term}', 2),
+    Scenario('products:products-in-stock', 'GET', '/api/products/in-stock/', 2),
+    Scenario('products:catalog-cache-stats', 'GET', '/api/products/cache-stats/', 0),
+    Scenario('orders:order-list-create', 'GET', '/api/orders/', 3),
+    Scenario('orders:order-list-create', 'GET', '/api/orders/?pagination=cursor', 2,
+             label='orders:order-list-create cursor'),
+    Scenario('orders:order-detail', 'GET', '/api/orders/{order_id}/', 2),
+    Scenario('orders:order-by-email', 'GET', '/api/orders/by-email/?email={email}', 2),
+    Scenario('orders:sales-report', 'GET', '/api/orders/reports/sales/?start=2000-01-01', 1),
+    Scenario('orders:sales-report', 'GET',
+             '/api/orders/reports/sales/?start=2000-01-01&group=month&product_id={product_id}', 1,
+             label='orders:sales-report product by month'),
+    Scenario('orders:product-sales-report', 'GET',
+             '/api/orders/reports/products/?start=2000-01-15&end=2099-12-15', 4),
+    Scenario('orders:cart-detail', 'GET', f'/api/orders/cart/?cart_token={BENCH_CART}', 0,
+             setup=fill_cart),
+    Scenario('orders:add-to-cart', 'POST', '/api/orders/cart/add/', 8,
+             data=cart_payload),
+    Scenario('orders:remove-from-cart', 'POST', '/api/orders/cart/remove/', 5,
+             data=cart_payload, setup=fill_cart),
+    Scenario('orders:cart-checkout', 'POST', '/api/orders/cart/checkout/', 8,
+             data=checkout_payload, status=201, setup=fill_cart),
+    Scenario('orders:order-list-create', 'POST', '/api/orders/', 11,
+             data=order_payload, status=201),
+    Scenario('orders:order-batch', 'POST', '/api/orders/batch/', 11,
+             data=batch_payload, status=201, label='orders:order-batch x10'),
+    Scenario('products:product-list-create', 'POST', '/api/products/', 3,
+             data=product_payload, status=201),
+    Scenario('products:product-detail', 'PATCH', '/api/products/{other_product_id}/', 4,
+             data={'price': '24.99'}),
+]
+
+
+def route_names(patterns, namespace):
+    """Names of the routes under ``patterns``, including those of included URLconfs"""
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f'{namespace}:{pattern.name}')
+        elif isinstance(pattern, URLResolver):
+            nested = f'{namespace}:{pattern.namespace}' if pattern.namespace else namespace
+            names |= route_names(pattern.url_patterns, nested)
+    return names
+
+
+def uncovered_routes(scenarios):
+    """Routes with no scenario, so new endpoints cannot skip the suite"""
+    from orders import urls as order_urls
+    from products import urls as product_urls
+
+    declared = (
+        route_names(product_urls.urlpatterns, 'products')
+        | route_names(order_urls.urlpatterns, 'orders')
+    )
+    return sorted(declared - {scenario.route for scenario in scenarios})
+
+
+def prepare_fixtures():
+    """Pick realistic targets from the seeded data"""
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:2])
+    if len(product_ids) < 2:
+        raise RuntimeError('The benchmark dataset needs at least two products')
+    # Orders in the write scenarios must never run out of stock
+    Product.objects.filter(pk__in=product_ids).update(stock=10 ** 9)
+    order = Order.objects.order_by('-pk').first()
+    if order is None:
+        raise RuntimeError('The benchmark dataset needs at least one order')
+    product = Product.objects.get(pk=product_ids[0])
+    # The last full page, so --products can be any size the dataset allows
+    deep_page = max(Product.objects.count() // api_settings.PAGE_SIZE, 1)
+    return {
+        'product_id': product_ids[0],
+        'other_product_id': product_ids[1],
+        'order_id': order.pk,
+        'email': order.email,
+        'search_term': product.name.split()[0],
+        'deep_page': deep_page,
+    }
+
+
+def run(args, stdout):
+    missing = uncovered_routes(SCENARIOS)
+    if missing:
+        raise RuntimeError(f"Routes without a benchmark scenario: {', '.join(missing)}")
+
+    fixtures = prepare_fixtures()
+    client = Client()
+    results = {}
+    for scenario in SCENARIOS:
+        if args.only and args.only not in scenario.name:
+            continue
+        path, data = scenario.build(fixtures)
+
+        def call():
+            if scenario.method == 'GET':
+                return client.get(path)
+            return client.generic(
+                scenario.method, path,
+                data=None if data is None else json.dumps(data),
+                content_type='application/json',
+            )
+
+        setup = None
+        if scenario.setup is not None:
+            def setup():
+                scenario.setup(client, fixtures)
+
+        latencies, queries, db_seconds, response = measure(
+            call, args.iterations, args.warmup, setup
+        )
+        if response.status_code != scenario.status:
+            raise RuntimeError(
+                f'{scenario.name}: expected HTTP {scenario.status}, got {response.status_code}'
+            )
+        results[scenario.name] = summarize(latencies, queries, db_seconds, scenario.budget)
+    return results
@@ -0,0 +1,109 @@
+"""
+Orders per second on a single hot product, with and without striped stock.
+
+--concurrency threads each place --iterations one-unit orders for the same
+product through POST /api/orders/, first with the product's stock in its
+own row and then split over --stripes StockStripe rows (products.stripes).
+Throughput is completed orders per wall-clock second across all threads.
+
+Each order holds the stock row it reserved until its transaction commits,
+so --db-latency (added to every query, as in the async_catalog suite)
+stands in for the round trips that make that hold long on a remote
+server. Row locks only exist on PostgreSQL: SQLite serializes every write
+transaction whether or not the stock is striped, so use
+BENCH_DATABASE=postgres for meaningful numbers. Threads need their own
+connections to one database, so an in-memory SQLite database is refused;
+set BENCH_SQLITE_PATH to smoke-test the suite there.
+"""
+import threading
+import time
+
+from django.db import connection, connections
+from django.test import Client
+
+from products import stripes
+from products.models import Product, StockStripe
+
+from .async_catalog import add_query_latency
+from .runner import summarize
+
+STOCK = 10 ** 9
+
+
+def payload(product_id):
+    return {
+        'customer_name': 'Bench Customer',
+        'email': 'bench@example.com',
+        'address': '1 Benchmark Way',
+        'items': [{'product_id': product_id, 'quantity': 1}],
+    }
+
+
+def place_orders(product_id, orders, threads):
+    """``orders`` orders from each of ``threads`` threads; returns latencies, wall time and errors"""
+    latencies = []
+    errors = []
+    start = threading.Barrier(threads + 1)
+
+    def worker():
+        client = Client()
+        data = payload(product_id)
+        try:
+            start.wait()
+            for _ in range(orders):
+                started = time.perf_counter()
+                response = client.post('/api/orders/', data, content_type='application/json')
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 201:
+                    errors.append(f'HTTP {response.status_code}: {response.content[:200]!r}')
+                    return
+        finally:
+            connections.close_all()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    return latencies, time.perf_counter() - started, errors
+
+
+def run(args, stdout):
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        raise RuntimeError('hot_sku suite needs BENCH_SQLITE_PATH or BENCH_DATABASE=postgres')
+    if args.db_latency:
+        add_query_latency(args.db_latency / 1000.0)
+
+    product_id = Product.objects.order_by('pk').values_list('pk', flat=True).first()
+    modes = [('single row', 0), (f'{args.stripes} stripes', args.stripes)]
+    results = {}
+    for name, count in modes:
+        if args.only and args.only not in name:
+            continue
+        stripes.disable(product_id)
+        Product.objects.filter(pk=product_id).update(stock=STOCK)
+        if count:
+            stripes.enable(product_id, count)
+
+        place_orders(product_id, args.warmup, args.concurrency)
+        latencies, wall, errors = place_orders(product_id, args.iterations, args.concurrency)
+        if errors:
+            raise RuntimeError(f'{name}: {errors[0]}')
+
+        sold = STOCK - (
+            sum(StockStripe.objects.filter(product_id=product_id).values_list('units', flat=True))
+            if count else Product.objects.get(pk=product_id).stock
+        )
+        expected = (args.warmup + args.iterations) * args.concurrency
+        if sold != expected:
+            raise RuntimeError(f'{name}: {sold} units sold for {expected} orders')
+
+        row = summarize(latencies, [], [])
+        row['throughput_rps'] = round(len(latencies) / wall, 1) if wall else 0.0
+        row['concurrency'] = args.concurrency
+        results[f'POST orders:order-list-create hot product {name} x{args.concurrency}'] = row
+        stdout.write(f"{name}: {row['throughput_rps']} orders/s\n")
+    stripes.disable(product_id)
+    return results
@@ -0,0 +1,156 @@
+"""
+Timing, query counting and reporting shared by the benchmark suites.
+"""
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.db import connection
+
+
+class QueryCounter:
+    """connection.execute_wrapper that counts queries and sums their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies, query_counts, db_seconds, budget=None):
+    """Reduce raw samples to the numbers that are stored and compared"""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        'iterations': len(ordered),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3) if ordered else 0.0,
+        'throughput_rps': round(len(ordered) / total, 1) if total else 0.0,
+        'queries_max': max(query_counts) if query_counts else 0,
+        'queries_mean': round(statistics.mean(query_counts), 2) if query_counts else 0,
+        'db_ms_mean': round(statistics.mean(db_seconds) * 1000, 3) if db_seconds else 0.0,
+        'query_budget': budget,
+    }
+
+
+def measure(call, iterations, warmup=0, setup=None):
+    """
+    Run ``call()`` warmup + iterations times and return the samples of the
+    timed runs: (latencies, query counts, db seconds, last result).
+    ``setup()``, if given, runs untimed before every call.
+    """
+    result = None
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        result = call()
+    latencies, query_counts, db_seconds = [], [], []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            result = call()
+            latencies.append(time.perf_counter() - started)
+        query_counts.append(counter.count)
+        db_seconds.append(counter.seconds)
+    return latencies, query_counts, db_seconds, result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'git_revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Return a failure message for every scenario whose p95 latency is more
+    than ``tolerance`` (a fraction) above the stored baseline.
+    """
+    failures = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        limit = previous['p95_ms'] * (1 + tolerance)
+        if current['p95_ms'] > limit:
+            failures.append(
+                f"{name}: p95 {current['p95_ms']}ms exceeds baseline "
+                f"{previous['p95_ms']}ms by more than {tolerance:.0%}"
+            )
+    return failures
+
+
+def check_budgets(results):
+    failures = []
+    for name, current in results.items():
+        budget = current.get('query_budget')
+        if budget is not None and current['queries_max'] > budget:
+            failures.append(
+                f"{name}: {current['queries_max']} queries exceeds budget of {budget}"
+            )
+    return failures
+
+
+def write_json(path, payload):
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(payload, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def print_table(results, stream):
+    header = (
+        f"{'scenario':<44} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'rps':>9} {'queries':>9}"
+    )
+    stream.write(header + '\n' + '-' * len(header) + '\n')
+    for name, row in results.items():
+        budget = row.get('query_budget')
+        queries = f"{row['queries_max']}/{budget}" if budget is not None else str(row['queries_max'])
+        stream.write(
+            f"{name:<44} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+            f"{row['p99_ms']:>9.2f} {row['throughput_rps']:>9.1f} {queries:>9}\n"
+        )
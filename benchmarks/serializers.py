@@ -0,0 +1,61 @@
+"""
+List serialization throughput: ModelSerializer vs its ValuesSerializer.
+
+For every list serializer with a .values() fast path, --rows rows are
+fetched and rendered to JSON bytes both ways - model instances through the
+ModelSerializer, and values rows through the ValuesSerializer - and the
+suite reports rows per second for each. It fails if the two ever render
+different bytes.
+"""
+from rest_framework.renderers import JSONRenderer
+
+from orders.models import Order
+from orders.serializers import OrderListValuesSerializer
+from products.models import Product
+from products.serializers import ProductListValuesSerializer
+
+from .runner import measure, summarize
+
+CASES = [
+    (Product.objects.all(), ProductListValuesSerializer),
+    (Order.objects.all(), OrderListValuesSerializer),
+]
+
+
+def render_instances(queryset, serializer_class, rows):
+    return JSONRenderer().render(serializer_class(list(queryset[:rows]), many=True).data)
+
+
+def render_values(queryset, serializer_class, rows):
+    page = list(serializer_class.values(queryset)[:rows])
+    return JSONRenderer().render(serializer_class(page, many=True).data)
+
+
+def run(args, stdout):
+    results = {}
+    for queryset, values_serializer in CASES:
+        name = values_serializer.serializer.__name__
+        if args.only and args.only not in name:
+            continue
+        paths = {
+            'model': lambda: render_instances(queryset, values_serializer.serializer, args.rows),
+            'values': lambda: render_values(queryset, values_serializer, args.rows),
+        }
+        rendered = {}
+        for mode, call in paths.items():
+            latencies, queries, db_seconds, rendered[mode] = measure(
+                call, args.iterations, args.warmup
+            )
+            row = summarize(latencies, queries, db_seconds)
+            row['rows'] = args.rows
+            row['rows_per_second'] = round(args.rows * row['iterations'] / sum(latencies))
+            results[f'{name} x{args.rows} {mode}'] = row
+
+        if rendered['model'] != rendered['values']:
+            raise RuntimeError(f'{values_serializer.__name__} output differs from {name}')
+        model, values = (results[f'{name} x{args.rows} {mode}'] for mode in paths)
+        stdout.write(
+            f"{name}: {model['rows_per_second']} -> {values['rows_per_second']} rows/s "
+            f"({values['rows_per_second'] / model['rows_per_second']:.1f}x)\n"
+        )
+    return results
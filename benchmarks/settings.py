@@ -0,0 +1,30 @@
+"""
+Settings for the benchmark suite: the project settings pointed at a
+throwaway database.
+
+SQLite (in memory by default) is used unless BENCH_DATABASE=postgres, in
+which case Django creates and drops ``test_<DB_NAME>`` on the configured
+server, as the test runner does.
+"""
+import os
+
+from ecommerce_backend.settings import *  # noqa: F401,F403
+from ecommerce_backend.settings import BASE_DIR, DATABASES as PROJECT_DATABASES
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+
+if os.environ.get('BENCH_DATABASE', 'sqlite') == 'postgres':
+    DATABASES = PROJECT_DATABASES
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'bench.sqlite3',
+            'TEST': {
+                # Empty means in-memory; set a path to inspect the data afterwards
+                'NAME': os.environ.get('BENCH_SQLITE_PATH') or None,
+            },
+        }
+    }
+    DATABASE_REPLICAS = []
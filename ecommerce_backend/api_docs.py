@@ -0,0 +1,107 @@
+"""
+OpenAPI document and documentation pages, without per-request schema work.
+
+The document is generated once per process, on the first request, unless
+API_SCHEMA_FILE was already written at image build time
+(``manage.py generate_api_schema``); either way it is then served as fixed
+bytes with a strong ETag. The Swagger UI and ReDoc pages only render a
+template and load the document from the schema-json route.
+
+drf_yasg is imported inside these functions only, never at URLConf or app
+loading time, so a worker that is never asked for the docs never pays for
+importing it.
+"""
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.http import quote_etag
+
+from .conditional import not_modified_response
+
+_document = None
+_document_lock = threading.Lock()
+
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="E-commerce API",
+        default_version='v1',
+        description="API for e-commerce MVP backend",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="contact@ecommerce.local"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+def generate_schema():
+    """Render the OpenAPI (Swagger 2.0) document of every public endpoint as JSON bytes"""
+    from drf_yasg.app_settings import swagger_settings
+    from drf_yasg.codecs import OpenAPICodecJson
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    # Views pick their serializer from request.method, so they need a
+    # request even though the document does not depend on it
+    request = Request(APIRequestFactory().get('/swagger.json'))
+    # An explicit url keeps the generator off request.get_host(), which
+    # ALLOWED_HOSTS would reject; the host is dropped from the document
+    # anyway, so clients resolve paths against the server they fetched it from
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(api_info(), url='http://localhost')
+    schema = generator.get_schema(request=request, public=True)
+    schema.pop('host', None)
+    schema.pop('schemes', None)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def schema_document():
+    """(body, etag) of the document: the pre-rendered file, else generated once"""
+    global _document
+    with _document_lock:
+        if _document is None:
+            path = settings.API_SCHEMA_FILE
+            if path and os.path.exists(path):
+                with open(path, 'rb') as handle:
+                    body = handle.read()
+            else:
+                body = generate_schema()
+            _document = (body, quote_etag(hashlib.md5(body).hexdigest()))
+        return _document
+
+
+def schema_json(request):
+    body, etag = schema_document()
+    not_modified = not_modified_response(request, etag, None)
+    if not_modified is not None:
+        return not_modified
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+def _ui_page(renderer_class, request):
+    from drf_yasg import openapi
+
+    if request.GET.get('format') == 'openapi':
+        # The document used to live at ?format=openapi of the UI pages
+        return schema_json(request)
+    # The UI renderers only read the title and version off the document
+    swagger = openapi.Swagger(info=api_info(), _prefix='/', paths=openapi.Paths({}))
+    html = renderer_class().render(swagger, renderer_class.media_type, {'request': request})
+    return HttpResponse(html, content_type='text/html; charset=utf-8')
+
+
+def swagger_ui(request):
+    from drf_yasg.renderers import SwaggerUIRenderer
+
+    return _ui_page(SwaggerUIRenderer, request)
+
+
+def redoc_ui(request):
+    from drf_yasg.renderers import ReDocRenderer
+
+    return _ui_page(ReDocRenderer, request)
@@ -0,0 +1,45 @@
+"""
+Minimal plumbing for native async JSON views.
+
+DRF 3.14 views are synchronous; under ASGI Django runs each of them in a
+worker thread. async_api_view gives a plain ``async def`` view the parts of
+DRF the read endpoints rely on - query_params and absolute URLs for the
+paginators, APIException handling and the JSON renderer - so it returns
+the same bodies as its DRF counterpart without leaving the event loop.
+"""
+import functools
+
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, MethodNotAllowed
+from rest_framework.request import Request
+
+from .metrics import TimedJSONRenderer
+
+
+def render_json(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        TimedJSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json',
+    )
+
+
+def async_api_view(methods):
+    """Decorate an ``async def view(request, ...)`` taking a DRF Request"""
+    allowed = [method.upper() for method in methods]
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in allowed:
+                    raise MethodNotAllowed(request.method)
+                response = await view(Request(request), *args, **kwargs)
+            except APIException as exc:
+                response = render_json({'detail': exc.detail}, exc.status_code)
+                if isinstance(exc, MethodNotAllowed):
+                    response['Allow'] = ', '.join(allowed)
+            return response
+        return wrapper
+    return decorator
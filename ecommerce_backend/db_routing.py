@@ -0,0 +1,222 @@
+"""
+Read-replica routing with read-your-writes consistency.
+
+ReplicaRoutingMiddleware decides per request where reads may go. Requests
+with a safe method (GET, HEAD, OPTIONS) read from one of
+DATABASE_REPLICAS; everything else - unsafe requests, reads inside a
+transaction, commands and shells outside any request - uses the primary,
+and ReplicaRouter sends every write there.
+
+Replicas lag behind the primary, so a client that writes would not always
+see its own write on its next read. Any request that writes (or uses an
+unsafe method) sets a cookie that keeps the client's reads on the primary
+for READ_YOUR_WRITES_WINDOW seconds, and the rest of that request reads
+from the primary too. A replica that cannot be connected to is skipped
+for REPLICA_RETRY_AFTER seconds, falling back to the primary when none is
+left. A safe request whose replica fails while it runs (a DatabaseError
+out of the view) is run again on the primary instead of answering 500.
+Streamed bodies are produced after the middleware has returned, so their
+queries run on the primary.
+
+Responses kept in a shared cache outlive the request, so they are built
+inside reads_from_primary(): a body read from a lagging replica would
+otherwise be cached under a newer catalog version.
+"""
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'primary_pin'
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+# {alias: time.monotonic() before which the replica is not tried again}
+_down_until = {}
+
+
+def mark_replica_down(alias):
+    _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_AFTER
+
+
+def choose_replica():
+    """A random reachable replica, or the primary if none is"""
+    now = time.monotonic()
+    candidates = [
+        alias for alias in settings.DATABASE_REPLICAS
+        if _down_until.get(alias, 0) <= now
+    ]
+    random.shuffle(candidates)
+    for alias in candidates:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning('Replica %s is unreachable, reading from the primary', alias)
+            mark_replica_down(alias)
+            continue
+        _down_until.pop(alias, None)
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def reads_from_primary():
+    """Send the reads of the block to the primary, e.g. to fill a shared cache"""
+    routing = _routing.get()
+    if routing is None:
+        yield
+        return
+    use_replica = routing.use_replica
+    routing.use_replica = False
+    try:
+        yield
+    finally:
+        routing.use_replica = use_replica and not routing.wrote
+
+
+class RequestRouting:
+    """Where the current request reads from"""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica = None
+        self.wrote = False
+        # Set when the request failed with a DatabaseError while on a replica
+        self.replica_failed = False
+
+    @property
+    def on_replica(self):
+        return self.replica is not None and self.replica != DEFAULT_DB_ALIAS
+
+    def read_alias(self):
+        if not self.use_replica:
+            return DEFAULT_DB_ALIAS
+        if self.replica is None:
+            # Picked on the first read, so requests that never query
+            # (cache hits) never connect to a replica
+            self.replica = choose_replica()
+        return self.replica
+
+    def record_write(self):
+        # Later reads of this request must see the write
+        self.wrote = True
+        self.use_replica = False
+
+
+class ReplicaRouter:
+    """Reads go where the current request allows, writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return routing.read_alias()
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.record_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Route the request's reads and pin writing clients to the primary"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        routing = self.routing_for(request)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.replica_failed:
+            routing = self.retry_routing(request, routing)
+            token = _routing.set(routing)
+            try:
+                response = self.get_response(request)
+            finally:
+                _routing.reset(token)
+        return self.pin(request, response, routing)
+
+    async def __acall__(self, request):
+        routing = self.routing_for(request)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.replica_failed:
+            routing = self.retry_routing(request, routing)
+            token = _routing.set(routing)
+            try:
+                response = await self.get_response(request)
+            finally:
+                _routing.reset(token)
+        return self.pin(request, response, routing)
+
+    def process_exception(self, request, exception):
+        routing = _routing.get()
+        if (
+            routing is not None and routing.on_replica and not routing.wrote
+            and request.method in SAFE_METHODS and isinstance(exception, DatabaseError)
+        ):
+            # Let the 500 through this time; __call__ runs the request again
+            routing.replica_failed = True
+        return None
+
+    @staticmethod
+    def retry_routing(request, routing):
+        """Routing for running a request again after its replica failed"""
+        alias = routing.replica
+        logger.warning('Replica %s failed during %s %s, retrying on the primary',
+                       alias, request.method, request.path)
+        try:
+            usable = connections[alias].is_usable()
+        except DatabaseError:
+            usable = False
+        if not usable:
+            # Only the replica, not an error of the query itself
+            mark_replica_down(alias)
+            connections[alias].close()
+        return RequestRouting(use_replica=False)
+
+    @staticmethod
+    def routing_for(request):
+        use_replica = (
+            bool(settings.DATABASE_REPLICAS)
+            and request.method in SAFE_METHODS
+            and PIN_COOKIE not in request.COOKIES
+        )
+        return RequestRouting(use_replica)
+
+    @staticmethod
+    def pin(request, response, routing):
+        if settings.DATABASE_REPLICAS and (routing.wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.READ_YOUR_WRITES_WINDOW,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
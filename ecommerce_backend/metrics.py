@@ -0,0 +1,382 @@
+"""
+Per-request timing and SQL instrumentation.
+
+RequestMetricsMiddleware measures each request in phases - database time
+and query count (via an execute wrapper on every connection), serializer
+time (TimedSerializerMixin and ValuesSerializer) and DRF rendering - reports them in a Server-Timing header
+and records them in per-route histograms. It runs natively under both WSGI
+and ASGI: the current request is tracked in a contextvar, which asgiref
+carries into the threads where async ORM queries run.
+
+Gunicorn runs several worker processes, so every process keeps its own
+histograms and periodically writes them to its own file in METRICS_DIR.
+The /metrics view merges all files into one Prometheus text exposition.
+The files of workers that exited (gunicorn recycles them after
+--max-requests) are folded into a single retired file, so the directory
+does not grow with every recycle.
+
+/metrics is only served to staff users, to clients in METRICS_ALLOWED_NETWORKS
+and to requests carrying METRICS_TOKEN as a bearer token.
+"""
+import contextvars
+import fcntl
+import glob
+import hmac
+import ipaddress
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 1.0
+WORKER_FILE = re.compile(r'^metrics-(\d+)-\d+\.json$')
+RETIRED_FILE = 'retired.json'
+SUMMED_FIELDS = ('count', 'sum', 'db_seconds', 'db_queries', 'serialize_seconds', 'render_seconds')
+# Anything else (scanners send made-up methods) is recorded as OTHER, so the
+# registry cannot grow without bound
+KNOWN_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Phase timings of the request being handled"""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.phases = {'serialize': 0.0, 'render': 0.0}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+def timed_execute(execute, sql, params, many, context):
+    """Execute wrapper that charges the query to the current request, if any"""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+def install_query_timing(connection, **kwargs):
+    """
+    Keep timed_execute on a connection for its whole life. It goes first
+    in the list so connection.execute_wrapper() blocks still pop their own.
+    """
+    if timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, timed_execute)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the current request's phase"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[name] = timings.phases.get(name, 0.0) + time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    """
+    Report reading ``.data`` as the serialize phase. Only top-level
+    serializers have ``.data`` read (nested ones are asked for
+    to_representation), so nothing is counted twice; many=True gets a
+    TimedListSerializer unless the serializer's Meta names its own.
+    """
+
+    @property
+    def data(self):
+        with phase('serialize'):
+            return super().data
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        serializer = super().many_init(*args, **kwargs)
+        if type(serializer) is serializers.ListSerializer:
+            serializer.__class__ = TimedListSerializer
+        return serializer
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """ListSerializer of a TimedSerializerMixin serializer"""
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that reports its time as the render phase"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with phase('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class MetricsRegistry:
+    """Per-process histograms keyed by (method, route)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.last_flush = 0.0
+        self.path = None
+
+    def observe(self, method, route, status, duration, timings):
+        key = f'{method} {route}'
+        with self.lock:
+            entry = self.routes.get(key)
+            if entry is None:
+                entry = self.routes[key] = {
+                    'method': method,
+                    'route': route,
+                    'buckets': [0] * len(LATENCY_BUCKETS),
+                    'count': 0,
+                    'sum': 0.0,
+                    'db_seconds': 0.0,
+                    'db_queries': 0,
+                    'serialize_seconds': 0.0,
+                    'render_seconds': 0.0,
+                    'status': {},
+                }
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    entry['buckets'][index] += 1
+            entry['count'] += 1
+            entry['sum'] += duration
+            entry['db_seconds'] += timings.db_seconds
+            entry['db_queries'] += timings.db_queries
+            entry['serialize_seconds'] += timings.phases['serialize']
+            entry['render_seconds'] += timings.phases['render']
+            status = str(status)
+            entry['status'][status] = entry['status'].get(status, 0) + 1
+        if time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Atomically replace this process's snapshot file"""
+        directory = settings.METRICS_DIR
+        if self.path is None:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(
+                directory, f'metrics-{os.getpid()}-{int(time.time() * 1000)}.json'
+            )
+        with self.lock:
+            snapshot = json.dumps(self.routes)
+            self.last_flush = time.monotonic()
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            handle.write(snapshot)
+        os.replace(tmp_path, self.path)
+
+
+registry = MetricsRegistry()
+
+
+def _load(path):
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(merged, routes):
+    """Add the histograms of ``routes`` into ``merged``"""
+    for key, entry in routes.items():
+        target = merged.get(key)
+        if target is None:
+            merged[key] = entry
+            continue
+        target['buckets'] = [a + b for a, b in zip(target['buckets'], entry['buckets'])]
+        for field in SUMMED_FIELDS:
+            target[field] += entry[field]
+        for status, count in entry['status'].items():
+            target['status'][status] = target['status'].get(status, 0) + count
+    return merged
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def fold_retired():
+    """Fold the files of exited workers into the retired file and remove them"""
+    directory = settings.METRICS_DIR
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        # Several workers may serve /metrics at once
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = []
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            match = WORKER_FILE.match(os.path.basename(path))
+            if match and not _alive(int(match.group(1))):
+                dead.append(path)
+        if not dead:
+            return
+        retired_path = os.path.join(directory, RETIRED_FILE)
+        retired = _load(retired_path) or {}
+        for path in dead:
+            _merge(retired, _load(path) or {})
+        tmp_path = f'{retired_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(retired, handle)
+        os.replace(tmp_path, retired_path)
+        for path in dead:
+            os.unlink(path)
+
+
+def collect():
+    """Merge the snapshots of every worker, live or recycled"""
+    registry.flush()
+    fold_retired()
+    merged = {}
+    paths = glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json'))
+    for path in paths + [os.path.join(settings.METRICS_DIR, RETIRED_FILE)]:
+        routes = _load(path)
+        if routes is not None:
+            _merge(merged, routes)
+    return merged
+
+
+def _labels(entry, **extra):
+    labels = {'method': entry['method'], 'route': entry['route'], **extra}
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_prometheus(merged):
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by route.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for entry in merged.values():
+        for bound, count in zip(LATENCY_BUCKETS, entry['buckets']):
+            lines.append(f'http_request_duration_seconds_bucket{{{_labels(entry, le=bound)}}} {count}')
+        lines.append(f'http_request_duration_seconds_bucket{{{_labels(entry, le="+Inf")}}} {entry["count"]}')
+        lines.append(f'http_request_duration_seconds_sum{{{_labels(entry)}}} {entry["sum"]}')
+        lines.append(f'http_request_duration_seconds_count{{{_labels(entry)}}} {entry["count"]}')
+
+    counters = [
+        ('http_requests_total', 'Requests by route and status.', None),
+        ('http_request_db_seconds_total', 'Time spent in SQL queries.', 'db_seconds'),
+        ('http_request_db_queries_total', 'SQL queries executed.', 'db_queries'),
+        ('http_request_serialize_seconds_total', 'Time spent in DRF serializers.', 'serialize_seconds'),
+        ('http_request_render_seconds_total', 'Time spent in DRF renderers.', 'render_seconds'),
+    ]
+    for name, help_text, field in counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for entry in merged.values():
+            if field is None:
+                for status, count in sorted(entry['status'].items()):
+                    lines.append(f'{name}{{{_labels(entry, status=status)}}} {count}')
+            else:
+                lines.append(f'{name}{{{_labels(entry)}}} {entry[field]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_allowed(request):
+    """Staff users, clients in METRICS_ALLOWED_NETWORKS or the METRICS_TOKEN bearer"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the merged per-route metrics"""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_prometheus(collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+class RequestMetricsMiddleware:
+    """Times each request by phase and records it per route"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Connections are per thread: cover the ones that already exist here
+        # and every one opened later, in any thread
+        connection_created.connect(install_query_timing, dispatch_uid='request-metrics')
+        for connection in connections.all(initialized_only=True):
+            install_query_timing(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - started)
+
+    def record(self, request, response, timings, duration):
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={timings.db_seconds * 1000:.2f};desc="{timings.db_queries} queries"',
+                f'serialize;dur={timings.phases["serialize"] * 1000:.2f}',
+                f'render;dur={timings.phases["render"] * 1000:.2f}',
+                f'total;dur={duration * 1000:.2f}',
+            ])
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        if route != 'metrics/':
+            method = request.method if request.method in KNOWN_METHODS else 'OTHER'
+            registry.observe(method, route, response.status_code, duration, timings)
+        return response
@@ -0,0 +1,220 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    PageNumberPagination that async views can drive with the async ORM.
+
+    apaginate_queryset is the awaitable twin of paginate_queryset: the
+    count and the page rows are fetched with acount() and aiterator(), and
+    the regular get_paginated_response/get_*_link methods work unchanged.
+    """
+
+    async def apaginate_queryset(self, queryset, request):
+        return await self.apaginate_page_number(queryset, request)
+
+    async def apaginate_page_number(self, queryset, request):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Prime the cached count so the paginator never queries by itself
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+
+        bottom = (number - 1) * paginator.per_page
+        rows = [row async for row in queryset[bottom:bottom + paginator.per_page].aiterator()]
+        self.page = Page(rows, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return rows
+
+
+class KeysetPagination(AsyncPageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset (cursor) mode.
+
+    Without a cursor the classic ?page=N API is served unchanged. With
+    ?pagination=cursor (first page) or ?cursor=<token> the queryset is
+    walked on (-created_at, -id) instead: each page is a single indexed
+    range scan, with no COUNT(*) and no OFFSET, so deep pages cost the same
+    as the first one. Add ?include_count=true to get a total count anyway.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    count_query_param = 'include_count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def use_keyset(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.use_keyset(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if self.wants_count(request) else None
+
+        position = self.decode_cursor(request)
+        rows = list(self.keyset_queryset(queryset, position)[:self.page_size + 1])
+        return self.keyset_page(rows, position)
+
+    async def apaginate_queryset(self, queryset, request):
+        self.keyset = self.use_keyset(request)
+        if not self.keyset:
+            return await self.apaginate_page_number(queryset, request)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = await queryset.acount() if self.wants_count(request) else None
+
+        position = self.decode_cursor(request)
+        page = self.keyset_queryset(queryset, position)[:self.page_size + 1]
+        rows = [row async for row in page.aiterator()]
+        return self.keyset_page(rows, position)
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def keyset_queryset(self, queryset, position):
+        """Order and filter the queryset to start right after ``position``"""
+        if position is None:
+            return queryset.order_by('-created_at', '-id')
+        if position['direction'] == 'previous':
+            return queryset.filter(
+                Q(created_at__gt=position['created_at'])
+                | Q(created_at=position['created_at'], id__gt=position['id'])
+            ).order_by('created_at', 'id')
+        return queryset.filter(
+            Q(created_at__lt=position['created_at'])
+            | Q(created_at=position['created_at'], id__lt=position['id'])
+        ).order_by('-created_at', '-id')
+
+    def keyset_page(self, rows, position):
+        """
+        Trim the page_size + 1 fetched rows (the extra row tells whether
+        there is a further page) and record the link state.
+        """
+        reverse = position is not None and position['direction'] == 'previous'
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first_row = rows[0] if rows else None
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or self.last_row is None:
+            return None
+        return self.encode_cursor(self.last_row, 'next')
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or self.first_row is None:
+            return None
+        return self.encode_cursor(self.first_row, 'previous')
+
+    @staticmethod
+    def row_position(row):
+        """(created_at, id) of a model instance or of a .values() row"""
+        if isinstance(row, dict):
+            return row['created_at'], row['id']
+        return row.created_at, row.pk
+
+    def encode_cursor(self, row, direction):
+        created_at, pk = self.row_position(row)
+        token = json.dumps({
+            't': created_at.isoformat(),
+            'i': pk,
+            'd': direction[0],
+        }, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(token.encode('ascii')).decode('ascii').rstrip('=')
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        """Return the position encoded in ?cursor=, or None for the first page"""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            return {
+                'created_at': datetime.fromisoformat(data['t']),
+                'id': int(data['i']),
+                'direction': 'previous' if data['d'] == 'p' else 'next',
+            }
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque keyset cursor from a previous next/previous link.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" to start keyset pagination.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Include a total count in keyset mode.',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+        return parameters
@@ -0,0 +1,132 @@
+"""
+PostgreSQL backend that borrows connections from an in-process pool.
+
+Django opens a connection when a thread first queries and closes it when
+the request ends (CONN_MAX_AGE = 0). Here opening takes an idle connection
+from the alias' pool and closing gives it back, so a threaded gunicorn
+worker pays the connection handshake once per pooled connection instead of
+once per request. The pool is created lazily in each worker process, after
+gunicorn has forked.
+
+Settings (see settings.DB_POOL_SIZE): DATABASES[alias]['POOL'] = {'SIZE':
+most connections open at once, 'TIMEOUT': seconds to wait for one}. With
+CONN_HEALTH_CHECKS an idle connection is pinged before it is handed out.
+"""
+import threading
+
+from django.db import OperationalError
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from psycopg2 import extensions
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """At most ``size`` connections, idle ones reused most recent first"""
+
+    def __init__(self, size, timeout):
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = []
+
+    def checkout(self, health_check):
+        """
+        Hold a slot and return an idle connection, or None when the caller
+        must open a new one in the slot.
+        """
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'No database connection became free within {self.timeout}s'
+            )
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                connection = self.idle.pop()
+            if not connection.closed and (not health_check or self.is_usable(connection)):
+                return connection
+            self.close(connection)
+
+    def checkin(self, connection):
+        """Give a connection back, rolled back to a clean state, and free its slot"""
+        try:
+            status = connection.info.transaction_status if not connection.closed else None
+            if status == extensions.TRANSACTION_STATUS_IDLE:
+                reusable = True
+            elif status in (extensions.TRANSACTION_STATUS_INTRANS,
+                            extensions.TRANSACTION_STATUS_INERROR):
+                connection.rollback()
+                reusable = True
+            else:
+                reusable = False
+        except Exception:
+            reusable = False
+        if reusable:
+            with self.lock:
+                self.idle.append(connection)
+        else:
+            self.close(connection)
+        self.slots.release()
+
+    def discard(self, connection):
+        """Close a checked-out connection for good and free its slot"""
+        self.close(connection)
+        self.slots.release()
+
+    @staticmethod
+    def is_usable(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def get_pool(alias, settings_dict):
+    with _pools_lock:
+        if alias not in _pools:
+            options = settings_dict['POOL']
+            _pools[alias] = ConnectionPool(options['SIZE'], options.get('TIMEOUT', 10))
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        connection = pool.checkout(self.settings_dict['CONN_HEALTH_CHECKS'])
+        if connection is None:
+            try:
+                return super().get_new_connection(conn_params)
+            except BaseException:
+                pool.slots.release()
+                raise
+        # What the parent sets when it opens a connection
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block:
+            # Django keeps referencing a connection closed mid-transaction
+            # until the block exits, so it cannot go back to the pool
+            self.pool.discard(self.connection)
+        else:
+            self.pool.checkin(self.connection)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
 from decouple import Config, RepositoryEnv
 
@@ -53,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ecommerce_backend.metrics.RequestMetricsMiddleware',
+    'ecommerce_backend.db_routing.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -89,15 +92,91 @@ WSGI_APPLICATION = 'ecommerce_backend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': config('DB_ENGINE', default='django.db.backends.postgresql'),
         'NAME': config('DB_NAME', default='ecommerce_db'),
         'USER': config('DB_USER', default='postgres'),
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # Keep a worker's connection open across requests for this many
+        # seconds (0: reconnect every request, as under ASGI), and check it
+        # is still alive before a request reuses it
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
     }
 }
 
+# In-process connection pool for threaded workers (PostgreSQL only): up to
+# DB_POOL_SIZE connections shared by the threads of a worker process, each
+# returned to the pool at the end of the request. 0 disables the pool.
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=0, cast=int)
+if DB_POOL_SIZE and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default'].update(
+        ENGINE='ecommerce_backend.pooled_postgresql',
+        CONN_MAX_AGE=0,
+        POOL={
+            'SIZE': DB_POOL_SIZE,
+            # Seconds a request waits for a free connection before failing
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        },
+    )
+
+# Read replicas: comma-separated host[:port] of servers streaming from the
+# primary, with its database name and credentials (for SQLite: database
+# files). Safe-method requests read from them - see ecommerce_backend/db_routing.py.
+_replicas = config('DB_REPLICAS', default='')
+DATABASE_REPLICAS = []
+for _entry in [r.strip() for r in _replicas.split(',') if r.strip()]:
+    _replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if _replica['ENGINE'] == 'django.db.backends.sqlite3':
+        _replica['NAME'] = _entry
+    else:
+        _host, _, _port = _entry.partition(':')
+        _replica.update(HOST=_host, PORT=_port or _replica['PORT'])
+    DATABASE_REPLICAS.append(f'replica_{len(DATABASE_REPLICAS) + 1}')
+    DATABASES[DATABASE_REPLICAS[-1]] = _replica
+
+DATABASE_ROUTERS = ['ecommerce_backend.db_routing.ReplicaRouter']
+
+# Seconds a client's reads stay on the primary after it writes, so it never
+# reads from a replica that has not replayed its write yet
+READ_YOUR_WRITES_WINDOW = config('READ_YOUR_WRITES_WINDOW', default=10, cast=int)
+# Seconds an unreachable replica is skipped before it is tried again
+REPLICA_RETRY_AFTER = config('REPLICA_RETRY_AFTER', default=30, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# locmem is per-process, for development only: with more than one gunicorn
+# worker, use a shared backend (redis) so every worker sees catalog cache
+# invalidations. entrypoint.prod.sh refuses to start otherwise.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='ecommerce-cache'),
+    }
+}
+
+# Seconds a cached catalog response may live (product and stock changes
+# invalidate it earlier)
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+# Most orders accepted by one POST /api/orders/batch/ request
+ORDER_BATCH_MAX_SIZE = config('ORDER_BATCH_MAX_SIZE', default=500, cast=int)
+
+# Seconds a cart holds its stock after the cart was last changed
+CART_RESERVATION_TTL = config('CART_RESERVATION_TTL', default=900, cast=int)
+
+# Minimum seconds between refreshes of a striped product's cached stock
+# total after reservations (0 refreshes after every order)
+STOCK_STRIPE_REFRESH_INTERVAL = config('STOCK_STRIPE_REFRESH_INTERVAL', default=1.0, cast=float)
+
+# Admin changelists page with the planner's row estimate (PostgreSQL) instead
+# of COUNT(*), except for results estimated below ADMIN_EXACT_COUNT_LIMIT
+ADMIN_ESTIMATED_COUNTS = config('ADMIN_ESTIMATED_COUNTS', default=True, cast=bool)
+ADMIN_EXACT_COUNT_LIMIT = config('ADMIN_EXACT_COUNT_LIMIT', default=10000, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -142,6 +221,32 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Static catalog snapshot (manage.py build_catalog_snapshot); nginx serves
+# CATALOG_SNAPSHOT_DIR at CATALOG_SNAPSHOT_URL (catalog_volume -> /app/catalog)
+CATALOG_SNAPSHOT_DIR = config('CATALOG_SNAPSHOT_DIR', default=str(BASE_DIR / 'catalog'))
+CATALOG_SNAPSHOT_URL = config('CATALOG_SNAPSHOT_URL', default='/catalog/')
+
+
+# API documentation (/swagger/, /redoc/, /swagger.json) - see ecommerce_backend/api_docs.py
+API_DOCS = config('API_DOCS', default=True, cast=bool)
+# Pre-rendered OpenAPI document (manage.py generate_api_schema); generated
+# on the first request when the file does not exist
+API_SCHEMA_FILE = config('API_SCHEMA_FILE', default=str(BASE_DIR / 'openapi.json'))
+
+if API_DOCS:
+    # drf_yasg is imported only when the docs are first requested, so it is
+    # not an installed app: its templates and static files are found by path
+    _drf_yasg_dir = Path(importlib.util.find_spec('drf_yasg').origin).parent
+    TEMPLATES[0]['DIRS'].append(_drf_yasg_dir / 'templates')
+    STATICFILES_DIRS = [_drf_yasg_dir / 'static']
+
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'schema-json',
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': 'schema-json',
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -153,12 +258,27 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'ecommerce_backend.metrics.TimedJSONRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Request metrics: each gunicorn worker writes its histograms to its own file
+# here, and /metrics/ merges them. Clear the directory when the server starts.
+METRICS_DIR = config('METRICS_DIR', default='/tmp/ecommerce-metrics')
+# /metrics/ is served to staff users, to these networks (comma-separated
+# CIDRs; behind nginx the client address is nginx's) and to requests with
+# "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_ALLOWED_NETWORKS = config(
+    'METRICS_ALLOWED_NETWORKS', default='127.0.0.1/32,::1/128',
+    cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]
+)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Adds db/serialize/render timings to every response as a Server-Timing
+# header; they expose internals, so only enable it where clients are trusted
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=False, cast=bool)
+
 # CORS: comma-separated origins, e.g. http://localhost:3000,https://your-app.vercel.app
 _cors_origins = config(
     "CORS_ALLOWED_ORIGINS",
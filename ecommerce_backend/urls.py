@@ -13,41 +13,35 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.http import JsonResponse
 from django.urls import path, include
-from rest_framework import permissions
+from ecommerce_backend import api_docs
+from ecommerce_backend.metrics import metrics_view
 
 
 def health(request):
     """Lightweight 200 for load balancers / deploy scripts (GET / has no route)."""
     return JsonResponse({"status": "ok"})
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="E-commerce API",
-        default_version='v1',
-        description="API for e-commerce MVP backend",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@ecommerce.local"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
 
 urlpatterns = [
     path('health/', health, name='health'),
+    path('metrics/', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     
-    # API Documentation
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-    
     # API endpoints
     path('api/products/', include('products.urls')),
+    path('api/async/products/', include('products.async_urls')),
     path('api/orders/', include('orders.urls')),
     path('api/cart/', include('orders.urls', namespace='cart')),
 ]
+
+if settings.API_DOCS:
+    # API Documentation: the schema is generated once, not per request
+    urlpatterns += [
+        path('swagger.json', api_docs.schema_json, name='schema-json'),
+        path('swagger/', api_docs.swagger_ui, name='schema-swagger-ui'),
+        path('redoc/', api_docs.redoc_ui, name='schema-redoc'),
+    ]
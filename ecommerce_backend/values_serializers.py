@@ -0,0 +1,129 @@
+"""
+Read-only list serializers that skip ModelSerializer on hot read endpoints.
+
+A ValuesSerializer reads ``.values()`` rows holding only the columns it
+outputs (computed fields are SQL annotations) and turns each value straight
+into its JSON form: Decimals into the fixed-point string DRF's DecimalField
+produces, datetimes into DRF's ISO 8601 string. No model instances or
+per-field Field objects are built, and the renderer is handed nothing but
+str/int/bool/None, so the C JSON encoder never calls back into Python. The
+rendered bytes are the same as those of the ModelSerializer it stands in
+for (``serializer``), which stays the documented shape of the endpoint.
+"""
+import decimal
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .metrics import phase
+
+
+def decimal_to_string(field):
+    """Format like DecimalField.to_representation with COERCE_DECIMAL_TO_STRING"""
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.Context(prec=field.max_digits)
+
+    def convert(value):
+        return format(value.quantize(exponent, context=context), 'f')
+    return convert
+
+
+def datetime_to_string(field):
+    """Format like DateTimeField.to_representation with the ISO 8601 default"""
+    if not settings.USE_TZ:
+        return lambda value: value.isoformat()
+
+    def convert(value):
+        value = value.astimezone(timezone.get_current_timezone()).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+CONVERTERS = {
+    models.DecimalField: decimal_to_string,
+    models.DateTimeField: datetime_to_string,
+}
+
+
+class ValuesSerializer:
+    """
+    Serialize ``.values()`` rows of ``model`` into ``fields``.
+
+    ``annotations`` maps output fields that are not columns to expressions.
+    ``cursor_columns`` are fetched as well, for KeysetPagination's links,
+    but not output. Usable where views expect a serializer:
+    ``Serializer(rows, many=True).data``.
+    """
+    model = None
+    serializer = None
+    fields = ()
+    annotations = {}
+    cursor_columns = ('id', 'created_at')
+
+    _converters = None
+
+    def __init__(self, instance, many=False):
+        self.instance = instance
+        self.many = many
+
+    @classmethod
+    def values(cls, queryset):
+        """The queryset's rows as dicts of exactly the needed columns"""
+        columns = list(cls.fields)
+        columns += [column for column in cls.cursor_columns if column not in columns]
+        return queryset.annotate(**cls.annotations).values(*columns)
+
+    @classmethod
+    def converters(cls):
+        if cls.__dict__.get('_converters') is None:
+            converters = []
+            for name in cls.fields:
+                convert = None
+                if name not in cls.annotations:
+                    field = cls.model._meta.get_field(name)
+                    for field_class, factory in CONVERTERS.items():
+                        if isinstance(field, field_class):
+                            convert = factory(field)
+                            break
+                converters.append((name, convert))
+            cls._converters = converters
+        return cls._converters
+
+    @classmethod
+    def to_representation(cls, row, converters=None):
+        data = {}
+        for name, convert in converters or cls.converters():
+            value = row[name]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    @property
+    def data(self):
+        with phase('serialize'):
+            converters = self.converters()
+            if self.many:
+                return [self.to_representation(row, converters) for row in self.instance]
+            return self.to_representation(self.instance, converters)
+
+
+class ValuesListMixin:
+    """
+    Serve a generic view's GET list through ``values_serializer_class``.
+
+    get_serializer_class() is left alone, so the ModelSerializer still
+    describes the endpoint (and writes); only list() reads values rows.
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.values_serializer_class
+        queryset = serializer_class.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer_class(page, many=True).data)
+        return Response(serializer_class(queryset, many=True).data)
@@ -26,6 +26,17 @@ if [ $attempt -eq $max_attempts ]; then
     exit 1
 fi
 
+# Catalog cache invalidation and carts live in the cache, which a
+# per-process backend does not share between workers
+if [ "${GUNICORN_WORKERS:-4}" -gt 1 ]; then
+    case "${CACHE_BACKEND:-django.core.cache.backends.locmem.LocMemCache}" in
+        *locmem*|*dummy*)
+            echo "ERROR: CACHE_BACKEND must be shared (e.g. redis) with GUNICORN_WORKERS > 1"
+            exit 1
+            ;;
+    esac
+fi
+
 # Run migrations
 echo "Running database migrations..."
 python manage.py migrate --noinput
@@ -42,12 +53,32 @@ else
     echo "Skipping data population (set POPULATE_DATA=true to enable)"
 fi
 
-# Start the application with Gunicorn
-echo "Starting Gunicorn server..."
-exec gunicorn ecommerce_backend.wsgi:application \
+# Reset per-worker request metrics from previous runs
+rm -rf "${METRICS_DIR:-/tmp/ecommerce-metrics}"
+
+# Start the application with Gunicorn. SERVER_MODE=asgi runs uvicorn
+# workers on the ASGI app so the /api/async/ views run on the event loop.
+# GUNICORN_THREADS > 1 runs threaded (gthread) WSGI workers; pair it with
+# DB_POOL_SIZE >= GUNICORN_THREADS to share connections between threads.
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    APP=ecommerce_backend.asgi:application
+    WORKER_CLASS=uvicorn.workers.UvicornWorker
+    # Django cannot reuse connections across async requests
+    export DB_CONN_MAX_AGE=0
+elif [ "${GUNICORN_THREADS:-1}" -gt 1 ]; then
+    APP=ecommerce_backend.wsgi:application
+    WORKER_CLASS=gthread
+else
+    APP=ecommerce_backend.wsgi:application
+    WORKER_CLASS=sync
+fi
+
+echo "Starting Gunicorn server (${SERVER_MODE:-wsgi})..."
+exec gunicorn "$APP" \
     --bind 0.0.0.0:8000 \
     --workers ${GUNICORN_WORKERS:-4} \
-    --worker-class sync \
+    --worker-class "$WORKER_CLASS" \
+    --threads ${GUNICORN_THREADS:-1} \
     --timeout ${GUNICORN_TIMEOUT:-30} \
     --keep-alive 2 \
     --max-requests ${GUNICORN_MAX_REQUESTS:-1000} \
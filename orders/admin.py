@@ -1,9 +1,23 @@
 from django.contrib import admin
-from .models import Order
+from django.db.models.functions import Lower
+from ecommerce_backend.scalable_admin import ScalableAdmin
+from .models import CartReservation, Order, OrderLine
+
+
+class OrderLineInline(admin.TabularInline):
+    """Read-only view of the order's lines and price snapshots"""
+    model = OrderLine
+    fields = ['product', 'quantity', 'unit_price']
+    readonly_fields = ['product', 'quantity', 'unit_price']
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ScalableAdmin):
     """
     Admin configuration for Order model
     """
@@ -13,14 +27,16 @@ class OrderAdmin(admin.ModelAdmin):
     ]
     list_filter = ['created_at', 'updated_at']
     search_fields = ['customer_name', 'email']
-    readonly_fields = ['created_at', 'updated_at', 'total_price']
+    search_help_text = 'An exact email, the start of the customer name, or an order id'
+    readonly_fields = ['created_at', 'updated_at', 'total_price', 'items_count']
+    inlines = [OrderLineInline]
     
     fieldsets = (
         ('Customer Information', {
             'fields': ('customer_name', 'email', 'address')
         }),
         ('Order Details', {
-            'fields': ('total_price', 'items')
+            'fields': ('total_price', 'items', 'items_count')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -28,13 +44,39 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
     
-    def items_count(self, obj):
-        """Display number of items in order"""
-        return sum(item.get('quantity', 0) for item in obj.items_list)
-    items_count.short_description = 'Items Count'
-    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search through indexes only: the id, LOWER(email) equality
+        (order_email_lower_idx) or a LOWER(customer_name) prefix
+        (order_customer_name_lower_idx), never a LIKE '%...%' scan.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        if '@' in term:
+            return queryset & Order.for_email(term), False
+        return queryset.alias(customer_name_lower=Lower('customer_name')).filter(
+            customer_name_lower__startswith=term.lower()
+        ), False
+
     def get_readonly_fields(self, request, obj=None):
         """Make total_price readonly for existing orders"""
         if obj:  # editing an existing object
             return self.readonly_fields + ['items']
         return self.readonly_fields
+
+
+@admin.register(CartReservation)
+class CartReservationAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the stock held by carts
+    """
+    list_display = ['cart_token', 'product', 'quantity', 'unit_price', 'expires_at']
+    list_filter = ['expires_at']
+    search_fields = ['cart_token']
+    readonly_fields = ['cart_token', 'product', 'quantity', 'unit_price', 'expires_at']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,193 @@
+"""
+Batch order submission.
+
+Every order of a batch is validated against one shared ProductResolver (a
+single product query), stock for the whole batch is reserved with one
+aggregated conditional UPDATE, and orders and their lines are inserted
+with bulk_create - all in one transaction.
+
+With the all_or_nothing policy any failing order rejects the whole batch.
+With best_effort the orders that fit are created, keeping submission order
+when stock runs short.
+"""
+from collections import Counter
+
+from django.db import transaction
+from rest_framework import status
+from rest_framework.settings import api_settings
+
+from products import stripes
+from products.models import Product
+from products.resolvers import ProductResolver
+
+from . import sales
+from .models import Order, OrderLine
+from .serializers import OrderBatchSerializer, OrderSerializer
+
+CREATED = 'created'
+FAILED = 'failed'
+REJECTED = 'rejected'
+
+
+def quantities_of(validated_data):
+    return {item['product_id']: item['quantity'] for item in validated_data['items']}
+
+
+def total_quantities(pending):
+    """Aggregated {product_id: quantity} over (index, validated_data) pairs"""
+    totals = Counter()
+    for _, validated_data in pending:
+        totals.update(quantities_of(validated_data))
+    return dict(sorted(totals.items()))
+
+
+class OrderBatch:
+    """Validates, reserves and creates a batch of orders"""
+
+    def __init__(self, orders_data, policy=OrderBatchSerializer.ALL_OR_NOTHING):
+        self.orders_data = orders_data
+        self.policy = policy
+        self.resolver = ProductResolver()
+        self.results = [None] * len(orders_data)
+
+    @property
+    def all_or_nothing(self):
+        return self.policy == OrderBatchSerializer.ALL_OR_NOTHING
+
+    def fail(self, index, errors):
+        if not isinstance(errors, dict):
+            errors = {api_settings.NON_FIELD_ERRORS_KEY: [errors]}
+        self.results[index] = {'index': index, 'status': FAILED, 'errors': errors}
+
+    def reject(self, pending):
+        """Mark valid orders as not created because another order failed"""
+        for index, _ in pending:
+            self.results[index] = {
+                'index': index,
+                'status': REJECTED,
+                'errors': {api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Not created: another order in the batch failed.'
+                ]},
+            }
+
+    def validate(self):
+        """Validate every order; returns the (index, validated_data) that passed"""
+        product_ids = set()
+        for data in self.orders_data:
+            if isinstance(data, dict):
+                product_ids |= ProductResolver.product_ids_from(data.get('items'))
+        self.resolver.prime(product_ids)
+
+        valid = []
+        for index, data in enumerate(self.orders_data):
+            serializer = OrderSerializer(
+                data=data, context={'product_resolver': self.resolver}
+            )
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                self.fail(index, serializer.errors)
+        return valid
+
+    def allocate(self, pending):
+        """
+        Lock the batch's products (and the stripes of striped ones) and
+        keep, in submission order, the orders whose every line still fits
+        the remaining stock.
+        """
+        rows = list(
+            Product.objects.select_for_update()
+            .filter(pk__in=list(total_quantities(pending)))
+            .order_by('pk')
+            .values_list('pk', 'stock', 'stock_stripes')
+        )
+        stock = {pk: units for pk, units, _ in rows}
+        # Product.stock only caches a striped product's total, and orders
+        # take from its stripes without locking the product row
+        for pk, _, stripe_count in rows:
+            if stripe_count:
+                stock[pk] = sum(stripes.units_by_stripe(pk, lock=True).values())
+        kept = []
+        for index, validated_data in pending:
+            wanted = quantities_of(validated_data)
+            short = [pid for pid, quantity in wanted.items() if stock.get(pid, 0) < quantity]
+            if short:
+                names = ', '.join(self.resolver.get(pid).name for pid in short)
+                self.fail(index, f'Insufficient stock for product: {names}')
+                continue
+            for pid, quantity in wanted.items():
+                stock[pid] -= quantity
+            kept.append((index, validated_data))
+        return kept
+
+    def reserve(self, pending):
+        """Reserve stock for the orders that can be created; returns them"""
+        if Product.reserve_stock(total_quantities(pending)):
+            return pending
+
+        kept = self.allocate(pending)
+        if self.all_or_nothing and len(kept) < len(pending):
+            self.reject(kept)
+            return []
+        if kept and not Product.reserve_stock(total_quantities(kept)):
+            # Only reachable without row locks (SQLite), where nothing held
+            # the stock still between allocate() and here
+            for index, _ in kept:
+                self.fail(index, 'Stock changed while reserving; retry the order.')
+            return []
+        return kept
+
+    def insert(self, pending):
+        products = self.resolver.get_many(list(total_quantities(pending)))
+        built = [
+            OrderSerializer.build_order(validated_data, products)
+            for _, validated_data in pending
+        ]
+        orders = Order.objects.bulk_create([order for order, _ in built])
+        lines = []
+        for order, order_lines in built:
+            for line in order_lines:
+                line.order = order
+                lines.append(line)
+        OrderLine.objects.bulk_create(lines)
+        sales.record_on_commit(built)
+
+        for (index, _), order in zip(pending, orders):
+            self.results[index] = {
+                'index': index,
+                'status': CREATED,
+                'order': OrderSerializer(order).data,
+            }
+
+    @transaction.atomic
+    def submit(self):
+        pending = self.validate()
+        if self.all_or_nothing and len(pending) < len(self.orders_data):
+            self.reject(pending)
+            return self.results
+        if pending:
+            pending = self.reserve(pending)
+        if pending:
+            self.insert(pending)
+        return self.results
+
+    @property
+    def created(self):
+        return sum(1 for result in self.results if result and result['status'] == CREATED)
+
+    @property
+    def status_code(self):
+        """201 when every order was created, 207 when some were, 400 when none"""
+        if self.created == len(self.results):
+            return status.HTTP_201_CREATED
+        if self.created:
+            return status.HTTP_207_MULTI_STATUS
+        return status.HTTP_400_BAD_REQUEST
+
+    def summary(self):
+        return {
+            'policy': self.policy,
+            'created': self.created,
+            'failed': len(self.results) - self.created,
+            'results': self.results,
+        }
@@ -0,0 +1,308 @@
+"""
+Server-side carts with expiring stock holds.
+
+A cart is identified by a token (the X-Cart-Token header, a ``cart_token``
+field, or one kept in the session for browser clients). Its contents are
+cached under ``cart:<token>`` so reads never touch the database. Every item
+is also a CartReservation row that has already taken its units out of
+Product.stock, so stock cannot vanish between cart and checkout. Holds
+expire CART_RESERVATION_TTL seconds after the cart was last changed and are
+released in bulk by release_expired_reservations (release_expired_carts
+command).
+"""
+import secrets
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from products.models import Product
+
+from . import sales
+from .models import CartReservation, Order, OrderLine
+
+CART_TOKEN_HEADER = 'HTTP_X_CART_TOKEN'
+SESSION_KEY = 'cart_token'
+SWEEP_BATCH_SIZE = 1000
+
+
+class CartError(Exception):
+    """An item cannot be added to the cart"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def cart_token_from(request, create=False):
+    """Token sent by the client, else the session's, else a new one if ``create``"""
+    data = request.data if hasattr(request.data, 'get') else {}
+    token = (
+        request.META.get(CART_TOKEN_HEADER)
+        or data.get('cart_token')
+        or request.query_params.get('cart_token')
+    )
+    if token:
+        return str(token)[:64]
+    session = getattr(request, 'session', None)
+    if session is not None and session.get(SESSION_KEY):
+        return session[SESSION_KEY]
+    if not create:
+        return None
+    token = secrets.token_urlsafe(24)
+    if session is not None:
+        # Browser clients keep the cart in their session
+        session[SESSION_KEY] = token
+    return token
+
+
+class Cart:
+    """Cached cart contents backed by CartReservation rows"""
+
+    def __init__(self, token, items=None, expires_at=None):
+        self.token = token
+        # {product_id: {'product_id', 'name', 'unit_price', 'quantity'}}
+        self.items = items or {}
+        self.expires_at = expires_at
+
+    @staticmethod
+    def cache_key(token):
+        return f'cart:{token}'
+
+    @classmethod
+    def load(cls, token):
+        """The cached cart, rebuilt from its reservations if evicted"""
+        data = cache.get(cls.cache_key(token))
+        if data is not None:
+            return cls(
+                token,
+                {item['product_id']: item for item in data['items']},
+                parse_datetime(data['expires_at']) if data['expires_at'] else None,
+            )
+        cart = cls(token)
+        reservations = CartReservation.objects.filter(cart_token=token).values_list(
+            'product_id', 'product__name', 'unit_price', 'quantity', 'expires_at'
+        )
+        for product_id, name, unit_price, quantity, expires_at in reservations:
+            cart.items[product_id] = cart.item(product_id, name, unit_price, quantity)
+            cart.expires_at = expires_at
+        if cart.items:
+            cart.save()
+        return cart
+
+    @staticmethod
+    def item(product_id, name, unit_price, quantity):
+        return {
+            'product_id': product_id,
+            'name': name,
+            'unit_price': str(unit_price),
+            'quantity': quantity,
+        }
+
+    def save(self):
+        if not self.items:
+            cache.delete(self.cache_key(self.token))
+            return
+        timeout = max((self.expires_at - timezone.now()).total_seconds(), 1)
+        cache.set(self.cache_key(self.token), {
+            'items': list(self.items.values()),
+            'expires_at': self.expires_at.isoformat(),
+        }, timeout=timeout)
+
+    @property
+    def total(self):
+        return sum(
+            (Decimal(item['unit_price']) * item['quantity'] for item in self.items.values()),
+            Decimal('0.00'),
+        )
+
+    def to_representation(self):
+        return {
+            'cart_token': self.token,
+            'items': [
+                {**item, 'total': str(Decimal(item['unit_price']) * item['quantity'])}
+                for item in self.items.values()
+            ],
+            'total': str(self.total),
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+    def touch(self):
+        """Push the expiry of every hold of the cart forward"""
+        self.expires_at = timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL)
+        CartReservation.objects.filter(cart_token=self.token).update(expires_at=self.expires_at)
+
+    @transaction.atomic
+    def add(self, product_id, quantity):
+        """Hold ``quantity`` more units of a product and return the cart item"""
+        try:
+            product = Product.objects.only('id', 'name', 'price', 'stock').get(pk=product_id)
+        except Product.DoesNotExist:
+            raise CartError('Product not found', status_code=404)
+        if not product.is_in_stock:
+            raise CartError('Product is out of stock')
+        if product.stock < quantity or not Product.reserve_stock({product.pk: quantity}):
+            product.refresh_from_db(fields=['stock'])
+            raise CartError(f'Only {product.stock} items available in stock')
+
+        held = self.items.get(product.pk, {}).get('quantity', 0)
+        self.items[product.pk] = self.item(product.pk, product.name, product.price, held + quantity)
+        self.touch()
+        # Rows always count the units actually taken from stock, even if
+        # the cached cart has drifted from them
+        grown = CartReservation.objects.filter(
+            cart_token=self.token, product=product
+        ).update(quantity=F('quantity') + quantity, unit_price=product.price)
+        if not grown:
+            try:
+                with transaction.atomic():
+                    CartReservation.objects.create(
+                        cart_token=self.token,
+                        product=product,
+                        quantity=quantity,
+                        unit_price=product.price,
+                        expires_at=self.expires_at,
+                    )
+            except IntegrityError:
+                # A concurrent first add of the product created the row
+                # after our UPDATE missed it; grow that row instead
+                CartReservation.objects.filter(
+                    cart_token=self.token, product=product
+                ).update(quantity=F('quantity') + quantity, unit_price=product.price)
+        transaction.on_commit(self.save)
+        return self.items[product.pk]
+
+    @transaction.atomic
+    def remove(self, product_id):
+        """Drop a product from the cart and give its held units back"""
+        item = self.items.pop(product_id, None)
+        reservations = CartReservation.objects.select_for_update().filter(
+            cart_token=self.token, product_id=product_id
+        )
+        held = reservations.values_list('quantity', flat=True).first()
+        if held:
+            reservations.delete()
+            Product.release_stock({product_id: held})
+        transaction.on_commit(self.save)
+        return item
+
+    @staticmethod
+    def held(token):
+        """{product_id: quantity} held by a cart's reservations"""
+        return dict(
+            CartReservation.objects.filter(cart_token=token).values_list('product_id', 'quantity')
+        )
+
+    def consume(self, quantities):
+        """
+        Use the cart's holds for an order placed through POST /orders/
+        rather than checkout. Takes up to the ordered quantity of each
+        product out of the cart and returns {product_id: units taken}; those
+        units already left Product.stock when they were added, so the
+        caller only reserves the rest. Call it in the order's transaction.
+        """
+        reservations = CartReservation.objects.select_for_update().filter(
+            cart_token=self.token, product_id__in=list(quantities)
+        )
+        held = dict(reservations.values_list('product_id', 'quantity'))
+        taken = {pid: min(quantity, quantities[pid]) for pid, quantity in held.items()}
+        used_up = [pid for pid, quantity in held.items() if taken[pid] == quantity]
+        if used_up:
+            reservations.filter(product_id__in=used_up).delete()
+        for pid, units in taken.items():
+            if pid in used_up:
+                self.items.pop(pid, None)
+                continue
+            reservations.filter(product_id=pid).update(quantity=F('quantity') - units)
+            if pid in self.items:
+                self.items[pid]['quantity'] = held[pid] - units
+        if taken:
+            transaction.on_commit(self.save)
+        return taken
+
+    @transaction.atomic
+    def checkout(self, customer):
+        """
+        Turn the cart into an order priced from the cart's snapshots.
+
+        The reservation rows are authoritative for what is held (a cached
+        cart may be stale on another worker) and carry the price snapshot,
+        so products are never queried. Items whose hold was already swept
+        are priced from the cached cart and reserved again.
+        """
+        lines = {
+            pid: (quantity, unit_price)
+            for pid, quantity, unit_price in CartReservation.objects.select_for_update()
+            .filter(cart_token=self.token)
+            .values_list('product_id', 'quantity', 'unit_price')
+        }
+        swept = {
+            pid: item['quantity'] for pid, item in sorted(self.items.items())
+            if pid not in lines
+        }
+        if not lines and not swept:
+            raise serializers.ValidationError('Cart is empty.')
+        if swept and not Product.reserve_stock(swept):
+            names = ', '.join(self.items[pid]['name'] for pid in swept)
+            raise serializers.ValidationError(
+                f'Reservation expired and stock ran out for product: {names}'
+            )
+        for pid, quantity in swept.items():
+            lines[pid] = (quantity, Decimal(self.items[pid]['unit_price']))
+        CartReservation.objects.filter(cart_token=self.token).delete()
+
+        order = Order.objects.create(
+            total_price=sum(
+                (unit_price * quantity for quantity, unit_price in lines.values()),
+                Decimal('0.00'),
+            ),
+            items=[
+                {'product_id': pid, 'quantity': quantity}
+                for pid, (quantity, _) in lines.items()
+            ],
+            items_count=sum(quantity for quantity, _ in lines.values()),
+            **customer
+        )
+        order_lines = OrderLine.objects.bulk_create([
+            OrderLine(order=order, product_id=pid, quantity=quantity, unit_price=unit_price)
+            for pid, (quantity, unit_price) in lines.items()
+        ])
+        sales.record_on_commit([(order, order_lines)])
+        self.items = {}
+        transaction.on_commit(self.save)
+        return order
+
+
+def release_expired_reservations(now=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Give the stock of every expired hold back, one batch per transaction:
+    one aggregated stock UPDATE and one DELETE per batch. Rows locked by a
+    concurrent checkout are skipped and picked up by the next run.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                CartReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by('pk')
+                .values_list('pk', 'product_id', 'quantity')[:batch_size]
+            )
+            if not rows:
+                return released
+            totals = {}
+            for _, product_id, quantity in rows:
+                totals[product_id] = totals.get(product_id, 0) + quantity
+            Product.release_stock(dict(sorted(totals.items())))
+            CartReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+        released += len(rows)
+        if len(rows) < batch_size:
+            return released
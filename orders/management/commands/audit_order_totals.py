@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.repricing import AUDIT_CHUNK_SIZE, PRICE_SOURCES, SNAPSHOT, TotalAudit
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute order totals from the orders\' items and report (or fix) '
+        'the ones that differ, at snapshot or current prices'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prices', choices=PRICE_SOURCES, default=SNAPSHOT,
+            help='snapshot: the unit prices of each order\'s lines; current: '
+                 'today\'s product prices (default: snapshot)'
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Write the recomputed totals back (with --prices current, '
+                 'also the line prices) and adjust the sales summaries'
+        )
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='First day to audit, YYYY-MM-DD (default: the first order)'
+        )
+        parser.add_argument(
+            '--until', type=date.fromisoformat,
+            help='Last day to audit, YYYY-MM-DD (default: the last order)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=AUDIT_CHUNK_SIZE,
+            help=f'Order ids audited per chunk (default: {AUDIT_CHUNK_SIZE})'
+        )
+        parser.add_argument(
+            '--show', type=int, default=20,
+            help='Discrepancies to list (default: 20)'
+        )
+
+    def handle(self, *args, **options):
+        since, until = options['since'], options['until']
+        if since and until and since > until:
+            raise CommandError('--since must not be after --until')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        audit = TotalAudit(
+            prices=options['prices'], since=since, until=until, fix=options['fix'],
+            chunk_size=options['chunk_size'], sample=max(options['show'], 0),
+        )
+        audit.run(log=self.stdout.write if options['verbosity'] >= 2 else None)
+
+        for order_id, stored, computed in audit.discrepancies:
+            if computed is None:
+                self.stdout.write(f'Order #{order_id}: {stored} stored, unpriced (product deleted)')
+            else:
+                self.stdout.write(
+                    f'Order #{order_id}: {stored} stored, {computed} computed '
+                    f'({computed - stored:+})'
+                )
+        self.stdout.write(
+            f'Audited {audit.audited} orders at {audit.prices} prices in '
+            f'{audit.elapsed:.1f}s ({audit.throughput:.0f} orders/s)'
+        )
+        summary = (
+            f'{audit.mismatched} totals differ by {audit.difference:+} in all, '
+            f'{audit.unpriced} orders unpriced'
+        )
+        if audit.fix:
+            summary += f', {audit.fixed} orders fixed'
+        style = self.style.WARNING if audit.mismatched or audit.unpriced else self.style.SUCCESS
+        self.stdout.write(style(summary))
@@ -0,0 +1,41 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.sales import REBUILD_CHUNK_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the daily and per-product sales summaries of a date range '
+        'from order history, in order-id chunks of one transaction'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='First day to rebuild, YYYY-MM-DD (default: the first order)'
+        )
+        parser.add_argument(
+            '--until', type=date.fromisoformat,
+            help='Last day to rebuild, YYYY-MM-DD (default: the last order)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+            help=f'Order ids aggregated per statement (default: {REBUILD_CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        since, until = options['since'], options['until']
+        if since and until and since > until:
+            raise CommandError('--since must not be after --until')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        started = time.monotonic()
+        log = self.stdout.write if options['verbosity'] >= 2 else None
+        summarized = rebuild(since, until, chunk_size=options['chunk_size'], log=log)
+        self.stdout.write(self.style.SUCCESS(
+            f'Summarized {summarized} orders in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.cart import SWEEP_BATCH_SIZE, release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Give the stock held by expired cart reservations back, in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=SWEEP_BATCH_SIZE,
+            help=f'Reservations released per transaction (default: {SWEEP_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--loop', type=int, metavar='SECONDS',
+            help='Keep running, sweeping every SECONDS instead of once'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_reservations(batch_size=options['batch_size'])
+            if released or options['loop'] is None:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Released {released} expired cart reservations')
+                )
+            if options['loop'] is None:
+                return
+            time.sleep(options['loop'])
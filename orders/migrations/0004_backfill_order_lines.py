@@ -0,0 +1,74 @@
+# Backfill OrderLine rows and Order.items_count from the Order.items JSON.
+#
+# Orders are processed in primary-key chunks so memory stays flat on large
+# tables. Historical orders have no recorded prices, so their lines take the
+# product's current price; items for products that no longer exist are
+# counted in items_count but get no line.
+
+from django.db import migrations
+
+CHUNK_SIZE = 1000
+
+
+def backfill_order_lines(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderLine = apps.get_model('orders', 'OrderLine')
+    Product = apps.get_model('products', 'Product')
+
+    last_pk = 0
+    while True:
+        orders = list(
+            Order.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'items')[:CHUNK_SIZE]
+        )
+        if not orders:
+            break
+        last_pk = orders[-1].pk
+
+        merged = {}
+        for order in orders:
+            quantities = {}
+            for item in order.items if isinstance(order.items, list) else []:
+                try:
+                    product_id = int(item.get('product_id'))
+                    quantity = int(item.get('quantity', 0))
+                except (AttributeError, TypeError, ValueError):
+                    continue
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            merged[order.pk] = quantities
+            order.items_count = sum(quantities.values())
+
+        product_ids = {pid for quantities in merged.values() for pid in quantities}
+        prices = dict(
+            Product.objects.filter(pk__in=product_ids).values_list('pk', 'price')
+        )
+
+        OrderLine.objects.bulk_create([
+            OrderLine(
+                order_id=order_pk,
+                product_id=product_id,
+                quantity=quantity,
+                unit_price=prices[product_id],
+            )
+            for order_pk, quantities in merged.items()
+            for product_id, quantity in quantities.items()
+            if product_id in prices and quantity > 0
+        ], ignore_conflicts=True)
+        Order.objects.bulk_update(orders, ['items_count'])
+
+
+def clear_order_lines(apps, schema_editor):
+    OrderLine = apps.get_model('orders', 'OrderLine')
+    OrderLine.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_lines'),
+        ('products', '0004_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_lines, clear_order_lines),
+    ]
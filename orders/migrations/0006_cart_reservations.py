@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_sku'),
+        ('orders', '0005_order_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_token', models.CharField(help_text='Cart the hold belongs to', max_length=64)),
+                ('quantity', models.PositiveIntegerField(help_text='Units held')),
+                ('unit_price', models.DecimalField(decimal_places=2, help_text='Product price when the item was last added', max_digits=10)),
+                ('expires_at', models.DateTimeField(help_text='When the hold is released')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_reservations', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Cart Reservation',
+                'verbose_name_plural': 'Cart Reservations',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['expires_at'], name='cart_reservation_expiry_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartreservation',
+            constraint=models.UniqueConstraint(fields=('cart_token', 'product'), name='unique_cart_reservation_product'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Index for admin searches on the start of a customer name.
+#
+# LOWER(customer_name) LIKE 'prefix%' can only use a btree index whose
+# operator class compares bytes rather than collation order, and Django
+# cannot declare an operator class on an expression portably, so the
+# index is created here for PostgreSQL only. Other backends search
+# without it.
+
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    "CREATE INDEX IF NOT EXISTS order_customer_name_lower_idx "
+    "ON orders_order (LOWER(customer_name) text_pattern_ops)"
+)
+POSTGRES_REVERSE = "DROP INDEX IF EXISTS order_customer_name_lower_idx"
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_FORWARD)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_sales_summaries'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from collections.abc import Mapping
 from decimal import Decimal
 import json
 
@@ -18,52 +21,254 @@ class Order(models.Model):
     items = models.JSONField(
         help_text="Order items as JSON (product IDs and quantities)"
     )
+    items_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Total quantity across all items (denormalized for listings)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Supports keyset pagination on (-created_at, -id)
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            # Case-insensitive customer lookups, already in listing order
+            models.Index(
+                Lower('email'), F('created_at').desc(), F('id').desc(),
+                name='order_email_lower_idx'
+            ),
+            # max(updated_at) of the list's conditional GET validators
+            models.Index(fields=['updated_at'], name='order_updated_at_idx'),
+        ]
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer_name}"
 
+    @classmethod
+    def for_email(cls, email):
+        """
+        Orders for an email address, case-insensitively. Filters on
+        LOWER(email) so the lookup can use order_email_lower_idx, which
+        email__iexact (UPPER(...) LIKE on some backends) cannot.
+        """
+        return cls.objects.alias(email_lower=Lower('email')).filter(
+            email_lower=email.strip().lower()
+        )
+
     @property
     def items_list(self):
         """Return items as a list for easier handling"""
         return self.items if isinstance(self.items, list) else []
 
     def add_item(self, product_id, quantity):
-        """Add an item to the order"""
-        items = self.items_list.copy()
-        
-        # Check if product already exists in order
-        for item in items:
-            if item.get('product_id') == product_id:
-                item['quantity'] += quantity
-                break
-        else:
-            # Add new item
-            items.append({
-                'product_id': product_id,
-                'quantity': quantity
-            })
-        
-        self.items = items
-        self.save()
+        """
+        Add ``quantity`` units of a product to a saved order. Stock is
+        reserved with Product.reserve_stock and the OrderLine, items,
+        items_count, total_price and sales summaries are updated in the
+        same transaction. A product already in the order keeps its line's
+        price snapshot. Returns False, changing nothing, when the product
+        does not exist or is short of stock.
+        """
+        from products.models import Product
+        from . import sales
+
+        with transaction.atomic():
+            price = Product.objects.filter(pk=product_id).values_list('price', flat=True).first()
+            if price is None or not Product.reserve_stock({product_id: quantity}):
+                return False
+
+            line = OrderLine.objects.select_for_update().filter(
+                order=self, product_id=product_id
+            ).first()
+            if line is None:
+                line = OrderLine.objects.create(
+                    order=self, product_id=product_id, quantity=quantity, unit_price=price
+                )
+                new_line = True
+            else:
+                line.quantity += quantity
+                line.save(update_fields=['quantity'])
+                new_line = False
+
+            items = [dict(item) for item in self.items_list]
+            for item in items:
+                if item.get('product_id') == product_id:
+                    item['quantity'] += quantity
+                    break
+            else:
+                items.append({'product_id': product_id, 'quantity': quantity})
+
+            self.items = items
+            self.items_count = sum(item.get('quantity', 0) for item in items)
+            self.total_price += line.unit_price * quantity
+            self.save(update_fields=['items', 'items_count', 'total_price', 'updated_at'])
+            sales.record_item_on_commit(self, product_id, quantity, line.unit_price, new_line)
+        return True
 
     def calculate_total(self, products_data):
-        """Calculate total price based on products data"""
+        """
+        Calculate total price based on products data: a list of product
+        dicts with 'id' and 'price', or a {product_id: price} mapping.
+        Items whose product is not in it are left out.
+        """
+        if isinstance(products_data, Mapping):
+            prices = products_data
+        else:
+            prices = {}
+            for product in products_data:
+                prices.setdefault(product['id'], product['price'])
+
         total = Decimal('0.00')
         for item in self.items_list:
-            product_id = item.get('product_id')
-            quantity = item.get('quantity', 0)
-            
-            # Find product price in products_data
-            for product in products_data:
-                if product['id'] == product_id:
-                    total += Decimal(str(product['price'])) * quantity
-                    break
-        
+            price = prices.get(item.get('product_id'))
+            if price is not None:
+                if not isinstance(price, Decimal):
+                    price = Decimal(str(price))
+                total += price * item.get('quantity', 0)
         return total
+
+
+class OrderLine(models.Model):
+    """
+    One product line of an order, with the unit price snapshotted at
+    checkout so later price changes do not rewrite order history.
+    """
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='lines'
+    )
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='order_lines'
+    )
+    quantity = models.PositiveIntegerField(help_text="Quantity ordered")
+    unit_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Product price at the time of the order"
+    )
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Order Line'
+        verbose_name_plural = 'Order Lines'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['order', 'product'], name='unique_order_line_product'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x product #{self.product_id} (order #{self.order_id})"
+
+    @property
+    def line_total(self):
+        """Price of the line at checkout"""
+        return self.unit_price * self.quantity
+
+
+class CartReservation(models.Model):
+    """
+    Stock held for one product of a cart until ``expires_at``.
+
+    Adding to a cart decrements Product.stock right away, so the held units
+    cannot be sold to anyone else. Checkout consumes the rows, and
+    release_expired_carts gives expired holds back to stock.
+    """
+    cart_token = models.CharField(max_length=64, help_text="Cart the hold belongs to")
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='cart_reservations'
+    )
+    quantity = models.PositiveIntegerField(help_text="Units held")
+    unit_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Product price when the item was last added"
+    )
+    expires_at = models.DateTimeField(help_text="When the hold is released")
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['expires_at'], name='cart_reservation_expiry_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cart_token', 'product'], name='unique_cart_reservation_product'
+            ),
+        ]
+        verbose_name = 'Cart Reservation'
+        verbose_name_plural = 'Cart Reservations'
+
+    def __str__(self):
+        return f"{self.quantity} x product #{self.product_id} (cart {self.cart_token})"
+
+
+class DailySales(models.Model):
+    """
+    Orders, units and revenue of one day (in TIME_ZONE), kept up to date
+    as orders are created; see orders.sales.
+    """
+    day = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        ordering = ['day']
+        verbose_name = 'Daily Sales'
+        verbose_name_plural = 'Daily Sales'
+
+    def __str__(self):
+        return f"{self.day}: {self.orders} orders, {self.revenue}"
+
+
+class ProductSalesBase(models.Model):
+    """Orders, units and revenue of one product over one period"""
+    # No database constraint: sales history outlives deleted products
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        abstract = True
+
+
+class ProductDailySales(ProductSalesBase):
+    """One product's sales on one day"""
+    day = models.DateField()
+
+    class Meta:
+        ordering = ['day', 'product']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='unique_product_daily_sales'),
+        ]
+        verbose_name = 'Product Daily Sales'
+        verbose_name_plural = 'Product Daily Sales'
+
+
+class ProductMonthlySales(ProductSalesBase):
+    """One product's sales in one calendar month (``month`` is its first day)"""
+    month = models.DateField()
+
+    class Meta:
+        ordering = ['month', 'product']
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'product'], name='unique_product_monthly_sales'),
+        ]
+        verbose_name = 'Product Monthly Sales'
+        verbose_name_plural = 'Product Monthly Sales'
@@ -0,0 +1,184 @@
+"""
+Auditing and repricing order totals in bulk.
+
+TotalAudit recomputes Order.total_price with Order.calculate_total for
+every order in a date range and reports the orders whose stored total
+differs. Prices come from one of two sources:
+
+* snapshot: each order's own OrderLine.unit_price, i.e. what the customer
+  was charged. A difference means the stored total does not match the
+  order's items, and fixing it rewrites total_price.
+* current: Product.price today. Fixing reprices the orders, rewriting
+  both total_price and the unit prices of their lines.
+
+Current prices are loaded into a {product_id: price} index once. Orders
+are streamed in chunks of ids, so each chunk is an index range scan and
+memory stays flat however many orders there are. Snapshot prices come
+with the chunk, in one query for all of its lines. With fix, every chunk
+is corrected in its own transaction: one bulk_update for the orders, one
+for the lines, and the sales summaries (see orders.sales) are adjusted by
+the same amounts.
+
+An order item whose price cannot be found (the product was deleted) makes
+the order unpriced: it is counted and reported, but never rewritten.
+
+``manage.py audit_order_totals`` runs an audit from the command line.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from products.models import Product
+
+from . import sales
+from .models import DailySales, Order, OrderLine, ProductDailySales, ProductMonthlySales
+
+SNAPSHOT = 'snapshot'
+CURRENT = 'current'
+PRICE_SOURCES = [SNAPSHOT, CURRENT]
+AUDIT_CHUNK_SIZE = 10000
+UPDATE_BATCH_SIZE = 1000
+
+
+def price_index():
+    """{product_id: price} of every product, read once"""
+    return dict(
+        Product.objects.order_by().values_list('pk', 'price').iterator(chunk_size=AUDIT_CHUNK_SIZE)
+    )
+
+
+class TotalAudit:
+    """Compares stored order totals with recomputed ones, optionally fixing them"""
+
+    def __init__(self, prices=SNAPSHOT, since=None, until=None, fix=False,
+                 chunk_size=AUDIT_CHUNK_SIZE, sample=20):
+        if prices not in PRICE_SOURCES:
+            raise ValueError(f'prices must be one of {", ".join(PRICE_SOURCES)}')
+        self.prices = prices
+        self.since = since
+        self.until = until
+        self.fix = fix
+        self.chunk_size = chunk_size
+        self.sample = sample
+
+        self.audited = 0
+        self.mismatched = 0
+        self.unpriced = 0
+        self.fixed = 0
+        self.difference = Decimal('0.00')
+        self.discrepancies = []
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """Orders audited per second"""
+        return self.audited / self.elapsed if self.elapsed else 0.0
+
+    def orders(self):
+        orders = Order.objects.all()
+        if self.since:
+            orders = orders.filter(created_at__gte=sales.day_start(self.since))
+        if self.until:
+            orders = orders.filter(created_at__lt=sales.day_start(self.until + timedelta(days=1)))
+        return orders
+
+    def run(self, log=None):
+        """Audit every order of the range; ``log`` receives a line per chunk"""
+        started = time.monotonic()
+        current = price_index() if self.prices == CURRENT else None
+        orders = self.orders()
+        bounds = orders.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is not None:
+            lower = bounds['first'] - 1
+            while lower < bounds['last']:
+                upper = min(lower + self.chunk_size, bounds['last'])
+                chunk = orders.filter(pk__gt=lower, pk__lte=upper)
+                if self.fix:
+                    with transaction.atomic():
+                        self.audit_chunk(chunk.select_for_update(), current)
+                else:
+                    self.audit_chunk(chunk, current)
+                lower = upper
+                self.elapsed = time.monotonic() - started
+                if log:
+                    log(f'Orders up to #{upper}: {self.audited} audited, '
+                        f'{self.mismatched} mismatched ({self.throughput:.0f} orders/s)')
+        self.elapsed = time.monotonic() - started
+        return self
+
+    def audit_chunk(self, chunk, current):
+        orders = list(
+            chunk.order_by('pk').only('pk', 'items', 'total_price', 'created_at')
+        )
+        lines = {}
+        for line in OrderLine.objects.filter(order__in=[order.pk for order in orders]).only(
+            'pk', 'order_id', 'product_id', 'quantity', 'unit_price'
+        ):
+            lines.setdefault(line.order_id, []).append(line)
+
+        changed_orders = []
+        changed_lines = []
+        for order in orders:
+            self.audited += 1
+            order_lines = lines.get(order.pk, [])
+            if current is None:
+                prices = {line.product_id: line.unit_price for line in order_lines}
+            else:
+                prices = current
+            if any(item.get('product_id') not in prices for item in order.items_list):
+                self.unpriced += 1
+                self.report(order, None)
+                continue
+
+            total = order.calculate_total(prices)
+            repriced = [] if current is None else [
+                line for line in order_lines
+                if line.product_id is not None and line.unit_price != current[line.product_id]
+            ]
+            if total == order.total_price and not repriced:
+                continue
+            if total != order.total_price:
+                self.mismatched += 1
+                self.difference += total - order.total_price
+                self.report(order, total)
+            if self.fix:
+                changed_orders.append((order, total))
+                changed_lines.extend(repriced)
+
+        if changed_orders:
+            self.write(changed_orders, changed_lines, current)
+
+    def report(self, order, total):
+        if len(self.discrepancies) < self.sample:
+            self.discrepancies.append((order.pk, order.total_price, total))
+
+    def write(self, changed_orders, changed_lines, current):
+        """Store corrected totals and line prices and carry the change into the sales summaries"""
+        now = timezone.now()
+        daily = {}
+        by_product = {}
+        for order, total in changed_orders:
+            if total != order.total_price:
+                sales.add(daily, (timezone.localdate(order.created_at),), 0, 0, total - order.total_price)
+            order.total_price = total
+            order.updated_at = now
+        days = {order.pk: timezone.localdate(order.created_at) for order, _ in changed_orders}
+        for line in changed_lines:
+            price = current[line.product_id]
+            sales.add(
+                by_product, (days[line.order_id], line.product_id),
+                0, 0, (price - line.unit_price) * line.quantity,
+            )
+            line.unit_price = price
+
+        orders = [order for order, _ in changed_orders]
+        Order.objects.bulk_update(orders, ['total_price', 'updated_at'], batch_size=UPDATE_BATCH_SIZE)
+        OrderLine.objects.bulk_update(changed_lines, ['unit_price'], batch_size=UPDATE_BATCH_SIZE)
+        sales.increment(DailySales, ['day'], daily)
+        sales.increment(ProductDailySales, ['day', 'product'], by_product)
+        sales.increment(ProductMonthlySales, ['month', 'product'], sales.by_month(by_product))
+        self.fixed += len(orders)
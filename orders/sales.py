@@ -0,0 +1,385 @@
+"""
+Sales summaries kept up to date incrementally, so reports never scan orders.
+
+DailySales holds orders, units and revenue per day; ProductDailySales and
+ProductMonthlySales hold the same per product and day or calendar month.
+Days are calendar days in TIME_ZONE. Creating orders adds to the three
+tables with one multi-row upsert each (INSERT ... ON CONFLICT DO UPDATE
+SET x = x + excluded.x). The upserts run once the order's transaction has
+committed, so the row of the current day, which every order touches, is
+only locked for one short statement and never for a whole checkout.
+Deleting an order subtracts it again.
+
+``manage.py rebuild_sales_summaries`` recomputes a date range from the
+orders and their lines, in order-id chunks of one transaction that holds
+the summary tables locked. Run it once to fill the tables
+for existing orders. Run it again to repair a range after orders were
+edited in the admin, or after a worker died between an order's commit and
+its summary update.
+
+A per-product report over any range reads whole months from
+ProductMonthlySales and only the days of the partial months at either end
+from ProductDailySales. A year therefore costs at most 12 monthly rows
+and about 60 daily rows per product, however many orders it had.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from products.models import Product
+
+from .models import DailySales, Order, OrderLine, ProductDailySales, ProductMonthlySales
+
+VALUE_FIELDS = ['orders', 'units', 'revenue']
+UPSERT_BATCH_SIZE = 500
+REBUILD_CHUNK_SIZE = 50000
+PRODUCT_ORDERINGS = ['revenue', 'units', 'orders']
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def day_start(day):
+    """The aware datetime at which ``day`` starts in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def add(totals, key, orders, units, revenue):
+    row = totals.setdefault(key, [0, 0, Decimal('0.00')])
+    row[0] += orders
+    row[1] += units
+    row[2] += revenue
+
+
+def summarize(orders):
+    """
+    ({(day,): totals}, {(day, product_id): totals}) of (order, lines)
+    pairs, where totals are [orders, units, revenue].
+    """
+    daily = {}
+    by_product = {}
+    for order, lines in orders:
+        day = timezone.localdate(order.created_at)
+        add(daily, (day,), 1, order.items_count, order.total_price)
+        for product_id, quantity, unit_price in lines:
+            if product_id is not None:
+                add(by_product, (day, product_id), 1, quantity, unit_price * quantity)
+    return daily, by_product
+
+
+def by_month(by_product):
+    monthly = {}
+    for (day, product_id), values in by_product.items():
+        add(monthly, (month_of(day), product_id), *values)
+    return monthly
+
+
+def increment(model, key_fields, totals):
+    """
+    Add {key: [orders, units, revenue]} to a summary table, creating the
+    rows that do not exist yet, in multi-row upserts. Keys are written in
+    sorted order so concurrent upserts lock rows in the same order.
+    """
+    if not totals:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in key_fields + VALUE_FIELDS]
+    table = quote(model._meta.db_table)
+    columns = [quote(field.column) for field in fields]
+    keys = columns[:len(key_fields)]
+    sql = 'INSERT INTO {} ({}) VALUES {{}} ON CONFLICT ({}) DO UPDATE SET {}'.format(
+        table, ', '.join(columns), ', '.join(keys), ', '.join(
+            f'{column} = {table}.{column} + excluded.{column}'
+            for column in columns[len(key_fields):]
+        ),
+    )
+    placeholder = '({})'.format(', '.join(['%s'] * len(columns)))
+    rows = [key + tuple(values) for key, values in sorted(totals.items())]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            params = [
+                field.get_db_prep_value(value, connection)
+                for row in batch
+                for field, value in zip(fields, row)
+            ]
+            cursor.execute(sql.format(', '.join([placeholder] * len(batch))), params)
+
+
+def decrement(model, key_fields, totals):
+    """Subtract {key: [orders, units, revenue]} from existing summary rows"""
+    for key, (orders, units, revenue) in sorted(totals.items()):
+        rows = model.objects.filter(**dict(zip(key_fields, key)))
+        rows.update(
+            orders=F('orders') - orders,
+            units=F('units') - units,
+            revenue=F('revenue') - revenue,
+        )
+        # As if the period never had a sale, which is what rebuild() makes of it
+        rows.filter(orders=0).delete()
+
+
+def record(orders):
+    """Add (order, lines) pairs to the summaries; lines are (product_id, quantity, unit_price)"""
+    daily, by_product = summarize(orders)
+    increment(DailySales, ['day'], daily)
+    increment(ProductDailySales, ['day', 'product'], by_product)
+    increment(ProductMonthlySales, ['month', 'product'], by_month(by_product))
+
+
+def record_on_commit(orders):
+    """
+    Add created (order, [OrderLine, ...]) pairs to the summaries once the
+    current transaction commits. A failure is logged rather than failing
+    the request whose orders are already committed.
+    """
+    orders = [
+        (order, [(line.product_id, line.quantity, line.unit_price) for line in lines])
+        for order, lines in orders
+    ]
+    transaction.on_commit(lambda: record(orders), robust=True)
+
+
+def record_item_on_commit(order, product_id, quantity, unit_price, new_line):
+    """
+    Add units added to an existing order (Order.add_item) once the current
+    transaction commits. The order is already counted; the product counts
+    it once more only when it got a new line.
+    """
+    day = timezone.localdate(order.created_at)
+    revenue = unit_price * quantity
+    daily = {(day,): [0, quantity, revenue]}
+    by_product = {(day, product_id): [1 if new_line else 0, quantity, revenue]}
+
+    def apply():
+        increment(DailySales, ['day'], daily)
+        increment(ProductDailySales, ['day', 'product'], by_product)
+        increment(ProductMonthlySales, ['month', 'product'], by_month(by_product))
+
+    transaction.on_commit(apply, robust=True)
+
+
+def forget_on_commit(order):
+    """Subtract an order that is being deleted once the deletion commits"""
+    lines = list(
+        OrderLine.objects.filter(order_id=order.pk).values_list('product_id', 'quantity', 'unit_price')
+    )
+    daily, by_product = summarize([(order, lines)])
+
+    def forget():
+        decrement(DailySales, ['day'], daily)
+        decrement(ProductDailySales, ['day', 'product'], by_product)
+        decrement(ProductMonthlySales, ['month', 'product'], by_month(by_product))
+
+    transaction.on_commit(forget, robust=True)
+
+
+def lock_summaries(connection, outermost):
+    """
+    Start a rebuild's transaction: lock the summary tables against record()
+    and, on PostgreSQL, read every order from one snapshot taken after the
+    lock. SQLite transactions already read from one snapshot.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    tables = ', '.join(
+        connection.ops.quote_name(model._meta.db_table)
+        for model in (DailySales, ProductDailySales, ProductMonthlySales)
+    )
+    with connection.cursor() as cursor:
+        if outermost:
+            # Before any query, so the snapshot is taken after the lock
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        # Blocks the upserts and deletes of record() and forget_on_commit(),
+        # not the reports' reads
+        cursor.execute(f'LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE')
+
+
+def rebuild(since=None, until=None, chunk_size=REBUILD_CHUNK_SIZE, log=None):
+    """
+    Recompute the summaries of the days from ``since`` to ``until``
+    (inclusive, default: all of history) from the orders and their lines.
+
+    Everything runs in one transaction that first locks the summary
+    tables, so the range is cleared, its orders are aggregated in chunks of
+    ``chunk_size`` ids and the monthly rows of the months touched are
+    recomputed from one view of the orders. Orders that commit meanwhile
+    are not in that view; their record() waits for the lock and adds them
+    once the rebuild commits, so nothing is counted twice. Returns the
+    number of orders summarized.
+    """
+    orders = Order.objects.all()
+    days = {}
+    if since:
+        orders = orders.filter(created_at__gte=day_start(since))
+        days['day__gte'] = since
+    if until:
+        orders = orders.filter(created_at__lt=day_start(until + timedelta(days=1)))
+        days['day__lte'] = until
+
+    connection = connections[router.db_for_write(DailySales)]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(using=connection.alias):
+        lock_summaries(connection, outermost)
+        DailySales.objects.filter(**days).delete()
+        ProductDailySales.objects.filter(**days).delete()
+        bounds = orders.aggregate(first=Min('pk'), last=Max('pk'))
+        summarized = 0
+        if bounds['first'] is not None:
+            summarized = rebuild_days(orders, bounds, chunk_size, log)
+        rebuild_months(since, until)
+    return summarized
+
+
+def rebuild_days(orders, bounds, chunk_size, log=None):
+    """Aggregate ``orders`` into the daily tables in chunks of ids"""
+    summarized = 0
+    revenue = DecimalField(max_digits=16, decimal_places=2)
+    lower = bounds['first'] - 1
+    while lower < bounds['last']:
+        upper = min(lower + chunk_size, bounds['last'])
+        chunk = orders.filter(pk__gt=lower, pk__lte=upper)
+        daily = {
+            (row['day'],): [row['orders'], row['units'], row['revenue']]
+            for row in chunk.annotate(day=TruncDate('created_at'))
+            .values('day')
+            .annotate(orders=Count('pk'), units=Sum('items_count'), revenue=Sum('total_price'))
+            .order_by()
+        }
+        by_product = {
+            (row['day'], row['product_id']): [row['orders'], row['units'], row['revenue']]
+            for row in OrderLine.objects.filter(order__in=chunk, product__isnull=False)
+            .annotate(day=TruncDate('order__created_at'))
+            .values('day', 'product_id')
+            .annotate(
+                orders=Count('pk'),
+                units=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('unit_price'), output_field=revenue),
+            )
+            .order_by()
+        }
+        increment(DailySales, ['day'], daily)
+        increment(ProductDailySales, ['day', 'product'], by_product)
+        summarized += sum(count for count, _, _ in daily.values())
+        lower = upper
+        if log:
+            log(f'{summarized} orders summarized (ids up to {upper})')
+    return summarized
+
+
+@transaction.atomic
+def rebuild_months(since=None, until=None):
+    """Recompute ProductMonthlySales of the months overlapping a day range from the daily rows"""
+    months = {}
+    days = {}
+    if since:
+        months['month__gte'] = days['day__gte'] = month_of(since)
+    if until:
+        months['month__lte'] = month_of(until)
+        days['day__lt'] = month_of(month_of(until) + timedelta(days=31))
+    ProductMonthlySales.objects.filter(**months).delete()
+    rows = (
+        ProductDailySales.objects.filter(**days)
+        .annotate(period=TruncMonth('day'))
+        .values('period', 'product_id')
+        .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('period', 'product_id')
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=UPSERT_BATCH_SIZE * 10):
+        batch.append(ProductMonthlySales(
+            month=row['period'], product_id=row['product_id'], orders=row['orders'],
+            units=row['units'], revenue=row['revenue'],
+        ))
+        if len(batch) >= UPSERT_BATCH_SIZE * 10:
+            ProductMonthlySales.objects.bulk_create(batch, batch_size=UPSERT_BATCH_SIZE)
+            batch = []
+    ProductMonthlySales.objects.bulk_create(batch, batch_size=UPSERT_BATCH_SIZE)
+
+
+# Reports
+
+def sales_by_period(start, end, group='day', product_id=None):
+    """
+    Orders, units and revenue per day or month between two days
+    (inclusive), for every product or one. Periods without sales are left
+    out; returns (rows, totals).
+    """
+    if product_id is None:
+        rows = DailySales.objects.all()
+    else:
+        rows = ProductDailySales.objects.filter(product_id=product_id)
+    rows = rows.filter(day__range=(start, end))
+    if group == 'month':
+        rows = (
+            rows.annotate(period=TruncMonth('day')).values('period')
+            .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('period')
+        )
+    else:
+        rows = rows.annotate(period=F('day')).values('period', *VALUE_FIELDS).order_by('period')
+    rows = list(rows)
+    totals = {'orders': 0, 'units': 0, 'revenue': Decimal('0.00')}
+    for row in rows:
+        for field in VALUE_FIELDS:
+            totals[field] += row[field]
+    return rows, totals
+
+
+def whole_months(start, end):
+    """(first, last) month fully inside [start, end], or None"""
+    first = start if start.day == 1 else month_of(month_of(start) + timedelta(days=31))
+    last_day = end + timedelta(days=1)
+    last = month_of(end) if last_day.day == 1 else month_of(month_of(end) - timedelta(days=1))
+    return (first, last) if first <= last else None
+
+
+def sales_by_product(start, end, order_by='revenue', limit=50):
+    """
+    The ``limit`` products with the most revenue, units or orders between
+    two days (inclusive), with their names when they still exist.
+    """
+    months = whole_months(start, end)
+    sources = []
+    if months is None:
+        sources.append(ProductDailySales.objects.filter(day__range=(start, end)))
+    else:
+        first, last = months
+        sources.append(ProductMonthlySales.objects.filter(month__range=(first, last)))
+        if start < first:
+            sources.append(ProductDailySales.objects.filter(day__range=(start, first - timedelta(days=1))))
+        after = month_of(last + timedelta(days=31))
+        if after <= end:
+            sources.append(ProductDailySales.objects.filter(day__range=(after, end)))
+
+    totals = {}
+    for rows in sources:
+        for product_id, orders, units, revenue in (
+            rows.values('product_id')
+            .annotate(total_orders=Sum('orders'), total_units=Sum('units'), total_revenue=Sum('revenue'))
+            .values_list('product_id', 'total_orders', 'total_units', 'total_revenue')
+            .order_by()
+        ):
+            add(totals, product_id, orders, units, revenue)
+
+    position = VALUE_FIELDS.index(order_by)
+    top = sorted(totals.items(), key=lambda item: (-item[1][position], item[0]))[:limit]
+    names = dict(
+        Product.objects.filter(pk__in=[product_id for product_id, _ in top]).values_list('pk', 'name')
+    )
+    return [
+        {
+            'product_id': product_id,
+            'name': names.get(product_id),
+            'orders': orders,
+            'units': units,
+            'revenue': revenue,
+        }
+        for product_id, (orders, units, revenue) in top
+    ]
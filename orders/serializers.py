@@ -1,6 +1,15 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Order
+from ecommerce_backend.metrics import TimedSerializerMixin
+from ecommerce_backend.values_serializers import ValuesSerializer
+from . import sales
+from .cart import Cart, cart_token_from
+from .models import Order, OrderLine
 from products.models import Product
+from products.resolvers import ProductResolver
+from datetime import timedelta
 from decimal import Decimal
 
 
@@ -13,16 +22,17 @@ class OrderItemSerializer(serializers.Serializer):
 
     def validate_product_id(self, value):
         """Validate product exists and is in stock"""
-        try:
-            product = Product.objects.get(id=value)
-            if not product.is_in_stock:
-                raise serializers.ValidationError("Product is out of stock.")
-        except Product.DoesNotExist:
+        resolver = self.context.get('product_resolver') or ProductResolver()
+        product = resolver.get(value)
+        if product is None:
             raise serializers.ValidationError("Product does not exist.")
+        # Units held by the customer's cart are already out of stock
+        if not product.is_in_stock and value not in self.context.get('cart_holds', ()):
+            raise serializers.ValidationError("Product is out of stock.")
         return value
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Order model
     """
@@ -36,11 +46,30 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'total_price', 'created_at', 'updated_at']
 
+    @property
+    def product_resolver(self):
+        """Resolver shared through the context with the nested item serializers"""
+        return self.context.setdefault('product_resolver', ProductResolver())
+
+    @property
+    def cart_token(self):
+        """The customer's cart, whose holds the order uses, if the request names one"""
+        request = self.context.get('request')
+        return cart_token_from(request) if request is not None else None
+
+    def to_internal_value(self, data):
+        """Load every product referenced by the payload in one query"""
+        items = data.get('items') if hasattr(data, 'get') else None
+        self.product_resolver.prime(ProductResolver.product_ids_from(items))
+        if self.cart_token:
+            self.context['cart_holds'] = Cart.held(self.cart_token)
+        return super().to_internal_value(data)
+
     def validate_items(self, value):
-        """Validate items list is not empty"""
+        """Validate items list is not empty and merge duplicate products"""
         if not value:
             raise serializers.ValidationError("Order must contain at least one item.")
-        return value
+        return ProductResolver.merge_items(value)
 
     def validate_email(self, value):
         """Validate email format"""
@@ -48,47 +77,187 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Enter a valid email address.")
         return value
 
-    def create(self, validated_data):
-        """Create order with calculated total price"""
-        items_data = validated_data.pop('items')
-        
-        # Calculate total price
+    @staticmethod
+    def build_order(validated_data, products):
+        """
+        Unsaved Order and OrderLine instances for validated data, with the
+        total computed and unit prices snapshotted from ``products``
+        ({id: product}). The lines still need their order assigned.
+        """
+        fields = dict(validated_data)
+        items_data = fields.pop('items')
         total_price = Decimal('0.00')
-        for item_data in items_data:
-            product = Product.objects.get(id=item_data['product_id'])
-            total_price += product.price * item_data['quantity']
-        
-        # Create order
-        order = Order.objects.create(
+        lines = []
+        for item in items_data:
+            product = products[item['product_id']]
+            total_price += product.price * item['quantity']
+            lines.append(OrderLine(
+                product=product,
+                quantity=item['quantity'],
+                unit_price=product.price,
+            ))
+        order = Order(
             total_price=total_price,
             items=items_data,
-            **validated_data
+            items_count=sum(item['quantity'] for item in items_data),
+            **fields
         )
-        
-        # Reduce stock for each product
-        for item_data in items_data:
-            product = Product.objects.get(id=item_data['product_id'])
-            if not product.reduce_stock(item_data['quantity']):
-                raise serializers.ValidationError(
-                    f"Insufficient stock for product: {product.name}"
-                )
-        
+        return order, lines
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """
+        Create order with calculated total price.
+
+        Runs in one transaction: products come from the request's resolver
+        (already loaded during validation), stock is reserved with one
+        conditional UPDATE and the order row is only written once every
+        line has been reserved. OrderLine rows are bulk-created in the same
+        transaction.
+
+        When the request carries a cart token, the units the cart holds are
+        used first and taken out of the cart, so stock is not decremented a
+        second time for them.
+        """
+        product_ids = [item['product_id'] for item in validated_data['items']]
+        products = self.product_resolver.get_many(product_ids)
+        missing = [pid for pid in product_ids if pid not in products]
+        if missing:
+            raise serializers.ValidationError(
+                f"Product does not exist: {', '.join(map(str, missing))}"
+            )
+
+        order, lines = self.build_order(validated_data, products)
+
+        # Reserve stock for every product in one conditional UPDATE; the
+        # order of the mapping does not decide the order rows are locked in
+        quantities = {item['product_id']: item['quantity'] for item in order.items}
+        if self.cart_token:
+            taken = Cart.load(self.cart_token).consume(quantities)
+            quantities = {
+                pid: quantity - taken.get(pid, 0) for pid, quantity in quantities.items()
+                if quantity > taken.get(pid, 0)
+            }
+        if not Product.reserve_stock(quantities):
+            current = Product.objects.in_bulk(list(quantities))
+            short = [
+                products[pid].name for pid, quantity in quantities.items()
+                if pid not in current or current[pid].stock < quantity
+            ]
+            raise serializers.ValidationError(
+                f"Insufficient stock for product: {', '.join(short)}"
+            )
+
+        order.save(force_insert=True)
+        for line in lines:
+            line.order = order
+        OrderLine.objects.bulk_create(lines)
+        sales.record_on_commit([(order, lines)])
+
         return order
 
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Simplified serializer for order listing
     """
-    items_count = serializers.SerializerMethodField()
-    
     class Meta:
         model = Order
         fields = [
             'id', 'customer_name', 'email', 'total_price', 
             'items_count', 'created_at'
         ]
-    
-    def get_items_count(self, obj):
-        """Get total number of items in the order"""
-        return sum(item.get('quantity', 0) for item in obj.items_list)
+
+
+class OrderListValuesSerializer(ValuesSerializer):
+    """
+    Fast path for OrderListSerializer on list endpoints
+    """
+    model = Order
+    serializer = OrderListSerializer
+    fields = OrderListSerializer.Meta.fields
+
+
+class OrderBatchSerializer(serializers.Serializer):
+    """
+    Envelope of a batch submission. The orders themselves are validated
+    one by one with OrderSerializer so each gets its own result.
+    """
+    ALL_OR_NOTHING = 'all_or_nothing'
+    BEST_EFFORT = 'best_effort'
+
+    policy = serializers.ChoiceField(
+        choices=[ALL_OR_NOTHING, BEST_EFFORT], default=ALL_OR_NOTHING
+    )
+    orders = serializers.ListField(
+        allow_empty=False, max_length=settings.ORDER_BATCH_MAX_SIZE
+    )
+
+
+class CartItemSerializer(serializers.Serializer):
+    """
+    Serializer for adding to or removing from the cart
+    """
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartCheckoutSerializer(serializers.ModelSerializer):
+    """
+    Customer details needed to turn a cart into an order
+    """
+    class Meta:
+        model = Order
+        fields = ['customer_name', 'email', 'address']
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    """
+    Date range of a sales report, both days inclusive. Defaults to the
+    30 days up to today.
+    """
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        attrs['end'] = attrs.get('end') or timezone.localdate()
+        attrs['start'] = attrs.get('start') or attrs['end'] - timedelta(days=29)
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
+
+
+class SalesSeriesQuerySerializer(SalesReportQuerySerializer):
+    """Range, period and optional product of the sales-by-period report"""
+    group = serializers.ChoiceField(choices=['day', 'month'], default='day')
+    product_id = serializers.IntegerField(required=False, min_value=1)
+
+
+class ProductSalesQuerySerializer(SalesReportQuerySerializer):
+    """Range, ranking and size of the sales-by-product report"""
+    order_by = serializers.ChoiceField(choices=sales.PRODUCT_ORDERINGS, default='revenue')
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+
+class SalesTotalsSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Orders, units and revenue of a summary row"""
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class SalesPeriodSerializer(TimedSerializerMixin, serializers.Serializer):
+    """One day or month of the sales-by-period report"""
+    period = serializers.DateField()
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class ProductSalesSerializer(TimedSerializerMixin, serializers.Serializer):
+    """One product of the sales-by-product report"""
+    product_id = serializers.IntegerField()
+    name = serializers.CharField(allow_null=True)
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
@@ -0,0 +1,11 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from . import sales
+from .models import Order
+
+
+@receiver(pre_delete, sender=Order)
+def forget_deleted_order(sender, instance, **kwargs):
+    """Take the order out of the sales summaries before its lines go"""
+    sales.forget_on_commit(instance)
@@ -1,3 +1,290 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.utils import timezone
+
+from products import stripes
+from products.models import Product
+
+from . import sales
+from .cart import Cart, release_expired_reservations
+from .models import CartReservation, DailySales, Order, OrderLine, ProductDailySales
+
+CUSTOMER = {
+    'customer_name': 'Test Customer',
+    'email': 'customer@example.com',
+    'address': '1 Test Street',
+}
+
+
+def order_data(*items):
+    return dict(CUSTOMER, items=[
+        {'product_id': product.pk, 'quantity': quantity} for product, quantity in items
+    ])
+
+
+class OrderTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.first = Product.objects.create(
+            name='First', description='First', price=Decimal('10.00'), stock=5
+        )
+        self.second = Product.objects.create(
+            name='Second', description='Second', price=Decimal('2.50'), stock=3
+        )
+
+    def stock(self, product):
+        product.refresh_from_db(fields=['stock'])
+        return product.stock
+
+    def orders(self):
+        # The initial data migration creates sample orders of its own
+        return Order.objects.filter(email=CUSTOMER['email'])
+
+    def post(self, path, data):
+        # Run the on-commit work (cached cart, summaries) as a commit would
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(path, data, content_type='application/json')
+
+
+class CreateOrderTests(OrderTestCase):
+    def test_creates_order_and_reserves_stock(self):
+        response = self.post('/api/orders/', order_data((self.first, 2), (self.second, 1)))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.json()['total_price']), Decimal('22.50'))
+        self.assertEqual(self.stock(self.first), 3)
+        self.assertEqual(self.stock(self.second), 2)
+        self.assertEqual(OrderLine.objects.filter(order__in=self.orders()).count(), 2)
+
+    def test_shortfall_creates_nothing(self):
+        response = self.post('/api/orders/', order_data((self.first, 2), (self.second, 4)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Second', str(response.json()))
+        self.assertEqual(self.stock(self.first), 5)
+        self.assertEqual(self.stock(self.second), 3)
+        self.assertFalse(self.orders().exists())
+
+
+class OrderBatchTests(OrderTestCase):
+    def batch(self, policy, *orders):
+        return self.post('/api/orders/batch/', {'policy': policy, 'orders': list(orders)})
+
+    def test_all_or_nothing_rejects_every_order_on_a_shortfall(self):
+        response = self.batch(
+            'all_or_nothing',
+            order_data((self.first, 2)),
+            order_data((self.second, 2)),
+            order_data((self.second, 2)),
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], 0)
+        self.assertEqual(self.stock(self.first), 5)
+        self.assertEqual(self.stock(self.second), 3)
+        self.assertFalse(self.orders().exists())
+
+    def test_all_or_nothing_creates_every_order_that_fits(self):
+        response = self.batch(
+            'all_or_nothing', order_data((self.first, 2)), order_data((self.first, 3))
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.orders().count(), 2)
+        self.assertEqual(self.stock(self.first), 0)
+
+    def test_best_effort_keeps_the_orders_that_fit_in_submission_order(self):
+        response = self.batch(
+            'best_effort',
+            order_data((self.second, 2)),
+            order_data((self.second, 2)),
+            order_data((self.first, 1), (self.second, 1)),
+        )
+        self.assertEqual(response.status_code, 207)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['created', 'failed', 'created'])
+        self.assertEqual(self.stock(self.first), 4)
+        self.assertEqual(self.stock(self.second), 0)
+        self.assertEqual(self.orders().count(), 2)
+
+    def test_best_effort_counts_a_striped_product_from_its_stripes(self):
+        stripes.enable(self.first.pk, 2)
+        response = self.batch(
+            'best_effort', order_data((self.first, 4)), order_data((self.first, 2))
+        )
+        self.assertEqual(response.status_code, 207)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['created', 'failed'])
+        self.assertEqual(self.stock(self.first), 1)
+
+    def test_invalid_order_fails_alone_with_best_effort(self):
+        response = self.batch(
+            'best_effort', order_data((self.first, 1)), dict(CUSTOMER, items=[])
+        )
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(self.stock(self.first), 4)
+
+
+class SalesRebuildTests(OrderTestCase):
+    def totals(self, day):
+        return list(DailySales.objects.filter(day=day).values_list(*sales.VALUE_FIELDS))
+
+    def test_rebuild_matches_the_incremental_summaries(self):
+        today = timezone.localdate()
+        # The sample orders of the initial data migration were never recorded
+        sales.rebuild(since=today, until=today)
+        self.post('/api/orders/', order_data((self.first, 2), (self.second, 1)))
+        self.post('/api/orders/', order_data((self.first, 1)))
+        recorded = self.totals(today)
+        by_product = list(ProductDailySales.objects.filter(day=today).order_by('product_id')
+                          .values_list('product_id', *sales.VALUE_FIELDS))
+        sales.rebuild(since=today, until=today)
+        self.assertEqual(self.totals(today), recorded)
+        self.assertEqual(
+            list(ProductDailySales.objects.filter(day=today).order_by('product_id')
+                 .values_list('product_id', *sales.VALUE_FIELDS)),
+            by_product,
+        )
+
+
+class AddItemTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post('/api/orders/', order_data((self.first, 1)))
+        self.order = self.orders().get()
+
+    def test_adds_a_line_and_reserves_stock(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.order.add_item(self.second.pk, 2))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('15.00'))
+        self.assertEqual(self.order.items_count, 3)
+        self.assertEqual(self.stock(self.second), 1)
+        self.assertEqual(self.order.lines.get(product=self.second).quantity, 2)
+
+    def test_grows_an_existing_line_at_its_price(self):
+        Product.objects.filter(pk=self.first.pk).update(price=Decimal('99.00'))
+        self.assertTrue(self.order.add_item(self.first.pk, 2))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('30.00'))
+        self.assertEqual(self.order.lines.get().quantity, 3)
+        self.assertEqual(self.stock(self.first), 2)
+
+    def test_shortfall_changes_nothing(self):
+        self.assertFalse(self.order.add_item(self.second.pk, 4))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.items_count, 1)
+        self.assertEqual(self.stock(self.second), 3)
+        self.assertEqual(self.order.lines.count(), 1)
+
+
+class CartTests(OrderTestCase):
+    token = 'test-cart'
+
+    def add(self, product, quantity):
+        return self.post('/api/orders/cart/add/', {
+            'cart_token': self.token, 'product_id': product.pk, 'quantity': quantity,
+        })
+
+    def test_add_holds_stock(self):
+        self.assertEqual(self.add(self.first, 2).status_code, 200)
+        self.assertEqual(self.add(self.first, 1).status_code, 200)
+        self.assertEqual(self.stock(self.first), 2)
+        hold = CartReservation.objects.get(cart_token=self.token)
+        self.assertEqual(hold.quantity, 3)
+
+    def test_add_beyond_stock_holds_nothing(self):
+        self.assertEqual(self.add(self.second, 4).status_code, 400)
+        self.assertEqual(self.stock(self.second), 3)
+        self.assertFalse(CartReservation.objects.exists())
+
+    def test_remove_releases_the_hold(self):
+        self.add(self.first, 2)
+        response = self.post('/api/orders/cart/remove/', {
+            'cart_token': self.token, 'product_id': self.first.pk,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(self.first), 5)
+        self.assertFalse(CartReservation.objects.exists())
+
+    def test_checkout_consumes_the_holds(self):
+        self.add(self.first, 2)
+        self.add(self.second, 1)
+        response = self.post('/api/orders/cart/checkout/', dict(CUSTOMER, cart_token=self.token))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.json()['total_price']), Decimal('22.50'))
+        # The units were taken when they were added, not again at checkout
+        self.assertEqual(self.stock(self.first), 3)
+        self.assertEqual(self.stock(self.second), 2)
+        self.assertFalse(CartReservation.objects.exists())
+
+    def test_checkout_of_an_empty_cart_fails(self):
+        response = self.post('/api/orders/cart/checkout/', dict(CUSTOMER, cart_token=self.token))
+        self.assertEqual(response.status_code, 400)
+
+    def test_sweep_releases_expired_holds_only(self):
+        self.add(self.first, 2)
+        self.add(self.second, 1)
+        CartReservation.objects.filter(product=self.first).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(self.stock(self.first), 5)
+        self.assertEqual(self.stock(self.second), 2)
+        self.assertEqual(CartReservation.objects.count(), 1)
+
+    def test_checkout_after_sweep_reserves_again(self):
+        self.add(self.first, 2)
+        CartReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired_reservations()
+        response = self.post('/api/orders/cart/checkout/', dict(CUSTOMER, cart_token=self.token))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(self.first), 3)
+
+    def test_order_with_a_cart_token_uses_the_holds(self):
+        self.add(self.first, 2)
+        self.add(self.second, 3)
+        response = self.post('/api/orders/', dict(
+            order_data((self.first, 3), (self.second, 3)), cart_token=self.token
+        ))
+        self.assertEqual(response.status_code, 201)
+        # Held units are not taken again, only the unit beyond the hold
+        self.assertEqual(self.stock(self.first), 2)
+        self.assertEqual(self.stock(self.second), 0)
+        self.assertFalse(CartReservation.objects.exists())
+
+    def test_order_with_a_cart_token_keeps_the_rest_of_the_hold(self):
+        self.add(self.first, 3)
+        response = self.post('/api/orders/', dict(
+            order_data((self.first, 1)), cart_token=self.token
+        ))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(self.first), 2)
+        self.assertEqual(CartReservation.objects.get(cart_token=self.token).quantity, 2)
+        cart = self.client.get(f'/api/orders/cart/?cart_token={self.token}').json()
+        self.assertEqual(cart['items'][0]['quantity'], 2)
+
+    def test_add_grows_the_hold_of_an_evicted_cart(self):
+        self.add(self.first, 2)
+        cache.delete(Cart.cache_key(self.token))
+        Cart(self.token).add(self.first.pk, 1)
+        self.assertEqual(CartReservation.objects.get(cart_token=self.token).quantity, 3)
+        self.assertEqual(self.stock(self.first), 2)
+
+    def test_add_racing_a_first_add_grows_its_row(self):
+        # The other request's row appears after this add's UPDATE missed
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            updated = update(queryset, **kwargs)
+            if queryset.model is CartReservation and 'quantity' in kwargs and not updated:
+                CartReservation.objects.create(
+                    cart_token=self.token, product=self.first, quantity=1,
+                    unit_price=self.first.price, expires_at=timezone.now(),
+                )
+            return updated
 
-# Create your tests here.
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            Cart(self.token).add(self.first.pk, 2)
+        self.assertEqual(CartReservation.objects.get(cart_token=self.token).quantity, 3)
@@ -10,7 +10,15 @@ urlpatterns = [
     
     # Additional order endpoints
     path('by-email/', views.order_by_email, name='order-by-email'),
+    path('batch/', views.order_batch, name='order-batch'),
+    
+    # Reports, served from the sales summaries
+    path('reports/sales/', views.sales_report, name='sales-report'),
+    path('reports/products/', views.product_sales_report, name='product-sales-report'),
     
     # Cart functionality
+    path('cart/', views.cart_detail, name='cart-detail'),
     path('cart/add/', views.add_to_cart, name='add-to-cart'),
+    path('cart/remove/', views.remove_from_cart, name='remove-from-cart'),
+    path('cart/checkout/', views.cart_checkout, name='cart-checkout'),
 ]
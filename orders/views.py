@@ -1,21 +1,31 @@
 from rest_framework import generics, status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from ecommerce_backend.conditional import ConditionalGetMixin
+from ecommerce_backend.pagination import KeysetPagination
+from ecommerce_backend.values_serializers import ValuesListMixin
 from django.shortcuts import get_object_or_404
+from . import sales
+from .batch import OrderBatch
+from .cart import Cart, CartError, cart_token_from
 from .models import Order
-from .serializers import OrderSerializer, OrderListSerializer
-from products.models import Product
+from .serializers import (
+    CartCheckoutSerializer, CartItemSerializer, OrderBatchSerializer,
+    OrderSerializer, OrderListSerializer, OrderListValuesSerializer,
+    ProductSalesQuerySerializer, ProductSalesSerializer, SalesPeriodSerializer,
+    SalesSeriesQuerySerializer, SalesTotalsSerializer,
+)
+from decimal import Decimal
 
 
-class OrderPagination(PageNumberPagination):
-    """Custom pagination for orders"""
+class OrderPagination(KeysetPagination):
+    """Custom pagination for orders (page numbers, or keyset via ?cursor=)"""
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class OrderListCreateView(generics.ListCreateAPIView):
+class OrderListCreateView(ConditionalGetMixin, ValuesListMixin, generics.ListCreateAPIView):
     """
     List all orders or create a new order
     GET /orders/ - List orders with pagination
@@ -23,6 +33,7 @@ class OrderListCreateView(generics.ListCreateAPIView):
     """
     queryset = Order.objects.all()
     pagination_class = OrderPagination
+    values_serializer_class = OrderListValuesSerializer
     
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -30,7 +41,7 @@ class OrderListCreateView(generics.ListCreateAPIView):
         return OrderSerializer
 
 
-class OrderDetailView(generics.RetrieveAPIView):
+class OrderDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     """
     Retrieve order details
     GET /orders/{id}/ - Get order details
@@ -39,61 +50,120 @@ class OrderDetailView(generics.RetrieveAPIView):
     serializer_class = OrderSerializer
 
 
+@api_view(['POST'])
+def order_batch(request):
+    """
+    Create several orders in one request and one transaction
+    POST /orders/batch/ - {"policy": "all_or_nothing" | "best_effort", "orders": [...]}
+    """
+    serializer = OrderBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    batch = OrderBatch(
+        serializer.validated_data['orders'],
+        policy=serializer.validated_data['policy'],
+    )
+    batch.submit()
+    return Response(batch.summary(), status=batch.status_code)
+
+
 @api_view(['POST'])
 def add_to_cart(request):
     """
-    Add item to cart (simulate cart functionality)
+    Add item to cart, holding its stock until the cart expires
     POST /cart/add/
     """
-    product_id = request.data.get('product_id')
-    quantity = request.data.get('quantity', 1)
-    
-    if not product_id:
+    if not request.data.get('product_id'):
         return Response(
             {'error': 'Product ID is required'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
-    
+    serializer = CartItemSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    cart = Cart.load(cart_token_from(request, create=True))
     try:
-        product = Product.objects.get(id=product_id)
-    except Product.DoesNotExist:
-        return Response(
-            {'error': 'Product not found'}, 
-            status=status.HTTP_404_NOT_FOUND
+        item = cart.add(
+            serializer.validated_data['product_id'],
+            serializer.validated_data['quantity'],
         )
+    except CartError as exc:
+        return Response({'error': exc.message}, status=exc.status_code)
+
+    cart_item = {
+        'product_id': item['product_id'],
+        'product_name': item['name'],
+        'price': item['unit_price'],
+        'quantity': item['quantity'],
+        'total': str(Decimal(item['unit_price']) * item['quantity'])
+    }
     
-    if not product.is_in_stock:
+    return Response({
+        'message': 'Item added to cart',
+        'cart_item': cart_item,
+        'cart': cart.to_representation(),
+    })
+
+
+@api_view(['GET'])
+def cart_detail(request):
+    """
+    Get the current cart (served from the cache)
+    GET /cart/?cart_token=... (or the X-Cart-Token header)
+    """
+    token = cart_token_from(request)
+    if not token:
+        return Response(Cart(None).to_representation())
+    return Response(Cart.load(token).to_representation())
+
+
+@api_view(['POST'])
+def remove_from_cart(request):
+    """
+    Remove a product from the cart and release its stock
+    POST /cart/remove/
+    """
+    token = cart_token_from(request)
+    if not token or not request.data.get('product_id'):
         return Response(
-            {'error': 'Product is out of stock'}, 
+            {'error': 'Cart token and product ID are required'},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
-    if product.stock < quantity:
+    serializer = CartItemSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    cart = Cart.load(token)
+    if cart.remove(serializer.validated_data['product_id']) is None:
         return Response(
-            {'error': f'Only {product.stock} items available in stock'}, 
+            {'error': 'Product is not in the cart'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response(cart.to_representation())
+
+
+@api_view(['POST'])
+def cart_checkout(request):
+    """
+    Turn the cart into an order using the prices held in the cart
+    POST /cart/checkout/
+    """
+    token = cart_token_from(request)
+    if not token:
+        return Response(
+            {'error': 'Cart token is required'},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
-    # In a real application, this would be stored in session or user's cart
-    # For MVP, we'll just return the cart item data
-    cart_item = {
-        'product_id': product.id,
-        'product_name': product.name,
-        'price': str(product.price),
-        'quantity': quantity,
-        'total': str(product.price * quantity)
-    }
-    
-    return Response({
-        'message': 'Item added to cart',
-        'cart_item': cart_item
-    })
+    serializer = CartCheckoutSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    order = Cart.load(token).checkout(serializer.validated_data)
+    return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 
 @api_view(['GET'])
 def order_by_email(request):
     """
-    Get orders by customer email
+    Get orders by customer email (case-insensitive, paginated)
     GET /orders/by-email/?email=customer@example.com
     """
     email = request.GET.get('email', '').strip()
@@ -104,6 +174,52 @@ def order_by_email(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    orders = Order.objects.filter(email__iexact=email)
-    serializer = OrderListSerializer(orders, many=True)
-    return Response(serializer.data)
+    orders = OrderListValuesSerializer.values(Order.for_email(email))
+    paginator = OrderPagination()
+    page = paginator.paginate_queryset(orders, request)
+    serializer = OrderListValuesSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+def sales_report(request):
+    """
+    Orders, units and revenue per day or month, from the sales summaries
+    GET /orders/reports/sales/?start=2026-01-01&end=2026-03-31&group=day|month&product_id=...
+    """
+    params = SalesSeriesQuerySerializer(data=request.GET)
+    params.is_valid(raise_exception=True)
+    query = params.validated_data
+
+    rows, totals = sales.sales_by_period(
+        query['start'], query['end'], query['group'], query.get('product_id')
+    )
+    return Response({
+        'start': query['start'],
+        'end': query['end'],
+        'group': query['group'],
+        'product_id': query.get('product_id'),
+        'totals': SalesTotalsSerializer(totals).data,
+        'results': SalesPeriodSerializer(rows, many=True).data,
+    })
+
+
+@api_view(['GET'])
+def product_sales_report(request):
+    """
+    Best-selling products over a date range, from the sales summaries
+    GET /orders/reports/products/?start=2026-01-01&end=2026-03-31&order_by=revenue|units|orders&limit=50
+    """
+    params = ProductSalesQuerySerializer(data=request.GET)
+    params.is_valid(raise_exception=True)
+    query = params.validated_data
+
+    rows = sales.sales_by_product(
+        query['start'], query['end'], query['order_by'], query['limit']
+    )
+    return Response({
+        'start': query['start'],
+        'end': query['end'],
+        'order_by': query['order_by'],
+        'results': ProductSalesSerializer(rows, many=True).data,
+    })
@@ -1,9 +1,28 @@
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Q
+from ecommerce_backend.scalable_admin import RangeListFilter, ScalableAdmin
+from .cache import bump_catalog_version
 from .models import Product
+from .search import search_products
+from .signals import spread_striped_stock
+
+
+class StockRangeFilter(RangeListFilter):
+    """Stock in fixed buckets instead of one choice per distinct value"""
+    title = 'stock'
+    parameter_name = 'stock_range'
+    field_name = 'stock'
+    ranges = [
+        ('0', 'Out of stock', 0, 0),
+        ('1-10', '1 to 10', 1, 10),
+        ('11-100', '11 to 100', 11, 100),
+        ('101-', 'More than 100', 101, None),
+    ]
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ScalableAdmin):
     """
     Admin configuration for Product model
     """
@@ -11,14 +30,15 @@ class ProductAdmin(admin.ModelAdmin):
         'id', 'name', 'price', 'stock', 'is_in_stock', 
         'created_at', 'updated_at'
     ]
-    list_filter = ['created_at', 'updated_at', 'stock']
+    list_filter = ['created_at', 'updated_at', StockRangeFilter]
     search_fields = ['name', 'description']
+    search_help_text = 'Words of the name or description, an exact SKU, or an id'
     list_editable = ['price', 'stock']
     readonly_fields = ['created_at', 'updated_at']
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'description', 'image_url')
+            'fields': ('name', 'sku', 'description', 'image_url')
         }),
         ('Pricing & Inventory', {
             'fields': ('price', 'stock')
@@ -34,3 +54,23 @@ class ProductAdmin(admin.ModelAdmin):
         return obj.is_in_stock
     is_in_stock.boolean = True
     is_in_stock.short_description = 'In Stock'
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search through indexes only: the id, the unique sku or the
+        full-text index, never a LIKE scan over name and description.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        # The changelist applies its own ordering, not relevance
+        matches = search_products(term).order_by().values('pk')
+        return queryset.filter(Q(pk__in=matches) | Q(sku=term)), False
+
+    def after_bulk_save(self, objs, fields):
+        # What the post_save receivers do for a single save
+        for obj in objs:
+            spread_striped_stock(Product, obj, update_fields=fields)
+        transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import async_views
+
+app_name = 'products-async'
+
+urlpatterns = [
+    # Async (ASGI-native) versions of the catalog read endpoints
+    path('', async_views.product_list, name='product-list'),
+    path('<int:pk>/', async_views.product_detail, name='product-detail'),
+    path('search/', async_views.product_search, name='product-search'),
+    path('in-stock/', async_views.products_in_stock, name='products-in-stock'),
+]
@@ -0,0 +1,132 @@
+"""
+Async versions of the catalog read endpoints, served under /api/async/products/.
+
+They mirror ProductListCreateView (GET), ProductDetailView (GET),
+product_search and products_in_stock - same bodies, pagination, ETags and
+catalog cache - but query through the async ORM (aget, acount, aiterator),
+so under an ASGI server a request waiting on the database or
+a slow client does not hold a worker thread.
+"""
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+
+from ecommerce_backend.async_api import async_api_view, render_json
+from ecommerce_backend.conditional import (
+    aobject_validators, not_modified_response, set_validator_headers,
+)
+from .cache import acached_catalog_data
+from .models import Product
+from .search import search_products
+from .serializers import ProductListValuesSerializer, ProductSerializer
+from .streaming import astream_json_response, wants_stream
+from .views import ProductPagination, ProductSearchPagination
+
+
+async def _list_data(request, products, pagination_class=ProductPagination):
+    """Async twin of views._list_response for the paginated case"""
+    paginator = pagination_class()
+    products = ProductListValuesSerializer.values(products)
+    page = await paginator.apaginate_queryset(products, request)
+    serializer = ProductListValuesSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data).data
+
+
+async def _conditional(request, validators, build_response):
+    """Answer 304 when the validators match, else build and tag the response"""
+    etag, last_modified = await validators
+    if etag is None:
+        raise NotFound()
+    not_modified = not_modified_response(request._request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    response = await build_response()
+    return set_validator_headers(response, etag, last_modified)
+
+
+def _render(data, cache_status):
+    response = render_json(data)
+    response['X-Cache'] = cache_status
+    return response
+
+
+async def _cached(request, build_data):
+    data, cache_status, _ = await acached_catalog_data(request, build_data)
+    return _render(data, cache_status)
+
+
+@async_api_view(['GET'])
+async def product_list(request):
+    """
+    List products with pagination
+    GET /async/products/
+    """
+    products = Product.objects.all()
+    data, cache_status, etag = await acached_catalog_data(
+        request, lambda: _list_data(request, products)
+    )
+    # Like ProductListCreateView, tag the page with its cache entry's ETag:
+    # a hit answers 304 without serializing or rendering anything
+    if etag is None:
+        return _render(data, cache_status)
+    not_modified = not_modified_response(request._request, etag, None)
+    if not_modified is not None:
+        return not_modified
+    return set_validator_headers(_render(data, cache_status), etag, None)
+
+
+@async_api_view(['GET'])
+async def product_detail(request, pk):
+    """
+    Get product details
+    GET /async/products/{id}/
+    """
+    async def build_data():
+        try:
+            product = await Product.objects.aget(pk=pk)
+        except Product.DoesNotExist:
+            raise NotFound()
+        return ProductSerializer(product).data
+
+    return await _conditional(
+        request,
+        aobject_validators(Product.objects.all(), pk),
+        lambda: _cached(request, build_data),
+    )
+
+
+@async_api_view(['GET'])
+async def product_search(request):
+    """
+    Search products by name or description, best match first
+    GET /async/products/search/?q=search_term - Paginated results
+    GET /async/products/search/?q=search_term&stream=true - All results, streamed
+    """
+    query = request.GET.get('q', '').strip()
+
+    if not query:
+        return render_json(
+            {'error': 'Search query is required'},
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    products = search_products(query)
+    if wants_stream(request):
+        return astream_json_response(
+            ProductListValuesSerializer.values(products), ProductListValuesSerializer
+        )
+    return render_json(await _list_data(request, products, ProductSearchPagination))
+
+
+@async_api_view(['GET'])
+async def products_in_stock(request):
+    """
+    Get only products that are in stock
+    GET /async/products/in-stock/ - Paginated results
+    GET /async/products/in-stock/?stream=true - All results, streamed
+    """
+    products = Product.objects.filter(stock__gt=0)
+    if wants_stream(request):
+        return astream_json_response(
+            ProductListValuesSerializer.values(products), ProductListValuesSerializer
+        )
+    return await _cached(request, lambda: _list_data(request, products))
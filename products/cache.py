@@ -0,0 +1,258 @@
+"""
+Versioned response cache for the product catalog endpoints.
+
+Every cache key embeds a catalog version counter. Changing any product bumps
+the counter, which makes all previously cached responses unreachable at
+once (they simply expire), so invalidation is O(1) and never scans keys.
+
+Orders and cart holds only move stock, so they bump a version of each
+product they touched instead (and the catalog version only when a product
+sells out or comes back into stock, which changes the in-stock list). Each
+cached response records the versions of the products it shows, list pages
+included, and a hit whose versions moved on is treated as a miss. An order
+therefore invalidates the pages showing what it bought and nothing else.
+
+The counters must live in a cache shared by every worker (CACHE_BACKEND):
+with a per-process cache a bump only reaches the worker that made it.
+"""
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+from ecommerce_backend.db_routing import reads_from_primary
+
+VERSION_KEY = 'catalog:version'
+# Bumped with any product version, to detect changes while a response is built
+STOCK_EPOCH_KEY = 'catalog:stock-epoch'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+
+
+def _incr(key):
+    """Increment a counter, creating it if it does not exist yet"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+
+def get_catalog_version():
+    """Current catalog version, initialised to 1 on first use"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response"""
+    return _incr(VERSION_KEY)
+
+
+def product_version_key(product_id):
+    return f'catalog:product:{product_id}:version'
+
+
+def bump_product_versions(product_ids):
+    """Invalidate the cached responses showing some products"""
+    # Any new value will do: a version is only ever compared for equality
+    cache.set_many(
+        {product_version_key(pk): secrets.token_hex(4) for pk in product_ids}, timeout=None
+    )
+    _incr(STOCK_EPOCH_KEY)
+
+
+def get_product_versions(product_ids):
+    """{product_id: version} of some products, creating missing ones"""
+    keys = {product_version_key(pk): pk for pk in product_ids}
+    found = cache.get_many(list(keys))
+    missing = {key: secrets.token_hex(4) for key in keys if key not in found}
+    if missing:
+        for key, version in missing.items():
+            if not cache.add(key, version, timeout=None):
+                # Another process created it first
+                missing[key] = cache.get(key)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def shown_products(data):
+    """Ids of the products a catalog payload (page or detail) shows"""
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return [row['id'] for row in data['results']]
+    if isinstance(data, dict) and 'id' in data:
+        return [data['id']]
+    return []
+
+
+def entry_etag(key, versions):
+    """ETag of a cache entry: its key and product versions determine its body"""
+    raw = f'{key}|{sorted(versions.items())}'
+    return 'W/' + quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+def get_cache_stats():
+    """Hit/miss counters shared by every process using the same cache"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'version': get_catalog_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
+
+
+def request_digest(request):
+    """Hash of host (links are absolute), path and query params"""
+    query = sorted(request.GET.lists())
+    raw = f'{request.get_host()}|{request.path}|{query}'
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def make_cache_key(request):
+    """Key on catalog version and the request"""
+    return f'catalog:v{get_catalog_version()}:{request_digest(request)}'
+
+
+def valid_entry(entry):
+    """Whether a cached entry still shows the current version of its products"""
+    return entry is not None and get_product_versions(entry['versions']) == entry['versions']
+
+
+def catalog_hit(request):
+    """
+    (key, entry) for the request, the entry being None unless it is cached
+    and current. Kept on the request, so every caller in the request shares
+    one lookup.
+    """
+    request = getattr(request, '_request', request)
+    hit = getattr(request, '_catalog_hit', None)
+    if hit is None:
+        key = make_cache_key(request)
+        entry = cache.get(key)
+        hit = request._catalog_hit = (key, entry if valid_entry(entry) else None)
+    return hit
+
+
+def catalog_list_validators(request):
+    """
+    (ETag, None) of the cached catalog response for ``request``, for
+    ConditionalGetMixin.get_list_validators: no query and no serializer.
+    (None, None) when it is not cached; the response then carries the ETag
+    of the entry it fills.
+    """
+    _, entry = catalog_hit(request)
+    return (entry['etag'], None) if entry is not None else (None, None)
+
+
+def fill_entry(key, data, epoch):
+    """Cache ``data`` under ``key``; returns the entry, or None if it may be stale"""
+    versions = get_product_versions(shown_products(data))
+    if cache.get(STOCK_EPOCH_KEY) != epoch:
+        # Some product moved while the data was read, maybe one it shows
+        return None
+    entry = {'data': data, 'versions': versions, 'etag': entry_etag(key, versions)}
+    cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+    return entry
+
+
+def cached_catalog_response(request, build_response):
+    """
+    Serve ``build_response()`` from the cache when possible, with the
+    entry's ETag.
+
+    Only successful DRF responses are stored; streamed or error responses
+    pass straight through.
+    """
+    key, entry = catalog_hit(request)
+    if entry is not None:
+        _incr(HITS_KEY)
+        response = Response(entry['data'])
+        response['X-Cache'] = 'HIT'
+        response['ETag'] = entry['etag']
+        return response
+
+    epoch = cache.get(STOCK_EPOCH_KEY)
+    # Built from the primary: a replica may lag behind the version in the key
+    with reads_from_primary():
+        response = build_response()
+    if isinstance(response, Response) and response.status_code == 200:
+        entry = fill_entry(key, response.data, epoch)
+        _incr(MISSES_KEY)
+        response['X-Cache'] = 'MISS'
+        if entry is not None:
+            response['ETag'] = entry['etag']
+    return response
+
+
+async def _aincr(key):
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        if await cache.aadd(key, 1, timeout=None):
+            return 1
+        return await cache.aincr(key)
+
+
+async def aget_catalog_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, 1, timeout=None)
+        version = await cache.aget(VERSION_KEY, 1)
+    return version
+
+
+async def aget_product_versions(product_ids):
+    keys = {product_version_key(pk): pk for pk in product_ids}
+    found = await cache.aget_many(list(keys))
+    missing = {key: secrets.token_hex(4) for key in keys if key not in found}
+    if missing:
+        for key, version in missing.items():
+            if not await cache.aadd(key, version, timeout=None):
+                missing[key] = await cache.aget(key)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+async def acached_catalog_data(request, build_data):
+    """
+    Async twin of cached_catalog_response for the async catalog views.
+    ``build_data`` is a coroutine function returning the response payload;
+    returns (payload, "HIT" or "MISS", ETag or None).
+    """
+    key = f'catalog:v{await aget_catalog_version()}:{request_digest(request)}'
+    entry = await cache.aget(key)
+    if entry is not None and await aget_product_versions(entry['versions']) == entry['versions']:
+        await _aincr(HITS_KEY)
+        return entry['data'], 'HIT', entry['etag']
+
+    epoch = await cache.aget(STOCK_EPOCH_KEY)
+    with reads_from_primary():
+        data = await build_data()
+    versions = await aget_product_versions(shown_products(data))
+    etag = None
+    if await cache.aget(STOCK_EPOCH_KEY) == epoch:
+        etag = entry_etag(key, versions)
+        await cache.aset(
+            key, {'data': data, 'versions': versions, 'etag': etag}, settings.CATALOG_CACHE_TIMEOUT
+        )
+    await _aincr(MISSES_KEY)
+    return data, 'MISS', etag
+
+
+class CatalogCacheMixin:
+    """Cache GET responses of a catalog view under the versioned key"""
+
+    def get(self, request, *args, **kwargs):
+        return cached_catalog_response(
+            request, lambda: super(CatalogCacheMixin, self).get(request, *args, **kwargs)
+        )
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.snapshot import SnapshotBuilder
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the product list, in-stock list and product details as static, '
+        'pre-compressed JSON files for nginx, rewriting only what changed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rewrite every file instead of only those of changed products'
+        )
+        parser.add_argument(
+            '--output',
+            help='Directory to write (default: CATALOG_SNAPSHOT_DIR)'
+        )
+        parser.add_argument(
+            '--page-size', type=int,
+            help='Products per list page (default: the API\'s page size)'
+        )
+        parser.add_argument(
+            '--loop', type=float, default=0,
+            help='Keep updating the snapshot every N seconds instead of once'
+        )
+
+    def handle(self, *args, **options):
+        if options['page_size'] is not None and options['page_size'] < 1:
+            raise CommandError('--page-size must be at least 1')
+
+        full = options['full']
+        while True:
+            started = time.monotonic()
+            builder = SnapshotBuilder(options['output'], page_size=options['page_size'])
+            builder.build(full=full)
+            # The manifest is rewritten on every pass
+            if builder.written > 1 or builder.removed or options['verbosity'] >= 2:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Wrote {builder.written} and removed {builder.removed} files in '
+                    f'{builder.directory} in {time.monotonic() - started:.1f}s'
+                ))
+            if not options['loop']:
+                break
+            full = False
+            time.sleep(options['loop'])
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ecommerce_backend.api_docs import generate_schema
+
+
+class Command(BaseCommand):
+    help = 'Pre-render the OpenAPI document served at /swagger.json (run at image build time)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=settings.API_SCHEMA_FILE,
+            help=f'File to write (default: API_SCHEMA_FILE, {settings.API_SCHEMA_FILE})'
+        )
+
+    def handle(self, *args, **options):
+        body = generate_schema()
+        with open(options['output'], 'wb') as handle:
+            handle.write(body)
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {len(body)} bytes of OpenAPI schema to {options['output']}")
+        )
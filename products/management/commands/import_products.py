@@ -0,0 +1,216 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from products import stripes
+from products.cache import bump_catalog_version
+from products.models import Product
+from products.serializers import ProductImportSerializer
+
+IMPORT_FIELDS = ['name', 'description', 'price', 'image_url', 'stock']
+# What a row needs to create a product; rows without them only update
+REQUIRED_FIELDS = {'name', 'description', 'price'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream products from a CSV or JSONL file (or stdin) and upsert them '
+        'on sku in chunks. Existing products only get the fields a row '
+        'provides, so partial feeds (e.g. sku and price) update in place; '
+        'rows without a sku are skipped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='File to import, or - for stdin (default)'
+        )
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='Input format (default: from the file extension, required for stdin)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Rows written per bulk statement (default: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Validate every row without writing anything'
+        )
+        parser.add_argument(
+            '--show-errors', type=int, default=20,
+            help='Maximum number of bad rows to print (default: 20)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or self.guess_format(path)
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        self.verbosity = options['verbosity']
+        self.dry_run = options['dry_run']
+        self.show_errors = options['show_errors']
+        self.stats = {'read': 0, 'written': 0, 'bad': 0}
+        started = time.monotonic()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            chunk = []
+            for line_no, row in self.read_rows(stream, fmt):
+                self.stats['read'] += 1
+                data = self.validate(line_no, row)
+                if data is None:
+                    continue
+                chunk.append(data)
+                if len(chunk) >= chunk_size:
+                    self.flush(chunk)
+                    chunk = []
+                    self.report_progress(started)
+            if chunk:
+                self.flush(chunk)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if self.stats['written'] and not self.dry_run:
+            bump_catalog_version()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        action = 'Validated' if self.dry_run else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {self.stats['written']} of {self.stats['read']} rows "
+            f"({self.stats['bad']} bad) in {elapsed:.2f}s "
+            f"- {self.stats['read'] / elapsed:,.0f} rows/s"
+        ))
+
+    def guess_format(self, path):
+        if path.endswith('.csv'):
+            return 'csv'
+        if path.endswith(('.jsonl', '.ndjson')):
+            return 'jsonl'
+        raise CommandError('Cannot tell the input format; pass --format csv|jsonl')
+
+    def read_rows(self, stream, fmt):
+        """Yield (line number, raw row dict) pairs without reading ahead"""
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                # Empty cells mean "not provided", not empty strings
+                yield reader.line_num, {k: v for k, v in row.items() if k and v != ''}
+            return
+
+        for line_no, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                row = exc
+            yield line_no, row
+
+    def validate(self, line_no, row):
+        """Return validated data for the row, or None after reporting it"""
+        if not isinstance(row, dict):
+            self.bad_row(line_no, {'row': [f'Not a JSON object: {row}']})
+            return None
+        # Partial: a row may update only some fields of an existing product
+        serializer = ProductImportSerializer(data=row, partial=True)
+        if not serializer.is_valid():
+            self.bad_row(line_no, serializer.errors)
+            return None
+        data = dict(serializer.validated_data)
+        if not data.get('sku'):
+            # Without a key it would be inserted again on every run
+            self.bad_row(line_no, {'sku': ['Required to upsert; row skipped']})
+            return None
+        return data
+
+    def bad_row(self, where, errors):
+        """Count a bad row; ``where`` is its line number or a description"""
+        self.stats['bad'] += 1
+        if self.stats['bad'] <= self.show_errors:
+            where = f'Line {where}' if isinstance(where, int) else where.capitalize()
+            self.stderr.write(f'{where}: {json.dumps(errors)}')
+
+    def flush(self, chunk):
+        """
+        Upsert one chunk on sku. Rows are grouped by the fields they
+        provide, and each group updates only those fields of existing
+        products, so a partial feed (say, prices only) leaves the rest
+        alone. Groups that cannot create a product only update existing
+        ones; their unknown skus are reported as bad rows.
+        """
+        # Later rows win when a sku repeats inside the chunk
+        by_sku = {data['sku']: data for data in chunk}
+        groups = {}
+        for data in by_sku.values():
+            fields = tuple(field for field in IMPORT_FIELDS if field in data)
+            groups.setdefault(fields, []).append(data)
+
+        written = 0
+        with transaction.atomic():
+            for fields, rows in groups.items():
+                if REQUIRED_FIELDS.issubset(fields):
+                    written += self.upsert(fields, rows)
+                else:
+                    written += self.update(fields, rows)
+        self.stats['written'] += written
+
+    def upsert(self, fields, rows):
+        if self.dry_run:
+            return len(rows)
+        Product.objects.bulk_create(
+            [Product(**data) for data in rows],
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=[*fields, 'updated_at'],
+        )
+        if 'stock' in fields:
+            self.restock_stripes([data['sku'] for data in rows])
+        return len(rows)
+
+    def update(self, fields, rows):
+        existing = dict(
+            Product.objects.filter(sku__in=[data['sku'] for data in rows]).values_list('sku', 'pk')
+        )
+        for data in rows:
+            if data['sku'] not in existing:
+                self.bad_row(f"sku {data['sku']}", {'sku': ['Unknown sku; a new product needs '
+                                                         'name, description and price']})
+        rows = [data for data in rows if data['sku'] in existing]
+        if self.dry_run or not rows or not fields:
+            return len(rows)
+        # bulk_update does not apply auto_now
+        now = timezone.now()
+        Product.objects.bulk_update(
+            [Product(pk=existing[data['sku']], updated_at=now, **data) for data in rows],
+            [*fields, 'updated_at'],
+        )
+        if 'stock' in fields:
+            self.restock_stripes([data['sku'] for data in rows])
+        return len(rows)
+
+    @staticmethod
+    def restock_stripes(skus):
+        # The imported stock of a striped product is a restock
+        for pk, stock in Product.objects.filter(
+            sku__in=skus, stock_stripes__gt=0
+        ).values_list('pk', 'stock'):
+            stripes.set_total(pk, stock)
+
+    def report_progress(self, started):
+        if self.verbosity < 2:
+            return
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(
+            f"{self.stats['read']} rows read, {self.stats['written']} written, "
+            f"{self.stats['bad']} bad - {self.stats['read'] / elapsed:,.0f} rows/s"
+        )
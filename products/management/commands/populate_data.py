@@ -1,13 +1,69 @@
+from datetime import date
 from django.core.management.base import BaseCommand
 from products.models import Product
+from products.synthetic import SyntheticDataGenerator
 from orders.models import Order
 from decimal import Decimal
 
 
 class Command(BaseCommand):
+    """
+    Without options, create the fixed sample products and orders.
+
+    With --products/--orders, generate synthetic rows with raw multi-row
+    INSERTs (products.synthetic). Those bypass save(), signals and auto_now:
+    timestamps are written explicitly, and the generator itself bumps the
+    catalog cache version, rebuilds the sales summaries and checks the
+    search index afterwards, since no signal handler will.
+    """
     help = 'Populate database with sample products and orders'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products', type=int, default=0,
+            help='Generate N synthetic products instead of the fixed samples'
+        )
+        parser.add_argument(
+            '--orders', type=int, default=0,
+            help='Generate M synthetic orders instead of the fixed samples'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Random seed; the same seed always yields the same data (default: 42)'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Spread created_at over this many days back from --until (default: 365)'
+        )
+        parser.add_argument(
+            '--until', type=date.fromisoformat, default=None,
+            help='Newest created_at date, YYYY-MM-DD (default: today)'
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Zipf exponent for product popularity in orders (default: 1.1)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Rows per multi-row INSERT statement (default: 5000)'
+        )
+
     def handle(self, *args, **options):
+        if options['products'] or options['orders']:
+            generator = SyntheticDataGenerator(
+                seed=options['seed'],
+                days=options['days'],
+                until=options['until'],
+                zipf=options['zipf'],
+                batch_size=options['batch_size'],
+                stdout=self.stdout,
+            )
+            generator.run(options['products'], options['orders'])
+            self.stdout.write(
+                self.style.SUCCESS('Successfully generated synthetic data!')
+            )
+            return
+
         self.stdout.write('Creating sample products...')
         
         # Sample products data
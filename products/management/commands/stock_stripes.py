@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products import stripes
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Split hot products\' stock across several counter rows, fold it '
+        'back, or rebalance the stripes of striped products'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['enable', 'disable', 'rebalance'])
+        parser.add_argument(
+            'product_ids', nargs='*', type=int,
+            help='Products to act on (rebalance: default every striped product)'
+        )
+        parser.add_argument(
+            '--stripes', type=int, default=8,
+            help='Counter rows per product for enable (default: 8)'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=0.5,
+            help='Rebalance when a stripe holds less than this fraction of '
+                 'an even share (default: 0.5)'
+        )
+        parser.add_argument(
+            '--loop', type=float, default=0,
+            help='Keep rebalancing every N seconds instead of once'
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+        product_ids = options['product_ids']
+        if action != 'rebalance' and not product_ids:
+            raise CommandError(f'{action} needs at least one product id')
+        missing = set(product_ids) - set(
+            Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True)
+        )
+        if missing:
+            raise CommandError(f"Unknown product ids: {', '.join(map(str, sorted(missing)))}")
+
+        if action == 'enable':
+            if options['stripes'] < 2:
+                raise CommandError('--stripes must be at least 2')
+            for pk in product_ids:
+                stripes.enable(pk, options['stripes'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Striped {len(product_ids)} products over {options['stripes']} rows each"
+            ))
+        elif action == 'disable':
+            for pk in product_ids:
+                stripes.disable(pk)
+            self.stdout.write(self.style.SUCCESS(f'Unstriped {len(product_ids)} products'))
+        else:
+            while True:
+                self.rebalance(product_ids, options['skew'])
+                if not options['loop']:
+                    break
+                time.sleep(options['loop'])
+
+    def rebalance(self, product_ids, skew):
+        striped = Product.objects.filter(stock_stripes__gt=0)
+        if product_ids:
+            striped = striped.filter(pk__in=product_ids)
+        pks = list(striped.order_by('pk').values_list('pk', flat=True))
+        moved = sum(stripes.rebalance(pk, skew) for pk in pks)
+        if moved or self.verbosity >= 2:
+            self.stdout.write(f'Rebalanced {moved} of {len(pks)} striped products')
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_stripes',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Stock counter rows the stock is split across (0: not striped)'),
+        ),
+        migrations.CreateModel(
+            name='StockStripe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stripes', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Stock stripe',
+                'verbose_name_plural': 'Stock stripes',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockstripe',
+            constraint=models.UniqueConstraint(fields=('product', 'index'), name='stock_stripe_product_index_uniq'),
+        ),
+    ]
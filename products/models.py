@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
 from decimal import Decimal
 
 
@@ -7,6 +9,13 @@ class Product(models.Model):
     Product model for e-commerce platform
     """
     name = models.CharField(max_length=200, help_text="Product name")
+    sku = models.CharField(
+        max_length=64,
+        unique=True,
+        blank=True,
+        null=True,
+        help_text="Supplier stock keeping unit, used as the import upsert key"
+    )
     description = models.TextField(help_text="Product description")
     price = models.DecimalField(
         max_digits=10, 
@@ -23,17 +32,34 @@ class Product(models.Model):
         default=0,
         help_text="Available stock quantity"
     )
+    stock_stripes = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Stock counter rows the stock is split across (0: not striped)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Supports keyset pagination on (-created_at, -id)
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            # Latest change and recent changes, for the catalog snapshot
+            models.Index(fields=['updated_at'], name='product_updated_at_idx'),
+        ]
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Tells a later save whether stock was changed or only carried along
+        instance._loaded_stock = instance.__dict__.get('stock')
+        return instance
+
     @property
     def is_in_stock(self):
         """Check if product is in stock"""
@@ -41,8 +67,141 @@ class Product(models.Model):
 
     def reduce_stock(self, quantity):
         """Reduce stock by given quantity"""
+        if self.stock_stripes:
+            # Saving a striped product's stock would overwrite its stripes
+            return self.reduce_stock_atomic(quantity)
         if self.stock >= quantity:
             self.stock -= quantity
             self.save()
             return True
         return False
+
+    def reduce_stock_atomic(self, quantity):
+        """
+        Race-free variant of reduce_stock: decrement in the database with a
+        conditional UPDATE instead of a read-modify-save of the whole row.
+        """
+        if not Product.reserve_stock({self.pk: quantity}):
+            return False
+        self.refresh_from_db(fields=['stock', 'updated_at'])
+        return True
+
+    @classmethod
+    def reserve_stock(cls, quantities):
+        """
+        Reserve stock for a {product_id: quantity} mapping in one statement:
+        UPDATE ... SET stock = stock - q WHERE id IN (...) AND stock >= q.
+        Either every product is decremented or none is.
+
+        Striped products (stock_stripes > 0) do not match that statement;
+        their units are taken from their StockStripe rows instead, see
+        products.stripes.
+        """
+        if not quantities:
+            return True
+
+        from . import stripes
+
+        wanted = Case(
+            *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+            output_field=models.PositiveIntegerField(),
+        )
+        striped = {}
+        with transaction.atomic():
+            updated = cls.objects.filter(
+                pk__in=list(quantities), stock_stripes=0, stock__gte=wanted
+            ).update(stock=F('stock') - wanted, updated_at=timezone.now())
+            if updated != len(quantities):
+                # Only look for striped products when the plain ones do
+                # not account for the whole mapping
+                striped = stripes.striped(quantities)
+                if updated != len(quantities) - len(striped) or not all(
+                    stripes.take(pk, quantities[pk]) for pk in striped
+                ):
+                    # Some product was short - undo the rows that did match
+                    transaction.set_rollback(True)
+                    return False
+        if striped:
+            stripes.refresh_totals_on_commit(striped, debounce=True)
+        # Queryset updates skip post_save, so invalidate cached catalog here
+        cls.stock_changed_on_commit(quantities)
+        return True
+
+    @classmethod
+    def release_stock(cls, quantities):
+        """
+        Give reserved stock back for a {product_id: quantity} mapping in
+        one statement. Products deleted in the meantime are skipped.
+        Striped products get their units back on one of their stripes.
+        """
+        if not quantities:
+            return 0
+
+        from . import stripes
+
+        returned = Case(
+            *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+            output_field=models.PositiveIntegerField(),
+        )
+        updated = cls.objects.filter(pk__in=list(quantities), stock_stripes=0).update(
+            stock=F('stock') + returned, updated_at=timezone.now()
+        )
+        if updated != len(quantities):
+            striped = stripes.striped(quantities)
+            for pk, count in striped.items():
+                updated += stripes.give_back(pk, quantities[pk], count)
+            if striped:
+                stripes.refresh_totals_on_commit(striped)
+        cls.stock_changed_on_commit(quantities, returned=True)
+        return updated
+
+    @classmethod
+    def stock_changed_on_commit(cls, quantities, returned=False):
+        """
+        Invalidate the cached catalog once stock moved by a {product_id:
+        quantity} mapping commits. Only those products' details are
+        invalidated, unless one of them sold out or came back into stock,
+        which changes the in-stock list.
+        """
+        product_ids = list(quantities)
+
+        def invalidate():
+            from .cache import bump_catalog_version, bump_product_versions
+            bump_product_versions(product_ids)
+            stock = cls.objects.filter(pk__in=product_ids).values_list('pk', 'stock')
+            if any(
+                count <= quantities[pk] if returned else count == 0
+                for pk, count in stock
+            ):
+                bump_catalog_version()
+
+        # Registered after any stripe total refresh, so it reads the new totals
+        transaction.on_commit(invalidate)
+
+
+class StockStripe(models.Model):
+    """
+    One share of a striped product's stock. The stripes of a product are
+    the source of truth for it, Product.stock holds their cached total.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stripes',
+        # The unique constraint's index leads with product
+        db_index=False,
+    )
+    index = models.PositiveSmallIntegerField()
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'index'], name='stock_stripe_product_index_uniq'
+            ),
+        ]
+        verbose_name = 'Stock stripe'
+        verbose_name_plural = 'Stock stripes'
+
+    def __str__(self):
+        return f'{self.product_id}#{self.index}'
@@ -0,0 +1,63 @@
+from .models import Product
+
+
+class ProductResolver:
+    """
+    Request-scoped product lookup.
+
+    Collects product ids up front and loads them with a single in_bulk
+    query; later lookups for the same ids are served from memory. Ids that
+    do not exist are remembered as misses so they are not queried again.
+    """
+
+    def __init__(self, queryset=None):
+        self.queryset = queryset if queryset is not None else Product.objects.all()
+        self._products = {}
+
+    @staticmethod
+    def product_ids_from(items):
+        """Extract the product ids from a raw (unvalidated) items payload"""
+        product_ids = set()
+        if not isinstance(items, (list, tuple)):
+            return product_ids
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                product_ids.add(int(item.get('product_id')))
+            except (TypeError, ValueError):
+                continue
+        return product_ids
+
+    @staticmethod
+    def merge_items(items):
+        """Merge duplicate product lines, keeping first-seen order"""
+        merged = {}
+        for item in items:
+            product_id = item['product_id']
+            merged[product_id] = merged.get(product_id, 0) + item['quantity']
+        return [
+            {'product_id': product_id, 'quantity': quantity}
+            for product_id, quantity in merged.items()
+        ]
+
+    def prime(self, product_ids):
+        """Load every id not seen yet with one query"""
+        pending = {pid for pid in product_ids if pid not in self._products}
+        if pending:
+            found = self.queryset.in_bulk(pending)
+            for product_id in pending:
+                self._products[product_id] = found.get(product_id)
+
+    def get(self, product_id):
+        """Return the product or None if it does not exist"""
+        self.prime([product_id])
+        return self._products[product_id]
+
+    def get_many(self, product_ids):
+        """Return a {id: product} map of the ids that exist"""
+        self.prime(product_ids)
+        return {
+            pid: self._products[pid] for pid in product_ids
+            if self._products[pid] is not None
+        }
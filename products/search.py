@@ -0,0 +1,149 @@
+"""
+Ranked full-text product search.
+
+The index itself is created by migration 0003 and maintained by the
+database (a generated tsvector column on PostgreSQL, FTS5 triggers on
+SQLite), so this module only builds queries against it.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+# Tokens are restricted to word characters so user input can never reach
+# the tsquery / FTS5 query syntax as operators.
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# SQLite rebuilds a table (copy, drop, rename) for many schema changes, which
+# silently drops its triggers. These mirror migration 0003 so they can be
+# restored after any later migration - see ensure_sqlite_search_triggers().
+SQLITE_FTS_TRIGGERS = {
+    'products_product_fts_ai': """
+        CREATE TRIGGER products_product_fts_ai AFTER INSERT ON products_product BEGIN
+            INSERT INTO products_product_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+    'products_product_fts_ad': """
+        CREATE TRIGGER products_product_fts_ad AFTER DELETE ON products_product BEGIN
+            INSERT INTO products_product_fts(products_product_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+    """,
+    'products_product_fts_au': """
+        CREATE TRIGGER products_product_fts_au AFTER UPDATE OF name, description ON products_product BEGIN
+            INSERT INTO products_product_fts(products_product_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO products_product_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+}
+
+
+def ensure_sqlite_search_triggers(using_connection=None):
+    """
+    Recreate any missing FTS5 sync triggers and rebuild the index if some
+    were lost. Returns True when a repair was needed.
+    """
+    conn = using_connection or connection
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master "
+            "WHERE name = 'products_product_fts' OR name LIKE 'products_product_fts_a%'"
+        )
+        existing = {name for _, name in cursor.fetchall()}
+        if 'products_product_fts' not in existing:
+            return False
+        missing = [name for name in SQLITE_FTS_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(SQLITE_FTS_TRIGGERS[name])
+        if missing:
+            cursor.execute(
+                "INSERT INTO products_product_fts(products_product_fts) VALUES ('rebuild')"
+            )
+    return bool(missing)
+
+
+def tokenize(query):
+    """Split a raw search string into safe search terms"""
+    return TOKEN_RE.findall(query.lower())
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector + GIN index, ordered by ts_rank"""
+
+    def search(self, queryset, terms):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.filter(
+            RawSQL(
+                "products_product.search_vector @@ to_tsquery('english', %s)",
+                (tsquery,),
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            rank=RawSQL(
+                "ts_rank(products_product.search_vector, to_tsquery('english', %s))",
+                (tsquery,),
+                output_field=FloatField(),
+            )
+        ).order_by('-rank', '-created_at', '-id')
+
+
+class SQLiteSearchBackend:
+    """FTS5 shadow table, ordered by bm25 with name weighted above description"""
+
+    def search(self, queryset, terms):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # Joined, so MATCH runs once and bm25() is read off the joined rows
+        # instead of a correlated subquery re-running it for every product
+        return queryset.extra(
+            # bm25() is lower-is-better; negate it so ordering matches Postgres
+            select={'rank': '-bm25(products_product_fts, 10.0, 1.0)'},
+            tables=['products_product_fts'],
+            where=[
+                'products_product_fts MATCH %s',
+                'products_product_fts.rowid = products_product.id',
+            ],
+            params=[match],
+        ).order_by('-rank', '-created_at', '-id')
+
+
+class ContainsSearchBackend:
+    """Unindexed fallback for other databases"""
+
+    def search(self, queryset, terms):
+        condition = Q()
+        for term in terms:
+            condition &= Q(name__icontains=term) | Q(description__icontains=term)
+        return queryset.filter(condition)
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend():
+    """Return the search backend for the default database"""
+    return BACKENDS.get(connection.vendor, ContainsSearchBackend)()
+
+
+def search_products(query, queryset=None):
+    """
+    Return products matching every term of ``query``, best match first.
+    Terms are prefix-matched, so partial words find results as the user types.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    return get_search_backend().search(queryset, terms)
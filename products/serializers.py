@@ -1,8 +1,11 @@
+from django.db.models import BooleanField, ExpressionWrapper, Q
 from rest_framework import serializers
+from ecommerce_backend.metrics import TimedSerializerMixin
+from ecommerce_backend.values_serializers import ValuesSerializer
 from .models import Product
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Product model
     """
@@ -11,7 +14,7 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'description', 'price', 
+            'id', 'name', 'sku', 'description', 'price', 
             'image_url', 'stock', 'is_in_stock', 
             'created_at', 'updated_at'
         ]
@@ -30,7 +33,7 @@ class ProductSerializer(serializers.ModelSerializer):
         return value
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Simplified serializer for product listing
     """
@@ -39,3 +42,28 @@ class ProductListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'price', 'image_url', 'stock', 'is_in_stock']
+
+
+class ProductListValuesSerializer(ValuesSerializer):
+    """
+    Fast path for ProductListSerializer on list endpoints
+    """
+    model = Product
+    serializer = ProductListSerializer
+    fields = ProductListSerializer.Meta.fields
+    annotations = {
+        'is_in_stock': ExpressionWrapper(Q(stock__gt=0), output_field=BooleanField()),
+    }
+
+
+class ProductImportSerializer(ProductSerializer):
+    """
+    Validates one row of a bulk import with the ProductSerializer rules.
+    The per-row unique check on sku is dropped: the importer upserts on it.
+    """
+    sku = serializers.CharField(
+        max_length=64, required=False, allow_blank=True, allow_null=True
+    )
+
+    class Meta(ProductSerializer.Meta):
+        fields = ['name', 'sku', 'description', 'price', 'image_url', 'stock']
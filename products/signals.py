@@ -0,0 +1,34 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from . import stripes
+from .models import Product
+from .search import ensure_sqlite_search_triggers
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Bump the catalog version once the change is committed"""
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+def spread_striped_stock(sender, instance, update_fields=None, **kwargs):
+    """
+    A save that sets a striped product's stock restocks its stripes; one
+    that only carried the loaded stock along lets the stripes correct it.
+    """
+    if not instance.stock_stripes or (update_fields is not None and 'stock' not in update_fields):
+        return
+    if instance.stock != getattr(instance, '_loaded_stock', None):
+        stripes.set_total(instance.pk, instance.stock)
+    else:
+        stripes.refresh_totals_on_commit([instance.pk])
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    """Re-install FTS5 triggers dropped by SQLite table rebuilds"""
+    ensure_sqlite_search_triggers(connections[using])
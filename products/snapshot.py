@@ -0,0 +1,343 @@
+"""
+Static snapshots of the catalog that nginx serves without touching Django.
+
+The builder writes the anonymous catalog endpoints out as JSON files under
+CATALOG_SNAPSHOT_DIR, which nginx serves at CATALOG_SNAPSHOT_URL:
+
+* products/page-<n>.json: the product list, newest first;
+* products/in-stock/page-<n>.json: the in-stock list;
+* products/<id>.json: one product's detail;
+* manifest.json: the catalog version and time the snapshot reflects, and
+  the count and number of pages of each list. The version is derived from
+  the products table (latest updated_at, read from its index, and the
+  product list's count, which the build needs anyway), so every builder
+  and client computes the same one whatever cache it runs with.
+
+Pages have the API's shape (count, next, previous, results), with links to
+the neighbouring snapshot pages, and the same rows as the API's page-number
+pagination. Every file gets a gzip (.gz) and, when the optional brotli
+package is installed, a brotli (.br) variant, so nginx never compresses on
+the fly.
+
+A full build writes everything. An incremental one reads the products
+updated since the previous snapshot (Product.updated_at, with an overlap
+for transactions that were still open) and rewrites their detail files and
+only the list pages they appear on. When a list's membership changed (a
+product was created or deleted, or went in or out of stock), every page of
+that list shifts and the whole list is rewritten. A file whose content did
+not change is left alone, so its ETag and Last-Modified survive.
+
+Each file is written to a temporary file next to it and renamed over the
+old one, so nginx never serves a partial file. The manifest is written
+last: once it is updated, every file it describes is in place. A client
+paging through a list while it is rewritten can still see pages of two
+consecutive snapshots.
+
+``manage.py build_catalog_snapshot`` builds once or keeps the snapshot up
+to date with --loop.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Product
+from .serializers import ProductListValuesSerializer, ProductSerializer
+from .views import ProductPagination
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'manifest.json'
+# How far back an incremental build looks beyond the previous snapshot, for
+# products whose transaction set updated_at before it and committed after
+OVERLAP = timedelta(minutes=1)
+ITERATOR_CHUNK_SIZE = 2000
+
+DETAIL_NAME = re.compile(r'^(\d+)\.json$')
+PAGE_NAME = re.compile(r'^page-(\d+)\.json$')
+
+
+def variant_suffixes():
+    return ['.gz', '.br'] if brotli is not None else ['.gz']
+
+
+def compressed_variants(body):
+    """{suffix: bytes} of the pre-compressed variants of a file"""
+    variants = {'.gz': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(body, quality=11)
+    return variants
+
+
+def last_modified():
+    """Latest Product.updated_at, from the end of its index"""
+    return Product.objects.aggregate(last_modified=Max('updated_at'))['last_modified']
+
+
+def catalog_version(modified, count):
+    """
+    Version of the products table from its latest updated_at and its row
+    count: changes with any save, insert or delete
+    """
+    raw = f"{modified.isoformat() if modified else ''}|{count}"
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def replace_file(path, body):
+    """Atomically replace ``path`` with ``body``, readable by the web server"""
+    directory = os.path.dirname(path)
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as stream:
+            stream.write(body)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def read_file(path):
+    try:
+        with open(path, 'rb') as stream:
+            return stream.read()
+    except FileNotFoundError:
+        return None
+
+
+def remove_file(path):
+    for name in [path, path + '.gz', path + '.br']:
+        try:
+            os.unlink(name)
+        except FileNotFoundError:
+            pass
+
+
+class CatalogList:
+    """One paginated list of the snapshot"""
+
+    def __init__(self, name, path, filters, contains):
+        self.name = name
+        self.path = path
+        self.filters = filters
+        # Whether a product, as its detail payload, belongs in the list
+        self.contains = contains
+
+    def queryset(self):
+        return Product.objects.filter(**self.filters).order_by('-created_at', '-id')
+
+    def positions(self, pks):
+        """{pk: number of products listed before it} of ``pks``, in one query"""
+        pks = [int(pk) for pk in pks]
+        if not pks:
+            return {}
+        ranked = self.queryset().annotate(
+            row=Window(RowNumber(), order_by=[F('created_at').desc(), F('id').desc()])
+        ).values_list('pk', 'row')
+        # Filtering the annotated queryset on pk would rank only those rows
+        sql, params = ranked.query.sql_with_params()
+        placeholders = ', '.join(['%s'] * len(pks))
+        connection = connections[ranked.db]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT * FROM ({sql}) ranked WHERE ranked.id IN ({placeholders})',
+                [*params, *pks],
+            )
+            return {pk: row - 1 for pk, row in cursor.fetchall()}
+
+
+LISTS = [
+    CatalogList('products', 'products', {}, lambda product: True),
+    CatalogList('in_stock', 'products/in-stock', {'stock__gt': 0}, lambda product: product['stock'] > 0),
+]
+
+
+class SnapshotBuilder:
+    """Writes the catalog snapshot into ``directory``, fully or incrementally"""
+
+    def __init__(self, directory=None, url=None, page_size=None):
+        self.directory = str(directory or settings.CATALOG_SNAPSHOT_DIR)
+        self.url = url or settings.CATALOG_SNAPSHOT_URL
+        self.page_size = page_size or ProductPagination.page_size
+        self.renderer = JSONRenderer()
+        self.written = 0
+        self.removed = 0
+
+    def file_path(self, name):
+        return os.path.join(self.directory, *name.split('/'))
+
+    def file_url(self, name):
+        return self.url.rstrip('/') + '/' + name
+
+    def page_name(self, catalog_list, number):
+        return f'{catalog_list.path}/page-{number}.json'
+
+    def detail_name(self, pk):
+        return f'products/{pk}.json'
+
+    def read_manifest(self):
+        body = read_file(self.file_path(MANIFEST))
+        return json.loads(body) if body else None
+
+    def write(self, name, data):
+        """Write a file and its compressed variants unless it already holds ``data``"""
+        body = self.renderer.render(data)
+        path = self.file_path(name)
+        # Compare before compressing: most files of a pass are unchanged
+        if read_file(path) == body and all(
+            os.path.exists(path + suffix) for suffix in variant_suffixes()
+        ):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for suffix, compressed in compressed_variants(body).items():
+            replace_file(path + suffix, compressed)
+        replace_file(path, body)
+        self.written += 1
+        return True
+
+    def remove(self, name):
+        remove_file(self.file_path(name))
+        self.removed += 1
+
+    def build(self, full=False):
+        """Bring the snapshot up to date; ``written`` and ``removed`` count the files touched"""
+        started = timezone.now()
+        # Read before the products, so the snapshot is at least this fresh
+        modified = last_modified()
+        manifest = self.read_manifest()
+        if full or manifest is None or manifest.get('page_size') != self.page_size:
+            counts = self.build_full()
+        else:
+            since = datetime.fromisoformat(manifest['updated_through']) - OVERLAP
+            counts = self.build_changes(manifest, since)
+
+        self.write(MANIFEST, {
+            'catalog_version': catalog_version(modified, counts['products']),
+            'generated_at': timezone.now().isoformat(),
+            'updated_through': started.isoformat(),
+            'page_size': self.page_size,
+            'lists': {
+                catalog_list.name: {
+                    'count': counts[catalog_list.name],
+                    'pages': self.page_count(counts[catalog_list.name]),
+                    'first': self.file_url(self.page_name(catalog_list, 1)),
+                }
+                for catalog_list in LISTS
+            },
+            'detail': self.file_url(self.detail_name('{id}')),
+        })
+        return self
+
+    def page_count(self, count):
+        return max(1, -(-count // self.page_size))
+
+    def build_full(self):
+        pks = set()
+        for product in Product.objects.order_by('pk').iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            self.write(self.detail_name(product.pk), ProductSerializer(product).data)
+            pks.add(product.pk)
+        self.prune_details(pks)
+        return {catalog_list.name: self.write_list(catalog_list) for catalog_list in LISTS}
+
+    def build_changes(self, manifest, since):
+        changed = list(Product.objects.filter(updated_at__gte=since).order_by('pk'))
+        details = {product.pk: ProductSerializer(product).data for product in changed}
+        # What the snapshot currently says about them
+        previous = {}
+        for product in changed:
+            body = read_file(self.file_path(self.detail_name(product.pk)))
+            previous[product.pk] = json.loads(body) if body else None
+
+        counts = {}
+        for catalog_list in LISTS:
+            count = catalog_list.queryset().count()
+            recorded = manifest['lists'].get(catalog_list.name, {}).get('count')
+            moved = count != recorded or any(
+                self.listed(catalog_list, previous[pk]) != self.listed(catalog_list, data)
+                for pk, data in details.items()
+            )
+            if moved:
+                counts[catalog_list.name] = self.write_list(catalog_list, count)
+                if catalog_list.name == 'products':
+                    self.prune_details(set(catalog_list.queryset().values_list('pk', flat=True)))
+                continue
+            # Same members in the same order: only the pages showing a changed product
+            positions = catalog_list.positions(
+                pk for pk, data in details.items() if catalog_list.contains(data)
+            )
+            pages = sorted({position // self.page_size + 1 for position in positions.values()})
+            for number in pages:
+                self.write_page(catalog_list, number, count)
+            counts[catalog_list.name] = count
+
+        for pk, data in details.items():
+            self.write(self.detail_name(pk), data)
+        return counts
+
+    @staticmethod
+    def listed(catalog_list, data):
+        return data is not None and catalog_list.contains(data)
+
+    def page_data(self, catalog_list, number, count, rows):
+        pages = self.page_count(count)
+        return {
+            'count': count,
+            'next': self.file_url(self.page_name(catalog_list, number + 1)) if number < pages else None,
+            'previous': self.file_url(self.page_name(catalog_list, number - 1)) if number > 1 else None,
+            'results': ProductListValuesSerializer(rows, many=True).data,
+        }
+
+    def write_page(self, catalog_list, number, count):
+        bottom = (number - 1) * self.page_size
+        rows = ProductListValuesSerializer.values(catalog_list.queryset())[bottom:bottom + self.page_size]
+        self.write(self.page_name(catalog_list, number), self.page_data(catalog_list, number, count, rows))
+
+    def write_list(self, catalog_list, count=None):
+        """Write every page of a list and remove pages past its end; returns its count"""
+        if count is None:
+            count = catalog_list.queryset().count()
+        rows = ProductListValuesSerializer.values(catalog_list.queryset()).iterator(
+            chunk_size=ITERATOR_CHUNK_SIZE
+        )
+        page = []
+        number = 1
+        for row in rows:
+            page.append(row)
+            if len(page) == self.page_size:
+                self.write(self.page_name(catalog_list, number), self.page_data(catalog_list, number, count, page))
+                page = []
+                number += 1
+        if page or number == 1:
+            self.write(self.page_name(catalog_list, number), self.page_data(catalog_list, number, count, page))
+        else:
+            number -= 1
+
+        directory = self.file_path(catalog_list.path)
+        for name in os.listdir(directory):
+            match = PAGE_NAME.match(name)
+            if match and int(match.group(1)) > number:
+                self.remove(f'{catalog_list.path}/{name}')
+        return count
+
+    def prune_details(self, pks):
+        """Remove the detail files of products that no longer exist"""
+        directory = self.file_path('products')
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            match = DETAIL_NAME.match(name)
+            if match and int(match.group(1)) not in pks:
+                self.remove(self.detail_name(match.group(1)))
@@ -0,0 +1,80 @@
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+# Rows fetched per server-side cursor round trip and per emitted chunk
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_stream(request):
+    """Streaming is opt-in via ?stream=true"""
+    return request.GET.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+class JSONArrayChunker:
+    """Renders serialized rows into the chunks of one JSON array"""
+
+    def __init__(self, serializer_class, chunk_size):
+        self.serializer_class = serializer_class
+        self.chunk_size = chunk_size
+        self.renderer = JSONRenderer()
+        self.buffer = []
+        self.first = True
+
+    def add(self, obj):
+        """Buffer one row; returns a chunk once chunk_size rows are buffered"""
+        self.buffer.append(self.renderer.render(self.serializer_class(obj).data))
+        if len(self.buffer) >= self.chunk_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        chunk = (b'' if self.first else b',') + b','.join(self.buffer)
+        self.first = False
+        self.buffer = []
+        return chunk
+
+    def close(self):
+        return (self.flush() if self.buffer else b'') + b']'
+
+
+def iter_json_array(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield a JSON array of serialized rows a chunk at a time.
+
+    The queryset is walked with iterator(), which uses a server-side cursor
+    where the database supports it, so only one chunk is held in memory.
+    """
+    chunker = JSONArrayChunker(serializer_class, chunk_size)
+    yield b'['
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk = chunker.add(obj)
+        if chunk is not None:
+            yield chunk
+    yield chunker.close()
+
+
+async def aiter_json_array(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """Async twin of iter_json_array, walking the queryset with aiterator()"""
+    chunker = JSONArrayChunker(serializer_class, chunk_size)
+    yield b'['
+    async for obj in queryset.aiterator(chunk_size=chunk_size):
+        chunk = chunker.add(obj)
+        if chunk is not None:
+            yield chunk
+    yield chunker.close()
+
+
+def stream_json_response(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """Return the whole queryset as an incrementally rendered JSON array"""
+    return StreamingHttpResponse(
+        iter_json_array(queryset, serializer_class, chunk_size),
+        content_type='application/json',
+    )
+
+
+def astream_json_response(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """stream_json_response for async views (served natively under ASGI)"""
+    return StreamingHttpResponse(
+        aiter_json_array(queryset, serializer_class, chunk_size),
+        content_type='application/json',
+    )
@@ -0,0 +1,220 @@
+"""
+Striped stock counters for hot products.
+
+Every order for a product decrements the same row, so a product that sells
+in bursts checks out one order at a time: each reservation waits on the
+row lock until the previous order's transaction commits. A striped product
+(stock_stripes = N) keeps its stock in N StockStripe rows instead. A
+reservation takes a random stripe that holds enough units and that no
+other transaction has locked (FOR UPDATE SKIP LOCKED); only when there is
+none does it wait for all of them and take the units from several.
+
+The stripes are the source of truth for a striped product and
+Product.stock is their cached total, so reads, filters and is_in_stock
+work unchanged. The total is recomputed from the stripes by one short
+UPDATE after a commit that moved units, outside the order's transaction.
+Refreshing after every order would bring the hot row's contention back, so
+after reservations it runs at most once per STOCK_STRIPE_REFRESH_INTERVAL
+per product; the units taken in between show up with the next refresh, or
+when ``stock_stripes rebalance`` reconciles the totals. Meanwhile the total
+can only overstate the stock, which is harmless: reservations check the
+stripes. Returned units refresh it at once, so it never understates. Saving
+a new stock on a striped product (admin, API, import) spreads it over the
+stripes.
+
+``manage.py stock_stripes`` turns striping on and off and rebalances.
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockStripe
+
+REFRESH_KEY = 'stock-stripes:refreshed:{}'
+
+
+def split(total, count):
+    """``total`` units spread over ``count`` stripes as evenly as possible"""
+    share, extra = divmod(total, count)
+    return [share + 1 if index < extra else share for index in range(count)]
+
+
+def striped(product_ids):
+    """{product_id: stripe count} of the striped products among ``product_ids``"""
+    return dict(
+        Product.objects.filter(pk__in=list(product_ids), stock_stripes__gt=0)
+        .order_by('pk')
+        .values_list('pk', 'stock_stripes')
+    )
+
+
+def units_by_stripe(product_id, lock=False):
+    """{stripe pk: units} of a product, locked in index order when ``lock``"""
+    stripes = StockStripe.objects.filter(product_id=product_id).order_by('index')
+    if lock:
+        stripes = stripes.select_for_update()
+    return dict(stripes.values_list('pk', 'units'))
+
+
+def set_units(units):
+    """Write a {stripe pk: units} mapping with one UPDATE"""
+    StockStripe.objects.filter(pk__in=list(units)).update(units=Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in units.items()]
+    ))
+
+
+def take(product_id, quantity):
+    """
+    Take ``quantity`` units from a product's stripes. Must run inside a
+    transaction; returns False, having changed nothing, when the stripes
+    do not hold as many units between them.
+    """
+    stripes = StockStripe.objects.filter(product_id=product_id)
+    free = (
+        stripes.select_for_update(skip_locked=True)
+        .filter(units__gte=quantity)
+        .order_by('?')
+        .values_list('pk', flat=True)
+        .first()
+    )
+    # The condition is repeated for backends without row locks
+    if free is not None and stripes.filter(pk=free, units__gte=quantity).update(
+        units=F('units') - quantity
+    ):
+        return True
+
+    # Every stripe that could cover it alone is busy or none can: wait for
+    # all of them and take the units from the fullest ones
+    units = units_by_stripe(product_id, lock=True)
+    if sum(units.values()) < quantity:
+        return False
+    remaining = quantity
+    changed = {}
+    for pk, available in sorted(units.items(), key=lambda item: -item[1]):
+        taken = min(available, remaining)
+        changed[pk] = available - taken
+        remaining -= taken
+        if not remaining:
+            break
+    set_units(changed)
+    return True
+
+
+def give_back(product_id, quantity, count):
+    """Add ``quantity`` units to a random one of the product's ``count`` stripes"""
+    return StockStripe.objects.filter(
+        product_id=product_id, index=random.randrange(count)
+    ).update(units=F('units') + quantity)
+
+
+def refresh_totals(product_ids):
+    """Set Product.stock of striped products to the sum of their stripes"""
+    total = Subquery(
+        StockStripe.objects.filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('units'))
+        .values('total')
+    )
+    return Product.objects.filter(pk__in=list(product_ids), stock_stripes__gt=0).update(
+        stock=Coalesce(total, 0), updated_at=timezone.now()
+    )
+
+
+def refresh_totals_on_commit(product_ids, debounce=False):
+    """
+    Refresh the cached totals once the current transaction commits, so the
+    product row is never locked for the length of an order's transaction.
+    With ``debounce``, skip the products refreshed less than
+    STOCK_STRIPE_REFRESH_INTERVAL seconds ago.
+    """
+    product_ids = list(product_ids)
+    interval = settings.STOCK_STRIPE_REFRESH_INTERVAL
+    if not debounce or interval <= 0:
+        transaction.on_commit(lambda: refresh_totals(product_ids))
+        return
+
+    def refresh():
+        due = [
+            pk for pk in product_ids
+            if cache.add(REFRESH_KEY.format(pk), True, timeout=interval)
+        ]
+        if due:
+            refresh_totals(due)
+    transaction.on_commit(refresh)
+
+
+def bump_on_commit():
+    from .cache import bump_catalog_version
+    transaction.on_commit(bump_catalog_version)
+
+
+@transaction.atomic
+def enable(product_id, count):
+    """Split a product's stock over ``count`` stripes (or re-split a striped one)"""
+    product = Product.objects.select_for_update().get(pk=product_id)
+    total = product.stock
+    if product.stock_stripes:
+        total = sum(units_by_stripe(product_id, lock=True).values())
+        StockStripe.objects.filter(product_id=product_id).delete()
+    StockStripe.objects.bulk_create([
+        StockStripe(product_id=product_id, index=index, units=units)
+        for index, units in enumerate(split(total, count))
+    ])
+    Product.objects.filter(pk=product_id).update(
+        stock=total, stock_stripes=count, updated_at=timezone.now()
+    )
+    bump_on_commit()
+
+
+@transaction.atomic
+def disable(product_id):
+    """Fold a striped product's stripes back into Product.stock"""
+    product = Product.objects.select_for_update().get(pk=product_id)
+    if not product.stock_stripes:
+        return
+    total = sum(units_by_stripe(product_id, lock=True).values())
+    StockStripe.objects.filter(product_id=product_id).delete()
+    Product.objects.filter(pk=product_id).update(
+        stock=total, stock_stripes=0, updated_at=timezone.now()
+    )
+    bump_on_commit()
+
+
+@transaction.atomic
+def set_total(product_id, total):
+    """Replace a striped product's stock with ``total`` units spread evenly"""
+    units = units_by_stripe(product_id, lock=True)
+    if units:
+        set_units(dict(zip(units, split(total, len(units)))))
+
+
+def is_skewed(units, skew):
+    """True when a stripe holds less than ``skew`` of an even share"""
+    if len(units) < 2:
+        return False
+    share = sum(units) / len(units)
+    return min(units) < share * skew
+
+
+@transaction.atomic
+def rebalance(product_id, skew=0.5):
+    """
+    Even out a product's stripes when one holds less than ``skew`` of its
+    even share, so reservations keep finding a free stripe with units, and
+    reconcile the cached total. Returns True if units moved.
+    """
+    units = units_by_stripe(product_id, lock=True)
+    even = dict(zip(units, split(sum(units.values()), len(units))))
+    moved = is_skewed(list(units.values()), skew) and even != units
+    if moved:
+        set_units(even)
+    cached = Product.objects.filter(pk=product_id).values_list('stock', flat=True).first()
+    if cached != sum(units.values()):
+        refresh_totals([product_id])
+        bump_on_commit()
+    return moved
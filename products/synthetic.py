@@ -0,0 +1,275 @@
+"""
+Deterministic synthetic catalog and order data for load testing.
+
+Everything is drawn from one seeded random.Random, so a given seed (and
+--until date) always produces the same rows. Rows are written as batched
+multi-row INSERTs with explicitly assigned ids (so order lines can reference
+their orders without a round trip), and never held in memory beyond one
+batch. Run it against a database with no concurrent writers.
+
+The raw INSERTs bypass save(), signals and auto_now, so run() does their
+work once at the end: it bumps the catalog cache version, and the search
+index is checked (the database maintains it, but SQLite triggers lost to a
+table rebuild are restored and the index rebuilt). Order generation
+rebuilds the sales summaries.
+"""
+import bisect
+import itertools
+import json
+import math
+import random
+import time
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from orders import sales
+from orders.models import Order, OrderLine
+from products.cache import bump_catalog_version
+from products.models import Product
+from products.search import ensure_sqlite_search_triggers
+
+CATEGORIES = {
+    # category: (median price, price spread as lognormal sigma)
+    'Laptop': (1200, 0.35),
+    'Smartphone': (800, 0.40),
+    'Headphones': (180, 0.60),
+    'Monitor': (350, 0.45),
+    'Keyboard': (90, 0.55),
+    'Mouse': (45, 0.50),
+    'Tablet': (550, 0.40),
+    'Smartwatch': (300, 0.45),
+    'Camera': (1100, 0.60),
+    'Speaker': (150, 0.65),
+    'Router': (120, 0.50),
+    'Charger': (30, 0.45),
+}
+BRANDS = [
+    'Apex', 'Nimbus', 'Vertex', 'Lumen', 'Orion', 'Pulse', 'Zenith', 'Aurora',
+    'Helix', 'Quantum', 'Nova', 'Echo', 'Atlas', 'Cobalt', 'Sable', 'Titan',
+]
+ADJECTIVES = [
+    'Pro', 'Max', 'Air', 'Ultra', 'Lite', 'Plus', 'Mini', 'Edge', 'Prime', 'Neo',
+]
+FEATURES = [
+    'long battery life', 'fast charging', 'a premium aluminium body',
+    'low-latency wireless', 'a high-resolution display', 'active noise cancellation',
+    'a compact design', 'water resistance', 'an ergonomic layout',
+    'a two-year warranty', 'USB-C connectivity', 'best-in-class performance',
+]
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+    'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph',
+    'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Priya', 'Wei', 'Fatima', 'Yuki', 'Omar',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+    'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas',
+    'Taylor', 'Moore', 'Patel', 'Nguyen', 'Kim', 'Chen', 'Singh', 'Khan', 'Sato',
+]
+STREETS = ['Main Street', 'Oak Avenue', 'Pine Road', 'Elm Street', 'Maple Drive', 'Cedar Lane']
+CITIES = [
+    'New York, NY 10001', 'Los Angeles, CA 90210', 'Chicago, IL 60601',
+    'Houston, TX 77001', 'Phoenix, AZ 85001', 'Seattle, WA 98101', 'Denver, CO 80202',
+]
+EMAIL_DOMAINS = ['email.com', 'example.com', 'mail.test', 'inbox.dev']
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def next_id(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+def insert_rows(model, columns, rows):
+    """
+    Multi-row INSERT of pre-adapted tuples, skipping model instantiation and
+    SQL compilation, which dominate bulk_create at this volume.
+    """
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES '.format(
+        quote(model._meta.db_table), ', '.join(quote(column) for column in columns)
+    )
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            from psycopg2.extras import execute_values
+            execute_values(cursor.cursor, sql + '%s', rows, page_size=len(rows))
+        else:
+            placeholders = '({})'.format(', '.join(['%s'] * len(columns)))
+            cursor.executemany(sql + placeholders, rows)
+
+
+def reset_sequences(*models):
+    """Move id sequences past the explicitly assigned ids (PostgreSQL)"""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+class SyntheticDataGenerator:
+    """Generates products and orders in batches from a fixed seed"""
+
+    def __init__(self, seed=42, days=365, until=None, zipf=1.1, batch_size=5000, stdout=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.zipf = zipf
+        self.stdout = stdout
+        end_day = until or timezone.localdate()
+        self.end = timezone.make_aware(datetime.combine(end_day, dt_time.max))
+        self.span_seconds = max(days, 1) * 86400
+        self.categories = list(CATEGORIES)
+        # connection is a thread-local proxy; resolve the adapters once
+        self.adapt_datetime = connection.ops.adapt_datetimefield_value
+        self.adapt_decimal_value = connection.ops.adapt_decimalfield_value
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def run(self, product_count, order_count):
+        if product_count:
+            self.create_products(product_count)
+        if order_count:
+            self.create_orders(order_count)
+        if product_count and ensure_sqlite_search_triggers():
+            self.log('Restored the search triggers and rebuilt the search index')
+        bump_catalog_version()
+
+    # Products
+
+    def random_timestamp(self):
+        return self.end - timedelta(seconds=self.rng.random() * self.span_seconds)
+
+    def build_product(self, pk):
+        rng = self.rng
+        category = rng.choice(self.categories)
+        median, sigma = CATEGORIES[category]
+        brand = rng.choice(BRANDS)
+        model = f'{rng.choice(ADJECTIVES)} {rng.randint(1, 20)}'
+        price = Decimal(str(round(rng.lognormvariate(math.log(median), sigma), 0))) - Decimal('0.01')
+        features = rng.sample(FEATURES, 2)
+        created_at = self.adapt_datetime(self.random_timestamp())
+        return (
+            pk,
+            f'{brand} {category} {model}',
+            f'{brand} {category.lower()} with {features[0]} and {features[1]}.',
+            self.adapt_decimal(max(price, Decimal('0.99'))),
+            int(rng.paretovariate(1.5) * 5) if rng.random() > 0.08 else 0,
+            0,
+            created_at,
+            created_at,
+        )
+
+    def adapt_decimal(self, value):
+        return self.adapt_decimal_value(value, 10, 2)
+
+    def create_products(self, count):
+        started = time.monotonic()
+        first = next_id(Product)
+        columns = [
+            'id', 'name', 'description', 'price', 'stock', 'stock_stripes',
+            'created_at', 'updated_at',
+        ]
+        rows = (self.build_product(pk) for pk in range(first, first + count))
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                insert_rows(Product, columns, batch)
+        reset_sequences(Product)
+        self.log(f'Created {count} products in {time.monotonic() - started:.1f}s')
+
+    # Orders
+
+    def load_popularity(self):
+        """Zipf weights over every product, shuffled so id order is not rank order"""
+        catalog = [
+            (pk, price, self.adapt_decimal(price))
+            for pk, price in Product.objects.order_by('pk').values_list('pk', 'price')
+        ]
+        if not catalog:
+            raise ValueError('Cannot generate orders without products')
+        self.rng.shuffle(catalog)
+        self.catalog = catalog
+        self.cum_weights = list(itertools.accumulate(
+            1.0 / (rank ** self.zipf) for rank in range(1, len(catalog) + 1)
+        ))
+
+    def pick_product(self):
+        total = self.cum_weights[-1]
+        index = bisect.bisect_left(self.cum_weights, self.rng.random() * total)
+        return self.catalog[min(index, len(self.catalog) - 1)]
+
+    def build_order(self, pk):
+        rng = self.rng
+        # Geometric-ish basket size, mostly 1-3 lines
+        lines = {}
+        for _ in range(min(1 + int(rng.expovariate(0.9)), 8)):
+            product_id, price, db_price = self.pick_product()
+            quantity = 1 if rng.random() < 0.8 else rng.randint(2, 4)
+            if product_id in lines:
+                lines[product_id][0] += quantity
+            else:
+                lines[product_id] = [quantity, price, db_price]
+
+        # A smaller pool of repeat customers than orders
+        customer = rng.randint(0, self.customer_pool)
+        first = FIRST_NAMES[customer % len(FIRST_NAMES)]
+        last = LAST_NAMES[(customer // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        domain = EMAIL_DOMAINS[customer % len(EMAIL_DOMAINS)]
+        created_at = self.adapt_datetime(self.random_timestamp())
+        order = (
+            pk,
+            f'{first} {last}',
+            f'{first}.{last}{customer}@{domain}'.lower(),
+            f'{rng.randint(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}',
+            self.adapt_decimal(sum((price * qty for qty, price, _ in lines.values()), Decimal('0.00'))),
+            json.dumps([{'product_id': pid, 'quantity': qty} for pid, (qty, _, _) in lines.items()]),
+            sum(qty for qty, _, _ in lines.values()),
+            created_at,
+            created_at,
+        )
+        order_lines = [
+            (pk, pid, qty, db_price) for pid, (qty, _, db_price) in lines.items()
+        ]
+        return order, order_lines
+
+    def create_orders(self, count):
+        self.load_popularity()
+        self.customer_pool = max(count // 5, 1)
+        started = time.monotonic()
+        first = next_id(Order)
+        order_columns = [
+            'id', 'customer_name', 'email', 'address', 'total_price',
+            'items', 'items_count', 'created_at', 'updated_at',
+        ]
+        line_columns = ['order_id', 'product_id', 'quantity', 'unit_price']
+        rows = (self.build_order(pk) for pk in range(first, first + count))
+        created = 0
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                insert_rows(Order, order_columns, [order for order, _ in batch])
+                insert_rows(OrderLine, line_columns, [line for _, lines in batch for line in lines])
+            created += len(batch)
+            if created % (self.batch_size * 20) == 0:
+                elapsed = time.monotonic() - started
+                self.log(f'{created} orders ({created / elapsed:,.0f}/s)')
+        reset_sequences(Order, OrderLine)
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.log(f'Created {count} orders in {elapsed:.1f}s ({count / elapsed:,.0f}/s)')
+
+        # The raw inserts bypass the incremental summary updates
+        started = time.monotonic()
+        sales.rebuild()
+        self.log(f'Rebuilt sales summaries in {time.monotonic() - started:.1f}s')
@@ -1,3 +1,199 @@
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from . import stripes
+from .cache import get_catalog_version, get_product_versions
+from .models import Product, StockStripe
+
+
+def make_product(name, stock, price='10.00'):
+    return Product.objects.create(name=name, description=name, price=Decimal(price), stock=stock)
+
+
+class ReserveStockTests(TestCase):
+    def setUp(self):
+        self.first = make_product('First', 5)
+        self.second = make_product('Second', 3)
+
+    def stock(self, product):
+        product.refresh_from_db(fields=['stock'])
+        return product.stock
+
+    def test_reserves_every_product(self):
+        self.assertTrue(Product.reserve_stock({self.first.pk: 2, self.second.pk: 3}))
+        self.assertEqual(self.stock(self.first), 3)
+        self.assertEqual(self.stock(self.second), 0)
+
+    def test_shortfall_on_one_product_reserves_nothing(self):
+        self.assertFalse(Product.reserve_stock({self.first.pk: 2, self.second.pk: 4}))
+        self.assertEqual(self.stock(self.first), 5)
+        self.assertEqual(self.stock(self.second), 3)
+
+    def test_missing_product_reserves_nothing(self):
+        self.assertFalse(Product.reserve_stock({self.first.pk: 1, self.second.pk + 100: 1}))
+        self.assertEqual(self.stock(self.first), 5)
+
+    def test_release_gives_units_back(self):
+        Product.reserve_stock({self.first.pk: 4})
+        self.assertEqual(Product.release_stock({self.first.pk: 4}), 1)
+        self.assertEqual(self.stock(self.first), 5)
+
+    def test_striped_product_takes_from_its_stripes(self):
+        stripes.enable(self.first.pk, 4)
+        self.assertTrue(Product.reserve_stock({self.first.pk: 3, self.second.pk: 1}))
+        self.assertEqual(sum(StockStripe.objects.values_list('units', flat=True)), 2)
+        self.assertEqual(self.stock(self.second), 2)
+
+    def test_striped_shortfall_rolls_back_plain_products(self):
+        stripes.enable(self.first.pk, 4)
+        self.assertFalse(Product.reserve_stock({self.first.pk: 6, self.second.pk: 1}))
+        self.assertEqual(sum(StockStripe.objects.values_list('units', flat=True)), 5)
+        self.assertEqual(self.stock(self.second), 3)
+
+    def test_reservations_refresh_the_striped_total_at_most_once_per_interval(self):
+        stripes.enable(self.first.pk, 4)
+        cache.clear()
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.reserve_stock({self.first.pk: 1})
+        # The second order falls within the first refresh's interval
+        self.assertEqual(self.stock(self.first), 4)
+        stripes.rebalance(self.first.pk)
+        self.assertEqual(self.stock(self.first), 3)
+
+    def test_returned_units_refresh_the_striped_total_at_once(self):
+        stripes.enable(self.first.pk, 4)
+        cache.clear()
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.reserve_stock({self.first.pk: 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.release_stock({self.first.pk: 1})
+        self.assertEqual(self.stock(self.first), 4)
+
+
+class StockInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.first = make_product('First', 5)
+        self.second = make_product('Second', 3)
+
+    def versions(self):
+        versions = get_product_versions([self.first.pk, self.second.pk])
+        return get_catalog_version(), versions[self.first.pk], versions[self.second.pk]
+
+    def change(self, method, quantities):
+        with self.captureOnCommitCallbacks(execute=True):
+            getattr(Product, method)(quantities)
+
+    def test_reserve_invalidates_only_the_products_it_touched(self):
+        catalog, first, second = self.versions()
+        self.change('reserve_stock', {self.first.pk: 1})
+        self.assertEqual(self.versions()[0], catalog)
+        self.assertNotEqual(self.versions()[1], first)
+        self.assertEqual(self.versions()[2], second)
+
+    def test_list_shows_the_stock_left_by_an_order(self):
+        def listed_stock():
+            rows = self.client.get('/api/products/?page_size=100').json()['results']
+            return {row['id']: row['stock'] for row in rows}[self.first.pk]
+
+        self.assertEqual(listed_stock(), 5)
+        self.assertEqual(listed_stock(), 5)
+        self.change('reserve_stock', {self.first.pk: 2})
+        self.assertEqual(listed_stock(), 3)
+
+    def test_selling_out_invalidates_the_catalog(self):
+        catalog = get_catalog_version()
+        self.change('reserve_stock', {self.second.pk: 3})
+        self.assertNotEqual(get_catalog_version(), catalog)
+
+    def test_coming_back_into_stock_invalidates_the_catalog(self):
+        self.change('reserve_stock', {self.second.pk: 3})
+        catalog = get_catalog_version()
+        self.change('release_stock', {self.second.pk: 1})
+        self.assertNotEqual(get_catalog_version(), catalog)
+        catalog = get_catalog_version()
+        self.change('release_stock', {self.second.pk: 1})
+        self.assertEqual(get_catalog_version(), catalog)
+
+
+class ListETagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = make_product('Tagged', 5)
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.client.get('/api/products/')['ETag']
+        # Answered from the cache entry, before any query or serializer
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_changed_page_gets_a_new_etag(self):
+        etag = self.client.get('/api/products/')['ETag']
+        self.product.price = Decimal('12.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_stock_change_on_the_page_gets_a_new_etag(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.reserve_stock({self.product.pk: 1})
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ImportProductsTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Lamp', sku='LAMP-1', description='Desk lamp', price=Decimal('20.00'),
+            stock=50, image_url='https://example.com/lamp.png',
+        )
+
+    def run_import(self, text):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as feed:
+            feed.write(text)
+        self.addCleanup(os.remove, feed.name)
+        stderr = StringIO()
+        call_command('import_products', feed.name, stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_partial_feed_keeps_the_fields_it_does_not_carry(self):
+        self.run_import('sku,price\nLAMP-1,25.00\n')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('25.00'))
+        self.assertEqual(self.product.stock, 50)
+        self.assertEqual(self.product.image_url, 'https://example.com/lamp.png')
+        self.assertEqual(self.product.name, 'Lamp')
+
+    def test_full_rows_without_optional_fields_keep_them(self):
+        self.run_import('sku,name,description,price\nLAMP-1,Lamp,Desk lamp,22.00\n')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('22.00'))
+        self.assertEqual(self.product.stock, 50)
+        self.assertEqual(self.product.image_url, 'https://example.com/lamp.png')
+
+    def test_rows_without_a_sku_are_skipped(self):
+        before = Product.objects.count()
+        for _ in range(2):
+            errors = self.run_import('sku,name,description,price\n,Rug,Floor rug,30.00\n')
+            self.assertIn('row skipped', errors)
+        self.assertEqual(Product.objects.count(), before)
+
+    def test_partial_row_for_an_unknown_sku_is_reported(self):
+        before = Product.objects.count()
+        errors = self.run_import('sku,price\nNOPE-1,5.00\n')
+        self.assertIn('Unknown sku', errors)
+        self.assertEqual(Product.objects.count(), before)
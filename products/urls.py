@@ -11,4 +11,5 @@ urlpatterns = [
     # Additional product endpoints
     path('search/', views.product_search, name='product-search'),
     path('in-stock/', views.products_in_stock, name='products-in-stock'),
+    path('cache-stats/', views.catalog_cache_stats, name='catalog-cache-stats'),
 ]
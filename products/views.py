@@ -1,20 +1,35 @@
 from rest_framework import generics, status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from ecommerce_backend.conditional import ConditionalGetMixin
+from ecommerce_backend.pagination import AsyncPageNumberPagination, KeysetPagination
+from ecommerce_backend.values_serializers import ValuesListMixin
 from django.shortcuts import get_object_or_404
+from .cache import (
+    CatalogCacheMixin, cached_catalog_response, catalog_list_validators, get_cache_stats,
+)
 from .models import Product
-from .serializers import ProductSerializer, ProductListSerializer
+from .search import search_products
+from .serializers import ProductSerializer, ProductListSerializer, ProductListValuesSerializer
+from .streaming import stream_json_response, wants_stream
 
 
-class ProductPagination(PageNumberPagination):
-    """Custom pagination for products"""
+class ProductPagination(KeysetPagination):
+    """Custom pagination for products (page numbers, or keyset via ?cursor=)"""
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductSearchPagination(AsyncPageNumberPagination):
+    """Page-number pagination for relevance-ordered search results"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ProductListCreateView(ConditionalGetMixin, CatalogCacheMixin, ValuesListMixin,
+                            generics.ListCreateAPIView):
     """
     List all products or create a new product
     GET /products/ - List products with pagination
@@ -22,14 +37,19 @@ class ProductListCreateView(generics.ListCreateAPIView):
     """
     queryset = Product.objects.all()
     pagination_class = ProductPagination
+    values_serializer_class = ProductListValuesSerializer
     
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return ProductListSerializer
         return ProductSerializer
 
+    def get_list_validators(self, request):
+        # The cached page's ETag, instead of aggregating the table
+        return catalog_list_validators(request)
+
 
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ProductDetailView(ConditionalGetMixin, CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a product
     GET /products/{id}/ - Get product details
@@ -40,11 +60,24 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ProductSerializer
 
 
+def _list_response(request, products, pagination_class=ProductPagination):
+    """Paginate a product queryset, or stream all of it when requested"""
+    products = ProductListValuesSerializer.values(products)
+    if wants_stream(request):
+        return stream_json_response(products, ProductListValuesSerializer)
+
+    paginator = pagination_class()
+    page = paginator.paginate_queryset(products, request)
+    serializer = ProductListValuesSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
 @api_view(['GET'])
 def product_search(request):
     """
-    Search products by name or description
-    GET /products/search/?q=search_term
+    Search products by name or description, best match first
+    GET /products/search/?q=search_term - Paginated results
+    GET /products/search/?q=search_term&stream=true - All results, streamed
     """
     query = request.GET.get('q', '').strip()
     
@@ -54,22 +87,25 @@ def product_search(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    products = Product.objects.filter(
-        name__icontains=query
-    ) | Product.objects.filter(
-        description__icontains=query
-    )
-    
-    serializer = ProductListSerializer(products, many=True)
-    return Response(serializer.data)
+    products = search_products(query)
+    return _list_response(request, products, ProductSearchPagination)
 
 
 @api_view(['GET'])
 def products_in_stock(request):
     """
     Get only products that are in stock
-    GET /products/in-stock/
+    GET /products/in-stock/ - Paginated results
+    GET /products/in-stock/?stream=true - All results, streamed
     """
     products = Product.objects.filter(stock__gt=0)
-    serializer = ProductListSerializer(products, many=True)
-    return Response(serializer.data)
+    return cached_catalog_response(request, lambda: _list_response(request, products))
+
+
+@api_view(['GET'])
+def catalog_cache_stats(request):
+    """
+    Catalog response cache counters
+    GET /products/cache-stats/
+    """
+    return Response(get_cache_stats())